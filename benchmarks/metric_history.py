@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare the per-metric and the bulk retrieval of MLFlow metric histories.
+
+Usage: python benchmarks/metric_history.py [--runs 20] [--metrics 300] [--points 100]
+"""
+
+import argparse
+import os.path
+import tempfile
+import time
+
+from mlflow.entities import Metric
+from mlflow.tracking import MlflowClient, _get_store
+
+from comet_for_mlflow.metric_history import MetricHistoryFetcher
+
+
+def populate_store(store_uri, runs, metrics, points):
+    client = MlflowClient(tracking_uri=store_uri)
+    experiment_id = client.create_experiment("benchmark")
+
+    run_ids = []
+    for _ in range(runs):
+        run = client.create_run(experiment_id)
+        for metric_number in range(metrics):
+            batch = [
+                Metric("metric-%d" % metric_number, float(step), 1000 + step, step)
+                for step in range(points)
+            ]
+            client.log_batch(run.info.run_id, metrics=batch)
+        client.set_terminated(run.info.run_id)
+        run_ids.append(run.info.run_id)
+
+    return run_ids
+
+
+def benchmark(store, run_ids, bulk):
+    fetcher = MetricHistoryFetcher(store, bulk)
+
+    points = 0
+    start = time.time()
+    for run_id in run_ids:
+        run = store.get_run(run_id)
+        for _, metric_history in fetcher.iter_metric_histories(run):
+            points += len(metric_history)
+    duration = time.time() - start
+
+    return fetcher.round_trips, points, duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--metrics", type=int, default=300)
+    parser.add_argument("--points", type=int, default=100)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    store_uri = "sqlite:///%s" % os.path.join(tmpdir, "mlflow.db")
+
+    print("Populating %s..." % store_uri)
+    run_ids = populate_store(store_uri, args.runs, args.metrics, args.points)
+    store = _get_store(store_uri)
+
+    print("")
+    print("%-10s %12s %12s %10s" % ("Mode", "Round trips", "Points", "Seconds"))
+    for name, bulk in (("per-key", False), ("bulk", True)):
+        round_trips, points, duration = benchmark(store, run_ids, bulk)
+        print("%-10s %12d %12d %10.2f" % (name, round_trips, points, duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare reading a local mlruns directory through the MLFlow FileStore and
+with the mlruns scanner.
+
+Usage: python benchmarks/mlruns.py [--runs 10000] [--metrics 5] [--points 100]
+"""
+
+import argparse
+import os
+import os.path
+import tempfile
+import time
+import uuid
+
+import yaml
+from mlflow.tracking import _get_store
+
+from comet_for_mlflow.compat import search_mlflow_store_runs
+from comet_for_mlflow.metric_history import MetricHistoryFetcher
+from comet_for_mlflow.mlruns import MlrunsScanner
+
+EXPERIMENT_ID = "1"
+
+
+def write_file(path, content):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    with open(path, "w") as output:
+        output.write(content)
+
+
+def populate_mlruns(root, runs, metrics, points):
+    """Write a synthetic mlruns tree directly, logging 10k runs through MLFlow
+    would take much longer than the benchmark itself"""
+    experiment_dir = os.path.join(root, EXPERIMENT_ID)
+    write_file(
+        os.path.join(experiment_dir, "meta.yaml"),
+        yaml.safe_dump(
+            {
+                "artifact_location": "file://%s" % experiment_dir,
+                "experiment_id": EXPERIMENT_ID,
+                "lifecycle_stage": "active",
+                "name": "benchmark",
+            }
+        ),
+    )
+    # Default experiment expected by the FileStore
+    write_file(
+        os.path.join(root, "0", "meta.yaml"),
+        yaml.safe_dump(
+            {
+                "artifact_location": "file://%s" % os.path.join(root, "0"),
+                "experiment_id": "0",
+                "lifecycle_stage": "active",
+                "name": "Default",
+            }
+        ),
+    )
+
+    metric_content = "".join(
+        "%d %f %d\n" % (1000 + step, step / 10.0, step) for step in range(points)
+    )
+
+    for run_number in range(runs):
+        run_id = uuid.uuid4().hex
+        run_dir = os.path.join(experiment_dir, run_id)
+        write_file(
+            os.path.join(run_dir, "meta.yaml"),
+            yaml.safe_dump(
+                {
+                    "artifact_uri": "file://%s" % os.path.join(run_dir, "artifacts"),
+                    "end_time": 2000 + run_number,
+                    "entry_point_name": "",
+                    "experiment_id": EXPERIMENT_ID,
+                    "lifecycle_stage": "active",
+                    "run_id": run_id,
+                    "run_name": "run-%d" % run_number,
+                    "run_uuid": run_id,
+                    "source_name": "",
+                    "source_type": 4,
+                    "source_version": "",
+                    "start_time": 1000 + run_number,
+                    "status": 3,
+                    "tags": [],
+                    "user_id": "benchmark",
+                },
+                default_flow_style=False,
+            ),
+        )
+        os.makedirs(os.path.join(run_dir, "artifacts"))
+        write_file(os.path.join(run_dir, "params", "lr"), "0.001")
+        write_file(os.path.join(run_dir, "tags", "mlflow.user"), "benchmark")
+        for metric_number in range(metrics):
+            write_file(
+                os.path.join(run_dir, "metrics", "metric-%d" % metric_number),
+                metric_content,
+            )
+
+
+def benchmark_file_store(store, page_size):
+    fetcher = MetricHistoryFetcher(store)
+
+    runs = points = 0
+    start = time.time()
+    for run in search_mlflow_store_runs(store, EXPERIMENT_ID, page_size=page_size):
+        runs += 1
+        for _, metric_history in fetcher.iter_metric_histories(run):
+            points += len(metric_history)
+
+    return runs, points, time.time() - start
+
+
+def benchmark_scanner(store):
+    scanner = MlrunsScanner(store.root_directory)
+    fetcher = MetricHistoryFetcher(store, scanner=scanner)
+
+    runs = points = 0
+    start = time.time()
+    for run in scanner.iter_runs(EXPERIMENT_ID):
+        runs += 1
+        for _, metric_history in fetcher.iter_metric_histories(run):
+            points += len(metric_history)
+
+    return runs, points, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10000)
+    parser.add_argument("--metrics", type=int, default=5)
+    parser.add_argument("--points", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    # Recent MLFlow versions only open file stores when explicitly allowed
+    os.environ.setdefault("MLFLOW_ALLOW_FILE_STORE", "true")
+
+    root = os.path.join(tempfile.mkdtemp(), "mlruns")
+
+    print("Populating %s..." % root)
+    populate_mlruns(root, args.runs, args.metrics, args.points)
+    store = _get_store("file://%s" % root)
+
+    print("")
+    print("%-10s %10s %12s %10s" % ("Mode", "Runs", "Points", "Seconds"))
+    for name, run_benchmark in (
+        ("FileStore", lambda: benchmark_file_store(store, args.page_size)),
+        ("scanner", lambda: benchmark_scanner(store)),
+    ):
+        runs, points, duration = run_benchmark()
+        print("%-10s %10d %12d %10.2f" % (name, runs, points, duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2020 Comet.ml Team.
+#
+# This file is part of Comet-For-MLFlow
+# (see https://github.com/comet-ml/comet-for-mlflow).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+"""Asynchronous HTTP access to the MLFlow tracking server and its artifacts."""
+
+from __future__ import print_function
+
+import asyncio
+import base64
+import functools
+import itertools
+import json
+import logging
+import os
+import os.path
+import posixpath
+import ssl
+import threading
+
+from mlflow.entities import FileInfo
+from mlflow.exceptions import MlflowException, RestException
+
+from .compat import STREAM_CHUNK_SIZE, is_http_artifact_repository, is_rest_store
+from .metric_history import MetricPoint
+from .uploader import Backoff
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+LOGGER = logging.getLogger()
+
+# Maximum number of connections opened to the same host, shared by all the
+# worker threads
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 16
+
+DEFAULT_MAX_RETRIES = 5
+
+# Same statuses as the retries of the MLFlow HTTP client
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+METRIC_HISTORY_ENDPOINT = "/api/2.0/mlflow/metrics/get-history"
+ARTIFACTS_ENDPOINT = "/mlflow-artifacts/artifacts"
+
+
+@functools.lru_cache(maxsize=None)
+def get_ssl_context(server_cert_path):
+    return ssl.create_default_context(cafile=server_cert_path)
+
+
+def get_request_options(host_creds):
+    """Return the aiohttp request options matching the authentication and TLS
+    settings of MLFlow host credentials, None for the settings only supported by
+    the MLFlow HTTP client (client certificates, AWS signatures, Databricks SDK
+    and custom authentication)"""
+    for unsupported in (
+        "aws_sigv4",
+        "auth",
+        "client_cert_path",
+        "use_databricks_sdk",
+        "client_id",
+    ):
+        if getattr(host_creds, unsupported, None):
+            return None
+
+    headers = {}
+    if host_creds.username and host_creds.password:
+        credentials = "%s:%s" % (host_creds.username, host_creds.password)
+        headers["Authorization"] = "Basic %s" % base64.standard_b64encode(
+            credentials.encode("utf-8")
+        ).decode("ascii")
+    elif host_creds.token:
+        headers["Authorization"] = "Bearer %s" % host_creds.token
+
+    options = {"headers": headers}
+
+    if host_creds.ignore_tls_verification:
+        options["ssl"] = False
+    elif host_creds.server_cert_path:
+        options["ssl"] = get_ssl_context(host_creds.server_cert_path)
+
+    return options
+
+
+def get_url(host, endpoint):
+    return "%s/%s" % (host.rstrip("/"), endpoint.lstrip("/"))
+
+
+def get_metric_point(metric_key, metric):
+    # Default values are omitted from the JSON responses, NaN and infinite
+    # values are strings
+    return MetricPoint(
+        metric_key,
+        float(metric.get("value", 0)),
+        int(metric.get("timestamp", 0)),
+        int(metric.get("step", 0)),
+    )
+
+
+class AsyncHttpClient(object):
+    """Send the requests to the MLFlow tracking server from an asyncio event
+    loop running in a background thread.
+
+    The methods without the async_ prefix are the synchronous facade, they can
+    be called from any thread and block until their requests are done. All the
+    requests share the same connection pool, which opens at most
+    max_connections_per_host connections to each host.
+
+    Metric histories and artifact listings are gathered on the event loop,
+    downloads are not: each one blocks its calling thread, so the number of
+    concurrent downloads is the number of threads calling download_artifact.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        max_retries=DEFAULT_MAX_RETRIES,
+    ):
+        if aiohttp is None:
+            raise ImportError("Asynchronous I/O requires aiohttp")
+
+        self.max_connections_per_host = max_connections_per_host
+        self.backoff = Backoff(max_retries=max_retries)
+
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._session = None
+
+    def get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever)
+                self._thread.daemon = True
+                self._thread.start()
+
+            return self._loop
+
+    def run(self, coroutine):
+        """Run a coroutine on the event loop and return its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.get_loop()).result()
+
+    def close(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+
+        if loop is None:
+            return
+
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), loop).result()
+            self._session = None
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    def get_session(self):
+        # Only called from the event loop, no lock needed
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=0, limit_per_host=self.max_connections_per_host
+                ),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=60),
+            )
+
+        return self._session
+
+    def can_use_store(self, store):
+        return is_rest_store(store) and (
+            get_request_options(store.get_host_creds()) is not None
+        )
+
+    def can_use_artifact_repository(self, artifact_repository):
+        return is_http_artifact_repository(artifact_repository) and (
+            get_request_options(artifact_repository._host_creds) is not None
+        )
+
+    async def async_get(self, host_creds, url, params=None):
+        """Return the response of a GET request, connection errors and
+        retryable statuses are retried with an exponential backoff. The
+        response must be released by the caller."""
+        options = get_request_options(host_creds)
+
+        for attempt in itertools.count():
+            try:
+                response = await self.get_session().get(url, params=params, **options)
+
+                if (
+                    response.status not in RETRYABLE_STATUS_CODES
+                    or attempt >= self.backoff.max_retries
+                ):
+                    await self.check_response(url, response)
+                    return response
+
+                response.release()
+                reason = "status %d" % response.status
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.backoff.max_retries:
+                    raise
+
+                reason = repr(e)
+
+            delay = self.backoff.get_delay(attempt)
+            LOGGER.debug(
+                "Request to %s failed with %s, retrying in %.1fs", url, reason, delay
+            )
+            await asyncio.sleep(delay)
+
+    async def check_response(self, url, response):
+        if response.status == 200:
+            return
+
+        text = await response.text()
+        response.release()
+
+        # Same errors as the MLFlow HTTP client
+        try:
+            error = json.loads(text)
+        except ValueError:
+            error = None
+
+        if isinstance(error, dict) and "error_code" in error:
+            raise RestException(error)
+
+        raise MlflowException(
+            "API request to %s failed with error code %d != 200. Response body: %r"
+            % (url, response.status, text)
+        )
+
+    async def async_get_json(self, host_creds, url, params=None):
+        response = await self.async_get(host_creds, url, params)
+        async with response:
+            return await response.json(content_type=None)
+
+    async def async_get_metric_history(self, host_creds, run_id, metric_key):
+        url = get_url(host_creds.host, METRIC_HISTORY_ENDPOINT)
+        params = {"run_id": run_id, "run_uuid": run_id, "metric_key": metric_key}
+
+        metric_history = []
+        while True:
+            response = await self.async_get_json(host_creds, url, params)
+
+            metric_history.extend(
+                get_metric_point(metric_key, metric)
+                for metric in response.get("metrics", [])
+            )
+
+            page_token = response.get("next_page_token")
+            if not page_token:
+                return metric_history
+
+            params["page_token"] = page_token
+
+    def get_metric_histories(self, store, run_id, metric_keys):
+        """Return the (metric_key, metric_history) of the metric keys of a run
+        of a REST store, fetched concurrently"""
+        host_creds = store.get_host_creds()
+
+        async def get_metric_histories():
+            return await asyncio.gather(
+                *[
+                    self.async_get_metric_history(host_creds, run_id, metric_key)
+                    for metric_key in metric_keys
+                ]
+            )
+
+        return list(zip(metric_keys, self.run(get_metric_histories())))
+
+    async def async_list_artifacts(self, artifact_repository, path=None):
+        # Same request and result as HttpArtifactRepository.list_artifacts
+        url, _, tail = artifact_repository.artifact_uri.partition(ARTIFACTS_ENDPOINT)
+        root = tail.lstrip("/")
+        params = {"path": posixpath.join(root, path) if path else root}
+
+        response = await self.async_get_json(
+            artifact_repository._host_creds, get_url(url, ARTIFACTS_ENDPOINT), params
+        )
+
+        file_infos = []
+        for item in response.get("files", []):
+            item_path = posixpath.normpath(item["path"])
+            if item_path.startswith("/") or item_path.split("/")[0] == "..":
+                raise MlflowException("Invalid artifact path: %r" % item["path"])
+
+            file_infos.append(
+                FileInfo(
+                    posixpath.join(path, item_path) if path else item_path,
+                    item["is_dir"],
+                    int(item["file_size"]) if "file_size" in item else None,
+                )
+            )
+
+        return sorted(file_infos, key=lambda file_info: file_info.path)
+
+    def list_artifacts(self, artifact_repository, path=None):
+        return self.run(self.async_list_artifacts(artifact_repository, path))
+
+    def walk_artifacts(self, artifact_repository):
+        """Return the files of an artifact repository, the directories of each
+        level of the tree are listed concurrently"""
+
+        async def walk_artifacts():
+            artifacts = []
+            # None is for the root
+            nodes = [None]
+
+            while nodes:
+                listings = await asyncio.gather(
+                    *[
+                        self.async_list_artifacts(artifact_repository, node)
+                        for node in nodes
+                    ]
+                )
+
+                nodes = []
+                for artifact in itertools.chain.from_iterable(listings):
+                    if artifact.is_dir:
+                        nodes.append(artifact.path)
+                    else:
+                        artifacts.append(artifact)
+
+            return artifacts
+
+        return self.run(walk_artifacts())
+
+    async def async_download_file(self, artifact_repository, artifact_path, fileobj):
+        host_creds = artifact_repository._host_creds
+
+        response = await self.async_get(
+            host_creds, get_url(host_creds.host, artifact_path)
+        )
+        # Disk writes would block every other request of the event loop
+        loop = asyncio.get_running_loop()
+
+        async with response:
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                await loop.run_in_executor(None, fileobj.write, chunk)
+
+    def download_artifact(self, artifact_repository, artifact_path, dst_path):
+        """Download a file artifact below dst_path and return its local path"""
+        local_path = os.path.join(dst_path, *artifact_path.split("/"))
+
+        local_dir = os.path.dirname(local_path)
+        if not os.path.isdir(local_dir):
+            os.makedirs(local_dir, exist_ok=True)
+
+        try:
+            with open(local_path, "wb") as fileobj:
+                self.run(
+                    self.async_download_file(
+                        artifact_repository, artifact_path, fileobj
+                    )
+                )
+        except Exception:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            raise
+
+        return local_path
+
+
+class AsyncArtifactRepository(object):
+    """Wrap an HTTP artifact repository so its artifacts are listed and
+    downloaded through an AsyncHttpClient, every other attribute is the one of
+    the wrapped repository.
+
+    Only files can be downloaded, directories are walked with
+    walk_artifacts.
+    """
+
+    def __init__(self, artifact_repository, client):
+        self.artifact_repository = artifact_repository
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.artifact_repository, name)
+
+    def list_artifacts(self, path=None):
+        return self.client.list_artifacts(self.artifact_repository, path)
+
+    def walk_artifacts(self):
+        return self.client.walk_artifacts(self.artifact_repository)
+
+    def download_artifacts(self, artifact_path, dst_path):
+        return self.client.download_artifact(
+            self.artifact_repository, artifact_path, dst_path
+        )
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2020 Comet.ml Team.
+#
+# This file is part of Comet-For-MLFlow
+# (see https://github.com/comet-ml/comet-for-mlflow).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+"""Keep the downloaded artifacts on disk to download them only once."""
+
+from __future__ import print_function
+
+import hashlib
+import logging
+import os
+import os.path
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from .compat import get_artifact_fingerprint
+from .file_writer import generate_guid, link_or_copy
+from .utils import get_artifact_size
+
+LOGGER = logging.getLogger()
+
+CACHE_INDEX_FILENAME = "index.db"
+
+# Maximum size of the artifacts kept in the cache
+DEFAULT_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+# Smaller artifacts are only looked up by location, asking the storage for
+# their fingerprint would cost about as much as downloading them
+MIN_FINGERPRINT_SIZE = 1024 * 1024
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_file_digest(filepath):
+    """Return the SHA-256 of the content of a file"""
+    digest = hashlib.sha256()
+
+    with open(filepath, "rb") as content_file:
+        for chunk in iter(lambda: content_file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def get_key_digest(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ArtifactCache(object):
+    """A cache of the downloaded artifacts, on disk.
+
+    An artifact is found in the cache by its location, its artifact URI, path
+    and size, or by the fingerprint of its content reported by its storage (see
+    get_artifact_fingerprint) and its size, so an artifact logged in many runs,
+    like the dataset or the base model of a sweep, is only downloaded once.
+
+    Files are stored once, named after the SHA-256 of their content which is
+    checked the first time they are reused, and hardlinked into the download
+    directories when possible. The least recently used files are evicted once
+    the cache exceeds max_bytes; a max_bytes of 0 disables the cache.
+
+    With a cache_dir, the cache is kept between migrations, otherwise it lives
+    in a temporary directory removed on close.
+    """
+
+    def __init__(
+        self,
+        cache_dir=None,
+        max_bytes=DEFAULT_CACHE_MAX_BYTES,
+        min_size=MIN_FINGERPRINT_SIZE,
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.min_size = min_size
+
+        self._directory = None
+        self._connection = None
+        # Artifacts are downloaded from several threads
+        self._lock = threading.Lock()
+        # Concurrent downloads of the same artifact wait for the first one, the
+        # [lock, users] of a key are dropped once it isn't used anymore
+        self._key_locks = {}
+        # Files whose content was checked by this process
+        self._verified = set()
+
+    def open(self):
+        """Open the cache index, called with the lock held"""
+        if self._connection is not None:
+            return
+
+        if self.cache_dir is None:
+            self._directory = tempfile.mkdtemp()
+        else:
+            self._directory = self.cache_dir
+            if not os.path.isdir(self._directory):
+                os.makedirs(self._directory)
+
+        self._connection = sqlite3.connect(
+            os.path.join(self._directory, CACHE_INDEX_FILENAME),
+            check_same_thread=False,
+        )
+
+        with self._connection:
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS files (
+                    digest TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS keys (
+                    key TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL
+                )"""
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS keys_digest ON keys (digest)"
+            )
+
+    def close(self):
+        """Close the cache index, a temporary cache is removed"""
+        with self._lock:
+            connection, self._connection = self._connection, None
+            directory, self._directory = self._directory, None
+            self._key_locks = {}
+            self._verified = set()
+
+        if connection is not None:
+            connection.close()
+
+        if directory is not None and self.cache_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    @contextmanager
+    def lock_key(self, key):
+        with self._lock:
+            self.open()
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                yield
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1] and self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+    def get_location_key(self, artifact_store, artifact):
+        return get_key_digest(
+            "location:%s/%s:%d"
+            % (
+                artifact_store.artifact_uri.rstrip("/"),
+                artifact.path,
+                get_artifact_size(artifact),
+            )
+        )
+
+    def get_content_key(self, artifact_store, artifact):
+        """Return the content key of an artifact, None when its storage doesn't
+        report a fingerprint"""
+        if get_artifact_size(artifact) < self.min_size:
+            return None
+
+        try:
+            fingerprint = get_artifact_fingerprint(artifact_store, artifact.path)
+        except Exception:
+            LOGGER.debug("Can't get the fingerprint of %r", artifact, exc_info=True)
+            return None
+
+        if fingerprint is None:
+            return None
+
+        return get_key_digest("content:%s:%d" % (fingerprint, artifact.file_size))
+
+    def get_file_path(self, digest):
+        return os.path.join(self._directory, "files", digest[:2], digest)
+
+    def download_artifact(self, artifact_store, artifact, download_dir):
+        """Download an artifact into download_dir, or link it from the cache,
+        and return its local path and the number of bytes not downloaded"""
+        if not self.max_bytes:
+            return (artifact_store.download_artifacts(artifact.path, download_dir), 0)
+
+        location_key = self.get_location_key(artifact_store, artifact)
+
+        with self.lock_key(location_key):
+            linked = self.link_cached_file(location_key, artifact, download_dir)
+            if linked is not None:
+                local_path, size, _ = linked
+                return (local_path, size)
+
+            content_key = self.get_content_key(artifact_store, artifact)
+            if content_key is None:
+                return self.download_and_add(
+                    artifact_store, artifact, download_dir, [location_key]
+                )
+
+            with self.lock_key(content_key):
+                linked = self.link_cached_file(content_key, artifact, download_dir)
+                if linked is not None:
+                    # The next lookups of this location don't need the storage,
+                    # the file may have been evicted since it was linked
+                    local_path, size, digest = linked
+                    self.add_keys(digest, [location_key])
+                    return (local_path, size)
+
+                return self.download_and_add(
+                    artifact_store, artifact, download_dir, [location_key, content_key]
+                )
+
+    def get_digest(self, key):
+        """Return the (digest, size) of the file cached for a key, None if there
+        is none"""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT files.digest, files.size FROM keys"
+                " JOIN files ON files.digest = keys.digest WHERE keys.key = ?",
+                (key,),
+            ).fetchone()
+
+    def link_cached_file(self, key, artifact, download_dir):
+        """Link the file cached for a key into download_dir and return its
+        (local path, size, digest), None if there is none or it is corrupted"""
+        row = self.get_digest(key)
+        if row is None:
+            return None
+
+        digest, size = row
+        cached_path = self.get_file_path(digest)
+
+        if not self.check_file(cached_path, digest, size):
+            LOGGER.warning(
+                "Cached copy of artifact %r is corrupted, downloading it again",
+                artifact.path,
+            )
+            self.remove_files([digest])
+            return None
+
+        local_path = os.path.join(download_dir, *artifact.path.split("/"))
+        if not os.path.isdir(os.path.dirname(local_path)):
+            os.makedirs(os.path.dirname(local_path))
+
+        try:
+            link_or_copy(cached_path, local_path)
+        except OSError:
+            # Evicted meanwhile by another thread
+            return None
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE files SET last_used = ? WHERE digest = ?",
+                (time.time(), digest),
+            )
+
+        return (local_path, size, digest)
+
+    def check_file(self, cached_path, digest, size):
+        """Check the size of a cached file, and its content the first time it's
+        used by this process"""
+        try:
+            if os.path.getsize(cached_path) != size:
+                return False
+        except OSError:
+            return False
+
+        if digest not in self._verified:
+            if get_file_digest(cached_path) != digest:
+                return False
+
+            self._verified.add(digest)
+
+        return True
+
+    def download_and_add(self, artifact_store, artifact, download_dir, keys):
+        local_path = artifact_store.download_artifacts(artifact.path, download_dir)
+
+        size = os.path.getsize(local_path)
+        if size <= self.max_bytes:
+            self.add_file(local_path, size, keys)
+
+        return (local_path, 0)
+
+    def add_file(self, local_path, size, keys):
+        digest = get_file_digest(local_path)
+        cached_path = self.get_file_path(digest)
+
+        # The downloaded file is moved or removed once written in the archive,
+        # the cache keeps its own link
+        if not os.path.exists(cached_path):
+            if not os.path.isdir(os.path.dirname(cached_path)):
+                os.makedirs(os.path.dirname(cached_path))
+
+            temp_path = "%s.%s" % (cached_path, generate_guid())
+            link_or_copy(local_path, temp_path)
+            os.rename(temp_path, cached_path)
+
+        self._verified.add(digest)
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO files (digest, size, last_used)"
+                " VALUES (?, ?, ?)",
+                (digest, size, time.time()),
+            )
+
+        self.add_keys(digest, keys)
+        self.evict()
+
+    def add_keys(self, digest, keys):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO keys (key, digest) VALUES (?, ?)",
+                [(key, digest) for key in keys],
+            )
+
+    def evict(self):
+        """Remove the least recently used files beyond max_bytes"""
+        with self._lock:
+            (total_size,) = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM files"
+            ).fetchone()
+
+            if total_size <= self.max_bytes:
+                return
+
+            rows = self._connection.execute(
+                "SELECT digest, size FROM files ORDER BY last_used"
+            ).fetchall()
+
+        evicted = []
+        for digest, size in rows:
+            if total_size <= self.max_bytes:
+                break
+
+            evicted.append(digest)
+            total_size -= size
+
+        if evicted:
+            LOGGER.debug("Evicting %d artifact(s) from the cache", len(evicted))
+            self.remove_files(evicted)
+
+    def remove_files(self, digests):
+        with self._lock, self._connection:
+            for digest in digests:
+                self._connection.execute("DELETE FROM keys WHERE digest = ?", (digest,))
+                self._connection.execute(
+                    "DELETE FROM files WHERE digest = ?", (digest,)
+                )
+
+        for digest in digests:
+            self._verified.discard(digest)
+
+            try:
+                os.remove(self.get_file_path(digest))
+            except OSError:
+                pass
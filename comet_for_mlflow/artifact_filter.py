@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2020 Comet.ml Team.
+#
+# This file is part of Comet-For-MLFlow
+# (see https://github.com/comet-ml/comet-for-mlflow).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+"""Select the artifacts copied into Comet."""
+
+from __future__ import print_function
+
+import fnmatch
+import posixpath
+
+ARTIFACT_COPIED = "copied"
+ARTIFACT_REMOTE = "remote"
+ARTIFACT_SKIPPED = "skipped"
+
+
+def match_artifact_path(artifact_path, patterns):
+    """Return True if the path of an artifact, or its file name, matches one of
+    the glob patterns"""
+    file_name = posixpath.basename(artifact_path)
+
+    return any(
+        fnmatch.fnmatchcase(artifact_path, pattern)
+        or fnmatch.fnmatchcase(file_name, pattern)
+        for pattern in patterns
+    )
+
+
+class ArtifactFilter(object):
+    """Decide what happens to each artifact before it's downloaded.
+
+    Artifacts are skipped when they don't match any of the include glob
+    patterns, if any, or match one of the exclude patterns. Patterns are
+    matched against the artifact path and its file name, so extensions are
+    selected with patterns like "*.ckpt". Artifacts larger than max_bytes are
+    logged as remote assets pointing at their artifact URI instead of being
+    copied.
+    """
+
+    def __init__(self, include=None, exclude=None, max_bytes=None):
+        self.include = include or []
+        self.exclude = exclude or []
+        self.max_bytes = max_bytes
+
+    def get_action(self, artifact):
+        """Return ARTIFACT_COPIED, ARTIFACT_REMOTE or ARTIFACT_SKIPPED"""
+        if self.include and not match_artifact_path(artifact.path, self.include):
+            return ARTIFACT_SKIPPED
+
+        if match_artifact_path(artifact.path, self.exclude):
+            return ARTIFACT_SKIPPED
+
+        # Some artifact repositories don't report the file sizes, those
+        # artifacts are copied
+        if self.max_bytes is not None and (artifact.file_size or 0) > self.max_bytes:
+            return ARTIFACT_REMOTE
+
+        return ARTIFACT_COPIED
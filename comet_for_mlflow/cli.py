@@ -23,7 +23,13 @@
 import argparse
 import sys
 
-from .comet_for_mlflow import Translator
+from .aio import DEFAULT_MAX_CONNECTIONS_PER_HOST
+from .artifact_cache import DEFAULT_CACHE_MAX_BYTES
+from .comet_for_mlflow import DEFAULT_MAX_INFLIGHT_ARTIFACT_BYTES, Translator
+from .compat import DEFAULT_PAGE_SIZE, LIFECYCLE_VIEW_TYPES, MAX_PAGE_SIZE
+from .downsampling import DOWNSAMPLING_METHODS
+from .file_writer import DEFAULT_COMPRESSION_LEVEL
+from .utils import parse_metric_max_points, parse_positive_int, parse_timestamp
 
 
 def main():
@@ -60,10 +66,77 @@ def main():
         " If not set, reads MLFLOW_TRACKING_URI environment variable",
     )
 
+    parser.add_argument(
+        "--experiment",
+        action="append",
+        dest="experiment_names",
+        metavar="NAME",
+        help="Only migrate the MLFlow experiment with this name, can be repeated",
+    )
+    parser.add_argument(
+        "--experiment-regex",
+        help="Only migrate the MLFlow experiments whose name matches this regex",
+    )
+    parser.add_argument(
+        "--run-filter",
+        help="Only migrate the MLFlow runs matching this MLFlow search filter,"
+        ' for example "metrics.acc > 0.9"',
+    )
+    parser.add_argument(
+        "--since",
+        type=parse_timestamp,
+        help="Only migrate the MLFlow runs started since this date (ISO 8601) or"
+        " timestamp in milliseconds",
+    )
+    parser.add_argument(
+        "--lifecycle",
+        choices=sorted(LIFECYCLE_VIEW_TYPES),
+        help="Only migrate the MLFlow experiments and runs in this lifecycle stage;"
+        " by default all the runs of the active experiments are migrated",
+    )
+
     parser.add_argument(
         "--output-dir",
         help="set the directory to store prepared runs; only relevant with --no-upload",
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Resume a previous migration from the same --output-dir, runs that were"
+        " already prepared or uploaded and didn't change since are skipped",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=parse_positive_int,
+        default=None,
+        help="Number of MLFlow experiments or runs fetched per search request;"
+        " defaults to %d, %d for the runs of local stores"
+        % (DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE),
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="Only sync the runs that ended since the previous sync from the same"
+        " --output-dir, already uploaded runs only send their new metric values",
+    )
+    parser.add_argument(
+        "--no-sql-fast-path",
+        dest="sql_fast_path",
+        action="store_false",
+        default=True,
+        help="Read the metrics of SQL-backed MLFlow stores through the MLFlow API"
+        " instead of direct SQL queries",
+    )
+    parser.add_argument(
+        "--no-file-scanner",
+        dest="file_scanner",
+        action="store_false",
+        default=True,
+        help="Read local mlruns directories through the MLFlow FileStore instead"
+        " of scanning them directly",
+    )
     parser.add_argument(
         "--force-upload",
         action="store_true",
@@ -91,6 +164,145 @@ def main():
         "--email",
         help="Set email address if needed for creating a comet.ml account",
     )
+    parser.add_argument(
+        "--prepare-workers",
+        type=int,
+        default=1,
+        help="Set the number of MLFlow runs prepared concurrently; defaults to 1",
+    )
+    parser.add_argument(
+        "--artifact-workers",
+        type=int,
+        default=1,
+        help="Set the number of concurrent requests to the artifact store for each"
+        " run; defaults to 1",
+    )
+    parser.add_argument(
+        "--max-inflight-artifact-bytes",
+        type=int,
+        default=DEFAULT_MAX_INFLIGHT_ARTIFACT_BYTES,
+        help="Set the maximum size of the artifacts of a run being downloaded"
+        " concurrently with --artifact-workers; defaults to 1GiB",
+    )
+    parser.add_argument(
+        "--async-io",
+        action="store_true",
+        default=False,
+        help="Send the requests to MLFlow tracking servers, metric histories and"
+        " artifacts, concurrently from an asyncio event loop; requires aiohttp",
+    )
+    parser.add_argument(
+        "--max-connections-per-host",
+        type=int,
+        default=DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        help="Set the maximum number of connections opened to the same host with"
+        " --async-io; defaults to %d" % DEFAULT_MAX_CONNECTIONS_PER_HOST,
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        choices=range(10),
+        default=DEFAULT_COMPRESSION_LEVEL,
+        help="Set the compression level of the prepared archives, from 0 (no"
+        " compression) to 9; files that are already compressed are always"
+        " stored as is; defaults to %d" % DEFAULT_COMPRESSION_LEVEL,
+    )
+    parser.add_argument(
+        "--include-artifacts",
+        action="append",
+        metavar="PATTERN",
+        help="Only migrate the artifacts whose path or file name matches this glob"
+        ' pattern, for example "*.json", can be repeated',
+    )
+    parser.add_argument(
+        "--exclude-artifacts",
+        action="append",
+        metavar="PATTERN",
+        help="Don't migrate the artifacts whose path or file name matches this glob"
+        ' pattern, for example "*.ckpt" or "checkpoints/*", can be repeated',
+    )
+    parser.add_argument(
+        "--max-artifact-bytes",
+        type=int,
+        default=None,
+        help="Log the artifacts larger than this size as remote assets linking to"
+        " their MLFlow artifact URI instead of copying them; by default all the"
+        " artifacts are copied",
+    )
+    parser.add_argument(
+        "--min-streamed-artifact-bytes",
+        type=int,
+        default=None,
+        help="Stream the remote artifacts of this size or larger from their"
+        " storage straight into the prepared archives, without a local copy;"
+        " supports S3, Google Cloud Storage, Azure Blob Storage and MLFlow"
+        " tracking servers; by default all the artifacts are downloaded first",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Set the directory where the downloaded artifacts are kept, to be"
+        " reused by the other runs and the next migrations; by default artifacts"
+        " are not cached",
+    )
+    parser.add_argument(
+        "--cache-max-bytes",
+        type=int,
+        default=DEFAULT_CACHE_MAX_BYTES,
+        help="Set the maximum size of the artifact cache of --cache-dir, the least"
+        " recently used artifacts are evicted beyond it, 0 disables the cache;"
+        " defaults to 10GiB",
+    )
+    parser.add_argument(
+        "--max-segment-bytes",
+        type=int,
+        default=None,
+        help="Split the runs whose messages and files exceed this size, in bytes"
+        " before compression, into several archives uploaded one after the other;"
+        " by default each run is a single archive",
+    )
+    parser.add_argument(
+        "--metric-max-points",
+        type=int,
+        help="Downsample the metrics with more values than this on export; by"
+        " default all the values are exported",
+    )
+    parser.add_argument(
+        "--metric-max-points-for",
+        type=parse_metric_max_points,
+        action="append",
+        dest="metric_max_points_overrides",
+        metavar="PATTERN=MAX_POINTS",
+        help="Set the maximum number of values of the metrics matching a glob"
+        " pattern, 0 to export all of them; can be repeated, the first matching"
+        " pattern wins",
+    )
+    parser.add_argument(
+        "--metric-downsampling",
+        choices=DOWNSAMPLING_METHODS,
+        default="lttb",
+        help="Set how metrics are downsampled: lttb keeps the shape of the curve,"
+        " minmax keeps the minimum and maximum of each interval; defaults to lttb",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=False,
+        help="Upload each run as soon as it is prepared instead of preparing all"
+        " runs for review first; the upload confirmation is asked before preparing",
+    )
+    parser.add_argument(
+        "--upload-workers",
+        type=int,
+        default=1,
+        help="Set the number of prepared runs uploaded concurrently; defaults to 1",
+    )
+    parser.add_argument(
+        "--upload-retries",
+        type=int,
+        default=3,
+        help="Set the number of times a failed upload is retried, with an"
+        " exponential backoff; defaults to 3",
+    )
 
     args = parser.parse_args()
 
@@ -102,6 +314,35 @@ def main():
         args.mlflow_store_uri,
         args.answer,
         args.email,
+        prepare_workers=args.prepare_workers,
+        stream=args.stream,
+        upload_workers=args.upload_workers,
+        upload_retries=args.upload_retries,
+        artifact_workers=args.artifact_workers,
+        max_inflight_artifact_bytes=args.max_inflight_artifact_bytes,
+        compression_level=args.compression_level,
+        resume=args.resume,
+        incremental=args.incremental,
+        page_size=args.page_size,
+        experiment_names=args.experiment_names,
+        experiment_regex=args.experiment_regex,
+        run_filter=args.run_filter,
+        since=args.since,
+        lifecycle=args.lifecycle,
+        sql_fast_path=args.sql_fast_path,
+        file_scanner=args.file_scanner,
+        metric_max_points=args.metric_max_points,
+        metric_downsampling=args.metric_downsampling,
+        metric_max_points_overrides=args.metric_max_points_overrides,
+        max_segment_bytes=args.max_segment_bytes,
+        cache_dir=args.cache_dir,
+        cache_max_bytes=args.cache_max_bytes,
+        min_streamed_artifact_bytes=args.min_streamed_artifact_bytes,
+        include_artifacts=args.include_artifacts,
+        exclude_artifacts=args.exclude_artifacts,
+        max_artifact_bytes=args.max_artifact_bytes,
+        async_io=args.async_io,
+        max_connections_per_host=args.max_connections_per_host,
     )
     converter.prepare()
     return 0
@@ -24,11 +24,17 @@
 
 from __future__ import print_function
 
+import collections
+import functools
+import json
 import logging
 import os.path
+import queue
+import re
 import shutil
 import sys
 import tempfile
+import threading
 import traceback
 from os.path import abspath
 from zipfile import ZipFile
@@ -38,7 +44,7 @@ from comet_ml.config import get_api_key, get_config
 from comet_ml.connection import Reporting
 from comet_ml.exceptions import CometRestApiException
 from comet_ml.offline import upload_single_offline_experiment
-from comet_ml.utils import merge_url, url_join
+from comet_ml.utils import format_bytes, merge_url, url_join
 from mlflow.entities.run_tag import RunTag
 from mlflow.exceptions import RestException
 from mlflow.tracking import _get_store
@@ -47,16 +53,51 @@ from mlflow.tracking.registry import UnsupportedModelRegistryStoreURIException
 from tabulate import tabulate
 from tqdm import tqdm
 
+from .aio import (
+    DEFAULT_MAX_CONNECTIONS_PER_HOST,
+    AsyncArtifactRepository,
+    AsyncHttpClient,
+)
+from .artifact_cache import DEFAULT_CACHE_MAX_BYTES, ArtifactCache
+from .artifact_filter import (
+    ARTIFACT_COPIED,
+    ARTIFACT_REMOTE,
+    ARTIFACT_SKIPPED,
+    ArtifactFilter,
+)
 from .compat import (
+    can_search_mlflow_runs,
+    can_stream_artifacts,
     get_artifact_repository,
     get_mlflow_run_id,
+    get_mlflow_run_update_time,
+    is_file_store,
+    is_full_mlflow_run,
+    is_local_artifact_repository,
+    join_mlflow_filters,
+    quote_mlflow_filter_value,
     search_mlflow_store_experiments,
     search_mlflow_store_runs,
+    stream_artifact,
+)
+from .downsampling import MetricDownsampling
+from .file_writer import DEFAULT_COMPRESSION_LEVEL, CompressionPolicy, JsonLinesFile
+from .metric_history import (
+    MetricHistoryFetcher,
+    get_metric_columns,
+    get_metric_columns_since,
+    has_unique_steps,
 )
-from .file_writer import JsonLinesFile
+from .mlruns import MlrunsScanner
+from .state import RUN_FAILED, RUN_UPLOADED, MigrationState
+from .uploader import Backoff, UploadFailed
 from .utils import (
+    get_artifact_size,
+    get_comet_experiment_metadata,
     get_comet_project_name,
+    get_segment_path,
     get_store_id,
+    imap_ordered,
     save_api_key,
     walk_run_artifacts,
     write_comet_experiment_metadata_file,
@@ -85,6 +126,16 @@ def except_hook(exc_type, exc_value, exc_traceback):
 
 sys.excepthook = except_hook
 
+# Maximum number of prepared runs waiting to be uploaded in streaming mode
+UPLOAD_QUEUE_SIZE = 16
+
+# Name of the Comet other listing the original number of values of the
+# downsampled metrics
+DOWNSAMPLED_METRICS_OTHER = "mlflow.downsampledMetrics"
+
+# Maximum size of the artifacts of a run being downloaded at the same time
+DEFAULT_MAX_INFLIGHT_ARTIFACT_BYTES = 1024 * 1024 * 1024
+
 BANNER = r""" __   __         ___ ___     ___  __   __                 ___       __
 /  ` /  \  |\/| |__   |  __ |__  /  \ |__) __  |\/| |    |__  |    /  \ |  |
 \__, \__/  |  | |___  |     |    \__/ |  \     |  | |___ |    |___ \__/ |/\|
@@ -102,6 +153,35 @@ class Translator(object):
         mlflow_store_uri,
         answer,
         email,
+        prepare_workers=1,
+        stream=False,
+        upload_workers=1,
+        upload_retries=3,
+        artifact_workers=1,
+        max_inflight_artifact_bytes=DEFAULT_MAX_INFLIGHT_ARTIFACT_BYTES,
+        compression_level=DEFAULT_COMPRESSION_LEVEL,
+        resume=False,
+        incremental=False,
+        page_size=None,
+        experiment_names=None,
+        experiment_regex=None,
+        run_filter=None,
+        since=None,
+        lifecycle=None,
+        sql_fast_path=True,
+        file_scanner=True,
+        metric_max_points=None,
+        metric_downsampling="lttb",
+        metric_max_points_overrides=None,
+        max_segment_bytes=None,
+        cache_dir=None,
+        cache_max_bytes=DEFAULT_CACHE_MAX_BYTES,
+        min_streamed_artifact_bytes=None,
+        include_artifacts=None,
+        exclude_artifacts=None,
+        max_artifact_bytes=None,
+        async_io=False,
+        max_connections_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST,
     ):
         self.answer = answer
         self.email = email
@@ -124,7 +204,14 @@ class Translator(object):
             self.workspace = details["defaultWorkspaceName"]
 
         if output_dir is None:
+            if resume or incremental:
+                LOGGER.warning(
+                    "--resume and --incremental need the --output-dir of the"
+                    " previous migration, starting a new one"
+                )
             output_dir = tempfile.mkdtemp()
+        elif not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
 
         # MLFlow conversion
         try:
@@ -142,27 +229,31 @@ class Translator(object):
                 )
             raise
 
+        # Local mlruns directories are read directly instead of through the
+        # FileStore unless disabled
+        if file_scanner and is_file_store(self.store):
+            self.mlruns_scanner = MlrunsScanner(self.store.root_directory)
+        else:
+            self.mlruns_scanner = None
+
+        # The requests to the tracking server and its artifacts can be sent
+        # concurrently from an event loop, opt-in
+        if async_io:
+            self.async_client = AsyncHttpClient(max_connections_per_host)
+        else:
+            self.async_client = None
+
+        # Database-backed stores are read directly with SQL queries unless
+        # disabled
+        self.metric_fetcher = MetricHistoryFetcher(
+            self.store, sql_fast_path, self.mlruns_scanner, self.async_client
+        )
+
         try:
             self.model_registry_store = get_model_registry_store(mlflow_store_uri)
         except UnsupportedModelRegistryStoreURIException:
             self.model_registry_store = None
 
-        try:
-            self.mlflow_experiments = search_mlflow_store_experiments(self.store)
-        except RestException as e:
-            if self._is_authentication_error(e):
-                self._log_authentication_error(
-                    mlflow_store_uri, "accessing MLflow experiments"
-                )
-            raise
-        except Exception as e:
-            if self._is_authentication_error(e):
-                self._log_authentication_error(
-                    mlflow_store_uri, "accessing MLflow experiments"
-                )
-            raise
-        self.len_experiments = len(self.mlflow_experiments)  # We start counting at 0
-
         self.summary = {
             "experiments": 0,
             "runs": 0,
@@ -170,16 +261,145 @@ class Translator(object):
             "params": 0,
             "metrics": 0,
             "artifacts": 0,
+            "reused_runs": 0,
+            "skipped_runs": 0,
+            "saved_round_trips": 0,
+            "dropped_metric_values": 0,
+            "deduplicated_bytes": 0,
+            "remote_artifacts": 0,
+            "skipped_artifacts": 0,
         }
+        # Runs can be prepared concurrently, protect the summary counters
+        self._summary_lock = threading.Lock()
 
         self.upload_experiment = upload_experiment
         self.output_dir = output_dir
         self.force_upload = force_upload
         self.mlflow_store_uri = mlflow_store_uri
+        self.page_size = page_size
+        # Only migrate some experiments or runs, filters are sent to the MLFlow
+        # store when it supports them
+        if experiment_names:
+            self.experiment_names = list(dict.fromkeys(experiment_names))
+        else:
+            self.experiment_names = None
+        if experiment_regex:
+            self.experiment_regex = re.compile(experiment_regex)
+        else:
+            self.experiment_regex = None
+        self.run_filter = run_filter
+        if run_filter and not can_search_mlflow_runs(self.store):
+            LOGGER.error(
+                "This MLFlow store can't search runs, --run-filter is ignored and"
+                " all the runs are migrated"
+            )
+        self.since = since
+        self.lifecycle = lifecycle
+        # Experiments are listed lazily, one page at a time
+        self.mlflow_experiments = self.search_mlflow_experiments()
+        self.prepare_workers = prepare_workers
+        self.stream = stream
+        self.upload_workers = upload_workers
+        self.artifact_workers = artifact_workers
+        self.max_inflight_artifact_bytes = max_inflight_artifact_bytes
+        self.compression = CompressionPolicy(compression_level)
+        # Artifacts can be downloaded once, across runs and migrations, opt-in
+        # as the cached files are hashed and kept on disk
+        if cache_dir is None:
+            cache_max_bytes = 0
+        self.artifact_cache = ArtifactCache(cache_dir, cache_max_bytes)
+        # Large remote artifacts can be streamed into the archives instead
+        self.min_streamed_artifact_bytes = min_streamed_artifact_bytes
+        # Artifacts can be skipped or only linked, opt-in
+        if include_artifacts or exclude_artifacts or max_artifact_bytes is not None:
+            self.artifact_filter = ArtifactFilter(
+                include_artifacts, exclude_artifacts, max_artifact_bytes
+            )
+        else:
+            self.artifact_filter = None
+        # Metric values can be downsampled on export, opt-in
+        if metric_max_points or metric_max_points_overrides:
+            self.metric_downsampling = MetricDownsampling(
+                metric_max_points, metric_downsampling, metric_max_points_overrides
+            )
+        else:
+            self.metric_downsampling = None
+        # Large runs can be split into several archives, uploaded in order
+        if max_segment_bytes is not None and force_upload:
+            # A forced upload creates a new experiment for the first archive,
+            # the next ones would be appended to the previous experiment
+            LOGGER.error(
+                "--max-segment-bytes can't be used with --force-upload, it is"
+                " ignored and each run is prepared as a single archive"
+            )
+            max_segment_bytes = None
+        self.max_segment_bytes = max_segment_bytes
+        # Progress is always recorded so an interrupted migration can be resumed
+        self.state = MigrationState(output_dir)
+        # Incremental syncs skip the runs uploaded and unchanged since like
+        # resumed migrations
+        self.resume = resume or incremental
+        self.incremental = incremental
+        # Shared by all the upload workers so rate-limiting slows down all of them
+        self.upload_backoff = Backoff(max_retries=upload_retries)
+        self.failed_uploads = []
+
+    def search_mlflow_experiments(self):
+        # One search per experiment name as MLFlow filters don't support OR,
+        # names that can't be quoted are only matched by is_selected_experiment
+        if self.experiment_names:
+            quoted_names = [
+                quote_mlflow_filter_value(name) for name in self.experiment_names
+            ]
+        else:
+            quoted_names = [None]
+
+        if None in quoted_names:
+            filter_strings = [None]
+        else:
+            filter_strings = ["name = %s" % name for name in quoted_names]
+
+        try:
+            for filter_string in filter_strings:
+                experiments = search_mlflow_store_experiments(
+                    self.store, self.page_size, filter_string, self.lifecycle
+                )
+
+                for experiment in experiments:
+                    if self.is_selected_experiment(experiment):
+                        yield experiment
+        except RestException as e:
+            if self._is_authentication_error(e):
+                self._log_authentication_error(
+                    self.mlflow_store_uri, "accessing MLflow experiments"
+                )
+            raise
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self._log_authentication_error(
+                    self.mlflow_store_uri, "accessing MLflow experiments"
+                )
+            raise
+
+    def is_selected_experiment(self, experiment):
+        # Old MLFlow stores can't filter experiments and regexes are not
+        # supported by MLFlow filters
+        if self.experiment_names and experiment.name not in self.experiment_names:
+            return False
+
+        if self.experiment_regex and not self.experiment_regex.search(experiment.name):
+            return False
+
+        return True
 
     def prepare(self):
         LOGGER.info("Starting Comet Extension for MLFlow")
 
+        if self.stream:
+            self.prepare_and_upload()
+            self.log_support()
+            return
+
         LOGGER.info("")
         LOGGER.info("Preparing data locally from: %r", get_store_id(self.store))
         LOGGER.info("You will have an opportunity to review.")
@@ -188,41 +408,171 @@ class Translator(object):
         prepared_data = []
 
         # First prepare all the data except the metadata as we need a project name
-        for experiment_number, experiment in enumerate(self.mlflow_experiments):
-            experiment_name = experiment.experiment_id
-            if experiment.name:
-                experiment_name = experiment.name
+        try:
+            for experiment_number, experiment in enumerate(self.mlflow_experiments):
+                self.log_experiment_start(experiment_number, experiment)
+                try:
+                    prepared_runs = list(self.prepare_mlflow_exp(experiment))
 
-            LOGGER.info(
-                "# Preparing experiment %d/%d: %s",
-                experiment_number + 1,
-                self.len_experiments,
-                experiment_name,
-            )
-            LOGGER.debug(
-                "# Preparing experiment %d/%d: %r",
-                experiment_number + 1,
-                self.len_experiments,
-                experiment,
-            )
-            self.summary["experiments"] += 1
-            try:
-                prepared_runs = list(self.prepare_mlflow_exp(experiment))
-
-                prepared_data.append({"experiment": experiment, "runs": prepared_runs})
-                LOGGER.info("")
-            except Exception:
-                LOGGER.exception(
-                    "# Error preparing experiment %d/%d: %r",
-                    experiment_number + 1,
-                    self.len_experiments,
-                    experiment,
-                )
-                LOGGER.error("")
-                Reporting.report(
-                    "mlflow_error", api_key=self.api_key, err_msg=traceback.format_exc()
-                )
+                    prepared_data.append(
+                        {"experiment": experiment, "runs": prepared_runs}
+                    )
+                    LOGGER.info("")
+                except Exception:
+                    self.log_experiment_error(experiment_number, experiment)
+        finally:
+            self.close_clients()
+
+        self.log_summary()
+
+        LOGGER.info("")
+        LOGGER.info("All prepared data has been saved to: %s", abspath(self.output_dir))
+
+        # Upload or not?
+        should_upload = self.ask_upload("Upload prepared data to Comet ML? [y/N] ")
+
+        if should_upload:
+            self.upload(prepared_data)
+        else:
+            self.save_locally(prepared_data)
+
+        self.log_support()
+
+    def prepare_and_upload(self):
+        """Streaming mode, each run is uploaded as soon as it is prepared so
+        preparation and upload overlap and prepared runs are never accumulated
+        in memory"""
+        LOGGER.info("")
+        LOGGER.info("Preparing data from: %r", get_store_id(self.store))
+        LOGGER.info("Runs are uploaded as soon as they are prepared.")
+
+        should_upload = self.ask_upload(
+            "Upload data to Comet ML as soon as it is prepared? [y/N] "
+        )
+
+        # Bound the number of prepared runs waiting for upload so memory and disk
+        # usage stay flat no matter the number of runs
+        upload_queue = queue.Queue(maxsize=max(UPLOAD_QUEUE_SIZE, self.upload_workers))
+
+        pbar = tqdm(disable=not should_upload)
+
+        uploaders = []
+        for _ in range(max(1, self.upload_workers) if should_upload else 0):
+            uploader = threading.Thread(
+                target=self.upload_worker, args=(upload_queue, pbar)
+            )
+            uploader.daemon = True
+            uploader.start()
+            uploaders.append(uploader)
+
+        all_project_names = []
+
+        try:
+            for experiment_number, experiment in enumerate(self.mlflow_experiments):
+                self.log_experiment_start(experiment_number, experiment)
+                try:
+                    # The project must exist before we upload the first run
+                    if should_upload:
+                        project_name = self.sync_comet_project(experiment)
+                    else:
+                        project_name = get_comet_project_name(
+                            self.store, experiment.name
+                        )
+
+                    all_project_names.append(project_name)
 
+                    # The archives are complete, Comet experiment metadata
+                    # included, as soon as they are prepared
+                    prepared_runs = self.prepare_mlflow_exp(experiment, project_name)
+
+                    for mlflow_run, archive_path in prepared_runs:
+                        if should_upload:
+                            upload_queue.put((mlflow_run, project_name, archive_path))
+
+                    LOGGER.info("")
+                except Exception:
+                    self.log_experiment_error(experiment_number, experiment)
+        finally:
+            # Signal the end of the stream and wait for the pending uploads
+            for _ in uploaders:
+                upload_queue.put(None)
+
+            for uploader in uploaders:
+                uploader.join()
+
+            pbar.close()
+            self.close_clients()
+
+        self.log_summary()
+        LOGGER.info("")
+
+        if should_upload:
+            self.log_failed_uploads()
+            self.log_project_links(all_project_names)
+        else:
+            self.log_upload_instructions()
+
+    def close_clients(self):
+        self.artifact_cache.close()
+
+        if self.async_client is not None:
+            self.async_client.close()
+
+    def upload_worker(self, upload_queue, pbar):
+        while True:
+            item = upload_queue.get()
+
+            if item is None:
+                break
+
+            mlflow_run, project_name, archive_path = item
+
+            self.upload_single_run(
+                mlflow_run, project_name, archive_path, write_metadata=False
+            )
+            pbar.update(1)
+
+    def ask_upload(self, question):
+        # Upload or not?
+        print("")
+        if self.answer is None:
+            upload = input(question) in ("Y", "y")
+        else:
+            upload = self.answer
+        print("")
+
+        should_upload = self.upload_experiment
+        return should_upload and upload
+
+    def log_experiment_start(self, experiment_number, experiment):
+        experiment_name = experiment.experiment_id
+        if experiment.name:
+            experiment_name = experiment.name
+
+        LOGGER.info(
+            "# Preparing experiment %d: %s",
+            experiment_number + 1,
+            experiment_name,
+        )
+        LOGGER.debug(
+            "# Preparing experiment %d: %r",
+            experiment_number + 1,
+            experiment,
+        )
+        self.increment_summary({"experiments": 1})
+
+    def log_experiment_error(self, experiment_number, experiment):
+        LOGGER.exception(
+            "# Error preparing experiment %d: %r",
+            experiment_number + 1,
+            experiment,
+        )
+        LOGGER.error("")
+        Reporting.report(
+            "mlflow_error", api_key=self.api_key, err_msg=traceback.format_exc()
+        )
+
+    def log_summary(self):
         table = [
             ("Experiments", "Projects", self.summary["experiments"]),
             ("Runs", "Experiments", self.summary["runs"]),
@@ -239,25 +589,51 @@ class Translator(object):
             )
         )
 
-        LOGGER.info("")
-        LOGGER.info("All prepared data has been saved to: %s", abspath(self.output_dir))
+        if self.summary["reused_runs"]:
+            LOGGER.info(
+                "%d prepared run(s) were reused from a previous migration",
+                self.summary["reused_runs"],
+            )
 
-        # Upload or not?
-        print("")
-        if self.answer is None:
-            upload = input("Upload prepared data to Comet ML? [y/N] ") in ("Y", "y")
-        else:
-            upload = self.answer
-        print("")
+        if self.summary["skipped_runs"]:
+            LOGGER.info(
+                "%d run(s) were skipped as they were uploaded by a previous migration",
+                self.summary["skipped_runs"],
+            )
 
-        should_upload = self.upload_experiment
-        should_upload = should_upload and upload
+        if self.summary["dropped_metric_values"]:
+            LOGGER.info(
+                "%d metric value(s) were dropped by the metric downsampling",
+                self.summary["dropped_metric_values"],
+            )
 
-        if should_upload:
-            self.upload(prepared_data)
-        else:
-            self.save_locally(prepared_data)
+        if self.summary["remote_artifacts"]:
+            LOGGER.info(
+                "%d artifact(s) were logged as remote assets, they are larger than"
+                " --max-artifact-bytes",
+                self.summary["remote_artifacts"],
+            )
 
+        if self.summary["skipped_artifacts"]:
+            LOGGER.info(
+                "%d artifact(s) were skipped by the artifact filters",
+                self.summary["skipped_artifacts"],
+            )
+
+        if self.summary["deduplicated_bytes"]:
+            LOGGER.info(
+                "%s of artifacts were reused from the artifact cache instead of"
+                " being downloaded again",
+                format_bytes(self.summary["deduplicated_bytes"]),
+            )
+
+        if self.summary["saved_round_trips"]:
+            LOGGER.info(
+                "%d MLFlow request(s) were saved by reusing the search results",
+                self.summary["saved_round_trips"],
+            )
+
+    def log_support(self):
         LOGGER.info("")
         LOGGER.info(
             """If you need support, you can contact us at http://chat.comet.com/"""
@@ -265,200 +641,753 @@ class Translator(object):
         )
         LOGGER.info("")
 
-    def prepare_mlflow_exp(
-        self,
-        exp,
-    ):
-        runs_info = search_mlflow_store_runs(self.store, exp.experiment_id)
-        len_runs = len(runs_info)
+    def increment_summary(self, counts):
+        with self._summary_lock:
+            for key, value in counts.items():
+                self.summary[key] += value
+
+    def prepare_mlflow_exp(self, exp, project_name=None):
+        filters = [self.run_filter]
+
+        if self.since is not None:
+            filters.append("attributes.start_time >= %d" % self.since)
+
+        sync_mark = None
+        if self.incremental:
+            sync_mark = self.state.get_sync_mark(exp.experiment_id)
+
+            # Only fetch the runs that ended after the last sync
+            if sync_mark is not None:
+                LOGGER.info("## Only syncing runs that ended after %d", sync_mark)
+                filters.append("attributes.end_time > %d" % sync_mark)
+
+        filter_string = join_mlflow_filters(filters)
+
+        if self.mlruns_scanner is not None and not filter_string:
+            # MLFlow search filters are only evaluated by the store
+            runs_info = self.mlruns_scanner.iter_runs(exp.experiment_id, self.lifecycle)
+        elif not can_search_mlflow_runs(self.store):
+            # Old MLFlow stores ignore the filters, the dates are checked here
+            runs_info = (
+                run_info
+                for run_info in search_mlflow_store_runs(
+                    self.store, exp.experiment_id, None, self.page_size, self.lifecycle
+                )
+                if self.is_selected_run(run_info, sync_mark)
+            )
+        else:
+            # Runs are searched one page at a time and prepared as soon as
+            # their page is received
+            runs_info = search_mlflow_store_runs(
+                self.store,
+                exp.experiment_id,
+                filter_string,
+                self.page_size,
+                self.lifecycle,
+            )
+
+        def prepare_run(numbered_run_info):
+            run_number, run_info = numbered_run_info
+            return self.prepare_mlflow_run(run_number, run_info, exp, project_name)
+
+        # Runs are prepared concurrently with several workers but the prepared
+        # runs are still returned in the search order
+        prepared_runs = imap_ordered(
+            prepare_run, enumerate(runs_info), self.prepare_workers
+        )
+
+        try:
+            for prepared_run in prepared_runs:
+                if prepared_run:
+                    self.increment_summary({"runs": 1})
+                    yield prepared_run
+        except Exception:
+            # The runs not listed yet may have ended before the runs uploaded,
+            # the next syncs must not skip them
+            if self.incremental:
+                self.state.hold_sync_mark(exp.experiment_id, sync_mark)
+            raise
+
+        if self.incremental:
+            self.state.release_sync_mark(exp.experiment_id)
 
-        for run_number, run_info in enumerate(runs_info):
-            try:
-                run_id = get_mlflow_run_id(run_info)
+    def is_selected_run(self, run_info, sync_mark):
+        """Apply --since and the sync mark like the MLFlow filters would"""
+        if hasattr(run_info, "info"):
+            run_info = run_info.info
 
-                run = self.store.get_run(run_id)
+        if self.since is not None and run_info.start_time < self.since:
+            return False
+
+        if sync_mark is not None:
+            if run_info.end_time is None or run_info.end_time <= sync_mark:
+                return False
+
+        return True
+
+    def prepare_mlflow_run(self, run_number, run_info, exp, project_name):
+        run_id = None
+        try:
+            run_id = get_mlflow_run_id(run_info)
+
+            if self.resume:
+                migrated_run = self.get_migrated_run(run_number, run_info, project_name)
+                if migrated_run is not None:
+                    # Either a prepared run or False if already uploaded
+                    return migrated_run or None
+
+            # Runs uploaded by a previous sync only send the new metric values
+            metrics_since = None
+            if self.incremental:
+                metrics_since = self.state.get_uploaded_metrics_until(run_id)
+
+            run = self.get_mlflow_run(run_info)
+            if metrics_since is None:
                 LOGGER.info(
-                    "## Preparing run %d/%d [%s]",
+                    "## Preparing run %d [%s]",
                     run_number + 1,
-                    len_runs,
                     run_id,
                 )
-                LOGGER.debug(
-                    "## Preparing run %d/%d: %r", run_number + 1, len_runs, run
-                )
-
-                offline_archive = self.prepare_single_mlflow_run(run, exp.name)
-
-                if offline_archive:
-                    self.summary["runs"] += 1
-                    yield (run, offline_archive)
-            except Exception:
-                LOGGER.exception(
-                    "## Error preparing run %d/%d [%s]",
+            else:
+                LOGGER.info(
+                    "## Preparing changes of run %d [%s]",
                     run_number + 1,
-                    len_runs,
                     run_id,
                 )
-                LOGGER.error("")
-                Reporting.report(
-                    "mlflow_error", api_key=self.api_key, err_msg=traceback.format_exc()
+            LOGGER.debug("## Preparing run %d: %r", run_number + 1, run)
+
+            offline_archive = self.prepare_single_mlflow_run(
+                run, exp.name, project_name, metrics_since
+            )
+
+            if offline_archive:
+                return (run, offline_archive)
+        except Exception:
+            LOGGER.exception(
+                "## Error preparing run %d [%s]",
+                run_number + 1,
+                run_id,
+            )
+            LOGGER.error("")
+            # Failed runs hold the sync mark back so the next syncs retry them
+            if run_id is not None:
+                self.state.mark_failed(
+                    run_id, exp.experiment_id, get_mlflow_run_update_time(run_info)
                 )
+            Reporting.report(
+                "mlflow_error", api_key=self.api_key, err_msg=traceback.format_exc()
+            )
+
+        return None
+
+    def get_migrated_run(self, run_number, run_info, project_name):
+        """Return the prepared run when it can be reused, False when it was
+        uploaded already and None when it must be prepared"""
+        run_id = get_mlflow_run_id(run_info)
+
+        run_status = self.state.get_run_status(
+            run_id, get_mlflow_run_update_time(run_info)
+        )
+        if run_status is None:
+            return None
+
+        status, archive_path = run_status
+
+        if status == RUN_UPLOADED:
+            LOGGER.info(
+                "## Skipping run %d [%s], already uploaded",
+                run_number + 1,
+                run_id,
+            )
+            self.increment_summary({"skipped_runs": 1})
+            return False
+
+        if status == RUN_FAILED:
+            return None
+
+        segments, _ = self.state.get_segments(run_id)
+
+        if not all(
+            os.path.isfile(get_segment_path(archive_path, index))
+            for index in range(segments)
+        ):
+            return None
+
+        LOGGER.info(
+            "## Reusing prepared run %d [%s]",
+            run_number + 1,
+            run_id,
+        )
+        run = self.get_mlflow_run(run_info)
 
-    def prepare_single_mlflow_run(self, run, original_experiment_name):
-        self.tmpdir = tempfile.mkdtemp()
+        # Archives prepared for review don't contain the metadata yet
+        if project_name is not None:
+            self.write_experiment_metadata(run, project_name, archive_path)
 
+        self.increment_summary({"reused_runs": 1})
+        return (run, archive_path)
+
+    def get_mlflow_run(self, run_or_info):
+        """Return the full run of a search result, only fetching it when the
+        search didn't return its data"""
+        if is_full_mlflow_run(run_or_info):
+            self.increment_summary({"saved_round_trips": 1})
+            return run_or_info
+
+        return self.store.get_run(get_mlflow_run_id(run_or_info))
+
+    def prepare_single_mlflow_run(
+        self, run, original_experiment_name, project_name=None, metrics_since=None
+    ):
+        """Prepare the offline archive of a MLFlow run. The Comet experiment
+        metadata is only included when the project_name is already known.
+
+        When metrics_since is set, the run was already uploaded and the archive
+        only contains the metric values logged after this timestamp, to be
+        appended to the existing Comet experiment."""
         if not run.info.end_time:
             # Seems to be the case when using the optimizer, some runs doesn't have an end_time
             LOGGER.warning("### Skipping run, no end time")
             return False
 
+        # Each run gets its own temporary directory so runs can be prepared
+        # concurrently
+        tmpdir = tempfile.mkdtemp()
+
+        messages_file_path = os.path.join(tmpdir, "messages.json")
+
+        # Counts are only added to the summary once the run is fully prepared
+        counts = {
+            "tags": 0,
+            "params": 0,
+            "metrics": 0,
+            "artifacts": 0,
+            "dropped_metric_values": 0,
+            "deduplicated_bytes": 0,
+            "remote_artifacts": 0,
+            "skipped_artifacts": 0,
+        }
+
+        archive_path = os.path.join(self.output_dir, "%s.zip" % run.info.run_id)
+
+        is_delta = metrics_since is not None
+
+        # Segments left by a previous preparation of the run
+        self.remove_segments(archive_path, start=1)
+
+        segment_paths = [archive_path]
+
+        def open_segment(resume_strategy):
+            archive = ZipFile(segment_paths[-1], "w")
+
+            if project_name is not None:
+                archive.writestr(
+                    "experiment.json",
+                    json.dumps(
+                        get_comet_experiment_metadata(
+                            run, project_name, self.workspace, resume_strategy
+                        )
+                    ),
+                )
+
+            return archive
+
+        def open_next_segment(archive):
+            archive.close()
+
+            # The next segments append to the Comet experiment created by the
+            # first one
+            segment_paths.append(get_segment_path(archive_path, len(segment_paths)))
+            archives.append(open_segment("get"))
+
+            return archives[-1]
+
+        archives = []
+
+        try:
+            # Files are written in the archive as soon as they are produced
+            archives.append(open_segment(self.get_resume_strategy(is_delta)))
+
+            with JsonLinesFile(
+                messages_file_path,
+                archives[0],
+                self.compression,
+                max_segment_bytes=self.max_segment_bytes,
+                open_next_segment=open_next_segment,
+            ) as json_writer:
+                metrics_until = self.write_run(
+                    run,
+                    original_experiment_name,
+                    json_writer,
+                    counts,
+                    metrics_since,
+                )
+
+            archives[-1].close()
+        except Exception:
+            # Don't leave a partial archive behind
+            for archive in archives:
+                archive.close()
+
+            self.remove_segments(archive_path)
+            raise
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+        if len(segment_paths) > 1:
+            LOGGER.info("### Run split into %d archives", len(segment_paths))
+
+        self.increment_summary(counts)
+
+        self.state.mark_prepared(
+            run.info.run_id,
+            run.info.experiment_id,
+            get_mlflow_run_update_time(run),
+            archive_path,
+            metrics_until,
+            is_delta,
+            len(segment_paths),
+        )
+
+        return archive_path
+
+    def remove_segments(self, archive_path, start=0):
+        """Remove the segments of an archive, from the start-th one"""
+        if start == 0:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            start = 1
+
+        index = start
+        while os.path.exists(get_segment_path(archive_path, index)):
+            os.remove(get_segment_path(archive_path, index))
+            index += 1
+
+    def get_resume_strategy(self, is_delta):
+        if is_delta:
+            return "get"
+
+        return None
+
+    def write_run(
+        self, run, original_experiment_name, json_writer, counts, metrics_since=None
+    ):
+        """Write the messages of a run and return the timestamp of its latest
+        metric value"""
         run_start_time = run.info.start_time
+        metrics_until = metrics_since
+
+        # Get mlflow tags
+        tags = run.data.tags
+
+        if not tags:
+            tags = {}
+
+        LOGGER.debug("### Preparing env details")
+        json_writer.write_filename_msg(tags["mlflow.source.name"], run_start_time)
+
+        json_writer.write_user_msg(tags["mlflow.user"], run_start_time)
+
+        LOGGER.debug("### Preparing git details")
+        json_writer.write_git_meta_msg(
+            tags.get("mlflow.source.git.commit"),
+            tags.get("mlflow.source.git.repoURL"),
+            run_start_time,
+        )
 
-        messages_file_path = os.path.join(self.tmpdir, "messages.json")
+        # Import any custom name
+        if tags.get("mlflow.runName"):
+            tags["Name"] = tags["mlflow.runName"]
 
-        with JsonLinesFile(messages_file_path, self.tmpdir) as json_writer:
-            # Get mlflow tags
-            tags = run.data.tags
+        # Save the run id as tag too as Experiment id can be different in case
+        # of multiple uploads
+        tags["mlflow.runId"] = run.info.run_id
 
-            if not tags:
-                tags = {}
+        if tags.get("mlflow.parentRunId"):
+            base_url = url_join(self.api_client.server_url, "/api/experiment/redirect")
+            tags["mlflow.parentRunUrl"] = merge_url(
+                base_url, {"experimentKey": tags["mlflow.parentRunId"]}
+            )
+
+        # Save the original MLFlow experiment name too as Comet.com project might
+        # get renamed
+        tags["mlflow.experimentName"] = original_experiment_name
+
+        LOGGER.debug("### Importing tags")
+        for tag_name, tag_value in tags.items():
+            LOGGER.debug("#### Tag %r: %r", tag_name, tag_value)
+            json_writer.write_log_other_msg(tag_name, tag_value, run_start_time)
+
+            counts["tags"] += 1
+
+        # Mark the experiments has being uploaded from MLFlow
+        json_writer.write_log_other_msg("Uploaded from", "MLFlow", run_start_time)
+
+        LOGGER.debug("### Importing params")
+        for param_key, param_value in run.data.params.items():
+            LOGGER.debug("#### Param %r: %r", param_key, param_value)
 
-            LOGGER.debug("### Preparing env details")
-            json_writer.write_filename_msg(tags["mlflow.source.name"], run_start_time)
+            json_writer.write_param_msg(param_key, param_value, run_start_time)
 
-            json_writer.write_user_msg(tags["mlflow.user"], run_start_time)
+            counts["params"] += 1
 
-            LOGGER.debug("### Preparing git details")
-            json_writer.write_git_meta_msg(
-                tags.get("mlflow.source.git.commit"),
-                tags.get("mlflow.source.git.repoURL"),
+        LOGGER.debug("### Importing metrics")
+        # Original number of values of the downsampled metrics
+        downsampled_metrics = {}
+        metric_histories = self.metric_fetcher.iter_metric_histories(run)
+        for metric_key, metric_history in metric_histories:
+            latest_timestamp = self.write_metric_history(
+                json_writer,
+                metric_key,
+                metric_history,
+                counts,
+                metrics_since,
+                downsampled_metrics,
+            )
+
+            if latest_timestamp is not None and (
+                metrics_until is None or latest_timestamp > metrics_until
+            ):
+                metrics_until = latest_timestamp
+
+            LOGGER.debug("#### Metric %r: %r", metric_key, metric_history)
+
+        # Make the loss of detail visible in Comet
+        if downsampled_metrics:
+            json_writer.write_log_other_msg(
+                DOWNSAMPLED_METRICS_OTHER,
+                json.dumps(downsampled_metrics, sort_keys=True),
                 run_start_time,
             )
 
-            # Import any custom name
-            if tags.get("mlflow.runName"):
-                tags["Name"] = tags["mlflow.runName"]
+        # The artifacts of an already uploaded run were sent with it, sending
+        # them again would duplicate the assets
+        if metrics_since is None:
+            LOGGER.debug("### Importing artifacts")
+            self.prepare_run_artifacts(run, json_writer, counts)
+
+        return metrics_until
+
+    def write_metric_history(
+        self,
+        json_writer,
+        metric_key,
+        metric_history,
+        counts,
+        metrics_since=None,
+        downsampled_metrics=None,
+    ):
+        """Write the values of a metric logged after metrics_since, if set, and
+        return the timestamp of the latest one"""
+        columns = get_metric_columns(metric_history)
+
+        if columns is not None:
+            return self.write_metric_columns(
+                json_writer,
+                metric_key,
+                columns,
+                counts,
+                metrics_since,
+                downsampled_metrics,
+            )
+
+        # Check if all steps are uniques, if not we don't pass any so the backend
+        # fallback to the unique timestamp
+        steps = [mh.step for mh in metric_history]
 
-            # Save the run id as tag too as Experiment id can be different in case
-            # of multiple uploads
-            tags["mlflow.runId"] = run.info.run_id
+        use_steps = True
 
-            if tags.get("mlflow.parentRunId"):
-                base_url = url_join(
-                    self.api_client.server_url, "/api/experiment/redirect"
-                )
-                tags["mlflow.parentRunUrl"] = merge_url(
-                    base_url, {"experimentKey": tags["mlflow.parentRunId"]}
-                )
+        if len(set(steps)) != len(metric_history):
+            LOGGER.warning(
+                "Non-unique steps detected, importing metrics with wall time instead"
+            )
+            use_steps = False
 
-            # Save the original MLFlow experiment name too as Comet.com project might
-            # get renamed
-            tags["mlflow.experimentName"] = original_experiment_name
+        latest_timestamp = None
 
-            LOGGER.debug("### Importing tags")
-            for tag_name, tag_value in tags.items():
-                LOGGER.debug("#### Tag %r: %r", tag_name, tag_value)
-                json_writer.write_log_other_msg(tag_name, tag_value, run_start_time)
+        for mh in metric_history:
+            if metrics_since is not None and mh.timestamp <= metrics_since:
+                continue
 
-                self.summary["tags"] += 1
+            if use_steps:
+                step = mh.step
+            else:
+                step = None
 
-            # Mark the experiments has being uploaded from MLFlow
-            json_writer.write_log_other_msg("Uploaded from", "MLFlow", run_start_time)
+            json_writer.write_metric_msg(mh.key, step, mh.timestamp, mh.value)
 
-            LOGGER.debug("### Importing params")
-            for param_key, param_value in run.data.params.items():
-                LOGGER.debug("#### Param %r: %r", param_key, param_value)
+            counts["metrics"] += 1
 
-                json_writer.write_param_msg(param_key, param_value, run_start_time)
+            if latest_timestamp is None or mh.timestamp > latest_timestamp:
+                latest_timestamp = mh.timestamp
 
-                self.summary["params"] += 1
+        return latest_timestamp
 
-            LOGGER.debug("### Importing metrics")
-            for metric in run.data._metric_objs:
-                metric_history = self.store.get_metric_history(
-                    run.info.run_id, metric.key
+    def write_metric_columns(
+        self,
+        json_writer,
+        metric_key,
+        columns,
+        counts,
+        metrics_since=None,
+        downsampled_metrics=None,
+    ):
+        """Same as write_metric_history for a metric history loaded as NumPy
+        arrays, which is downsampled when enabled"""
+        use_steps = has_unique_steps(columns)
+        if not use_steps:
+            LOGGER.warning(
+                "Non-unique steps detected, importing metrics with wall time instead"
+            )
+
+        if metrics_since is not None:
+            columns = get_metric_columns_since(columns, metrics_since)
+
+        if len(columns.timestamps) == 0:
+            return None
+
+        # The latest value is always kept but the original one is returned
+        # anyway so incremental syncs never send the same values again
+        latest_timestamp = int(columns.timestamps.max())
+
+        if self.metric_downsampling is not None:
+            original_count = len(columns.values)
+            columns = self.metric_downsampling.downsample(metric_key, columns)
+
+            if len(columns.values) < original_count:
+                LOGGER.debug(
+                    "#### Metric %r downsampled from %d to %d values",
+                    metric_key,
+                    original_count,
+                    len(columns.values),
                 )
-                # Check if all steps are uniques, if not we don't pass any so the backend
-                # fallback to the unique timestamp
-                steps = [mh.step for mh in metric_history]
+                counts["dropped_metric_values"] += original_count - len(columns.values)
+                if downsampled_metrics is not None:
+                    downsampled_metrics[metric_key] = original_count
+
+        json_writer.write_metric_msgs(
+            metric_key,
+            columns.steps if use_steps else None,
+            columns.timestamps,
+            columns.values,
+        )
+
+        counts["metrics"] += len(columns.timestamps)
+
+        return latest_timestamp
+
+    def prepare_run_artifacts(self, run, json_writer, counts):
+        artifact_store = get_artifact_repository(run.info.artifact_uri)
+
+        # Get all of the artifact list as we need to search for the
+        # specific MLModel file to detect models, the same listing is then
+        # used to download the artifacts
+        if (
+            self.async_client is not None
+            and self.async_client.can_use_artifact_repository(artifact_store)
+        ):
+            # Requests are sent from the event loop but each download still
+            # blocks a worker thread, use enough of them to fill the
+            # connections per host
+            download_store = AsyncArtifactRepository(artifact_store, self.async_client)
+            all_artifacts = download_store.walk_artifacts()
+            download_workers = max(
+                self.artifact_workers, self.async_client.max_connections_per_host
+            )
+        else:
+            download_store = artifact_store
+            all_artifacts = list(
+                walk_run_artifacts(artifact_store, self.artifact_workers)
+            )
+            download_workers = self.artifact_workers
+        models_prefixes = self.get_model_prefixes(all_artifacts)
+
+        # Filters are applied before any download
+        if self.artifact_filter is not None:
+            artifacts_by_action = collections.defaultdict(list)
+            for artifact in all_artifacts:
+                action = self.artifact_filter.get_action(artifact)
+                artifacts_by_action[action].append(artifact)
+
+            self.write_remote_artifacts(
+                run, json_writer, artifacts_by_action[ARTIFACT_REMOTE], counts
+            )
 
-                use_steps = True
+            counts["skipped_artifacts"] += len(artifacts_by_action[ARTIFACT_SKIPPED])
+            copied_artifacts = artifacts_by_action[ARTIFACT_COPIED]
+        else:
+            copied_artifacts = all_artifacts
 
-                if len(set(steps)) != len(metric_history):
-                    LOGGER.warning(
-                        "Non-unique steps detected, importing metrics with wall time instead"
-                    )
-                    use_steps = False
+        # Artifacts of local stores are used in place, the others are
+        # downloaded in a private directory so they can be moved instead of
+        # copied in the archive directory
+        if is_local_artifact_repository(artifact_store):
+            download_dir = None
+        else:
+            download_dir = tempfile.mkdtemp()
+
+        # Large artifacts are streamed from their storage straight into the
+        # archive when their turn comes, they are never written on disk
+        if (
+            download_dir is not None
+            and self.min_streamed_artifact_bytes is not None
+            and can_stream_artifacts(artifact_store)
+        ):
+            min_streamed_size = self.min_streamed_artifact_bytes
+        else:
+            min_streamed_size = None
 
-                for mh in metric_history:
-                    if use_steps:
-                        step = mh.step
-                    else:
-                        step = None
+        def is_streamed(artifact):
+            return (
+                min_streamed_size is not None
+                and get_artifact_size(artifact) >= min_streamed_size
+            )
 
-                    json_writer.write_metric_msg(mh.key, step, mh.timestamp, mh.value)
+        def get_download_size(artifact):
+            if is_streamed(artifact):
+                return 0
 
-                    self.summary["metrics"] += 1
+            return get_artifact_size(artifact)
 
-                LOGGER.debug("#### Metric %r: %r", metric.key, metric_history)
+        # Artifacts are downloaded concurrently
+        counts_lock = threading.Lock()
 
-            LOGGER.debug("### Importing artifacts")
-            artifact_store = get_artifact_repository(run.info.artifact_uri)
+        def download_artifact(artifact):
+            if is_streamed(artifact):
+                return (artifact, None)
+
+            # Artifacts of local stores are already on disk, the cache would
+            # only hash and copy them
+            if download_dir is None:
+                return (
+                    artifact,
+                    download_store.download_artifacts(artifact.path, download_dir),
+                )
 
-            # Get all of the artifact list as we need to search for the
-            # specific MLModel file to detect models
-            all_artifacts = list(walk_run_artifacts(artifact_store))
+            (
+                local_artifact_path,
+                deduplicated_bytes,
+            ) = self.artifact_cache.download_artifact(
+                download_store, artifact, download_dir
+            )
 
-            models_prefixes = self.get_model_prefixes(all_artifacts)
+            with counts_lock:
+                counts["deduplicated_bytes"] += deduplicated_bytes
 
-            for artifact in walk_run_artifacts(artifact_store):
-                artifact_path = artifact.path
+            return (artifact, local_artifact_path)
 
-                LOGGER.debug("### Artifact %r: %r", artifact, artifact_path)
-                # Check if the file is an visualization or not
-                _, extension = os.path.splitext(artifact_path)
+        try:
+            # Artifacts are downloaded concurrently but still written in the
+            # listing order so messages.json stays deterministic
+            downloaded_artifacts = imap_ordered(
+                download_artifact,
+                copied_artifacts,
+                download_workers,
+                weight=get_download_size,
+                max_weight=self.max_inflight_artifact_bytes,
+            )
 
-                local_artifact_path = artifact_store.download_artifacts(artifact_path)
+            self.write_run_artifacts(
+                run,
+                json_writer,
+                downloaded_artifacts,
+                models_prefixes,
+                download_dir is not None,
+                counts,
+                artifact_store,
+            )
+        finally:
+            # Only empty directories are left once the downloaded files have
+            # been moved
+            if download_dir is not None:
+                shutil.rmtree(download_dir, ignore_errors=True)
+
+    def write_remote_artifacts(self, run, json_writer, artifacts, counts):
+        """Log artifacts as remote assets pointing at their artifact URI, they
+        are not downloaded"""
+        artifact_uri = run.info.artifact_uri.rstrip("/")
+
+        for artifact in artifacts:
+            LOGGER.debug("### Remote artifact %r", artifact)
+
+            json_writer.log_remote_asset(
+                "%s/%s" % (artifact_uri, artifact.path),
+                artifact.path,
+                run.info.start_time,
+                {"size": artifact.file_size},
+            )
 
-                self.summary["artifacts"] += 1
+            counts["remote_artifacts"] += 1
 
-                # Check if it's belonging to one of the registered model
-                matching_model_name = None
-                for model_prefix, model_name in models_prefixes.items():
-                    if artifact_path.startswith(model_prefix):
-                        matching_model_name = model_name
-                        # We should match at most one model
-                        break
+    def write_run_artifacts(
+        self,
+        run,
+        json_writer,
+        downloaded_artifacts,
+        models_prefixes,
+        move,
+        counts,
+        artifact_store=None,
+    ):
+        """Write the downloaded artifacts, the ones without local path are
+        streamed from the artifact_store"""
+        run_start_time = run.info.start_time
 
-                if matching_model_name:
-                    prefix = "models/"
+        for artifact, local_artifact_path in downloaded_artifacts:
+            artifact_path = artifact.path
 
-                    if artifact_path.startswith(prefix):
-                        comet_artifact_path = artifact_path[len(prefix) :]
-                    else:
-                        comet_artifact_path = artifact_path
+            LOGGER.debug("### Artifact %r: %r", artifact, artifact_path)
 
-                    if comet_artifact_path.startswith(model_prefix):
-                        comet_artifact_path = comet_artifact_path[
-                            len(model_prefix) + 1 :
-                        ]
-                    else:
-                        comet_artifact_path = comet_artifact_path
+            counts["artifacts"] += 1
 
-                    json_writer.log_artifact_as_model(
-                        local_artifact_path,
-                        comet_artifact_path,
-                        run_start_time,
-                        matching_model_name,
-                    )
+            if local_artifact_path is None:
+                upload_file = json_writer.add_upload_stream(
+                    artifact_path,
+                    artifact.file_size,
+                    functools.partial(stream_artifact, artifact_store, artifact_path),
+                )
+                # Only used for the extension of the file
+                local_artifact_path = artifact_path
+            else:
+                upload_file = None
+
+            # Check if it's belonging to one of the registered model
+            matching_model_name = None
+            for model_prefix, model_name in models_prefixes.items():
+                if artifact_path.startswith(model_prefix):
+                    matching_model_name = model_name
+                    # We should match at most one model
+                    break
+
+            if matching_model_name:
+                prefix = "models/"
+
+                if artifact_path.startswith(prefix):
+                    comet_artifact_path = artifact_path[len(prefix) :]
                 else:
-                    json_writer.log_artifact_as_asset(
-                        local_artifact_path,
-                        artifact_path,
-                        run_start_time,
-                    )
+                    comet_artifact_path = artifact_path
 
-        return self.compress_archive(run.info.run_id)
+                if comet_artifact_path.startswith(model_prefix):
+                    comet_artifact_path = comet_artifact_path[len(model_prefix) + 1 :]
+                else:
+                    comet_artifact_path = comet_artifact_path
+
+                json_writer.log_artifact_as_model(
+                    local_artifact_path,
+                    comet_artifact_path,
+                    run_start_time,
+                    matching_model_name,
+                    move=move,
+                    upload_file=upload_file,
+                )
+            else:
+                json_writer.log_artifact_as_asset(
+                    local_artifact_path,
+                    artifact_path,
+                    run_start_time,
+                    move=move,
+                    upload_file=upload_file,
+                )
 
     def get_model_prefixes(self, artifact_list):
         """Return the model names from a list of artifacts"""
@@ -481,45 +1410,118 @@ class Translator(object):
 
         all_project_names = []
 
-        with tqdm(total=self.summary["runs"]) as pbar:
+        def iter_runs_to_upload():
             for experiment_data in prepared_data:
                 experiment = experiment_data["experiment"]
 
-                project_name = self.get_or_create_comet_project(experiment)
-
-                # Sync the experiment note
-                project_note = experiment.tags.get("mlflow.note.content", None)
-                if project_note:
-                    note_template = (
-                        "/!\\ This project notes has been copied from MLFlow."
-                        " It might be overwritten if you run comet_for_mlflow again/!\\ \n%s"
-                        % project_note
-                    )
-                    # We don't support Unicode project notes yet
-                    self.api_client.set_project_notes(
-                        self.workspace,
-                        project_name,
-                        note_template,
-                    )
+                project_name = self.sync_comet_project(experiment)
 
                 all_project_names.append(project_name)
 
                 runs = experiment_data["runs"]
 
                 for mlflow_run, archive_path in runs:
-                    write_comet_experiment_metadata_file(
-                        mlflow_run, project_name, archive_path, self.workspace
-                    )
+                    yield (mlflow_run, project_name, archive_path)
 
-                    upload_single_offline_experiment(
-                        archive_path,
-                        self.api_key,
-                        force_upload=self.force_upload,
-                        display_level="debug",
-                    )
+        def upload_run(run_to_upload):
+            return self.upload_single_run(*run_to_upload)
+
+        with tqdm(total=self.summary["runs"]) as pbar:
+            uploaded_runs = imap_ordered(
+                upload_run, iter_runs_to_upload(), self.upload_workers
+            )
+            for _ in uploaded_runs:
+                pbar.update(1)
+
+        self.log_failed_uploads()
+        self.log_project_links(all_project_names)
+
+    def sync_comet_project(self, experiment):
+        project_name = self.get_or_create_comet_project(experiment)
+
+        # Sync the experiment note
+        project_note = experiment.tags.get("mlflow.note.content", None)
+        if project_note:
+            note_template = (
+                "/!\\ This project notes has been copied from MLFlow."
+                " It might be overwritten if you run comet_for_mlflow again/!\\ \n%s"
+                % project_note
+            )
+            # We don't support Unicode project notes yet
+            self.api_client.set_project_notes(
+                self.workspace,
+                project_name,
+                note_template,
+            )
+
+        return project_name
+
+    def upload_single_run(
+        self, mlflow_run, project_name, archive_path, write_metadata=True
+    ):
+        """Upload a single prepared run, failures are recorded instead of raised
+        so a failing run doesn't stop the whole upload"""
+        run_id = mlflow_run.info.run_id
+
+        segments, uploaded_segments = self.state.get_segments(run_id)
+        segment_path = archive_path
+
+        try:
+            if write_metadata:
+                self.write_experiment_metadata(mlflow_run, project_name, archive_path)
+
+            # Segments are uploaded in order, after a failure the upload
+            # resumes from the failed segment
+            for index in range(uploaded_segments, segments):
+                segment_path = get_segment_path(archive_path, index)
+                self.upload_backoff.call(self.upload_archive, segment_path)
+
+                if segments > 1:
+                    self.state.mark_segment_uploaded(run_id, index + 1)
+
+            self.state.mark_uploaded(run_id)
+        except Exception as e:
+            LOGGER.debug("## Error uploading run [%s]", run_id, exc_info=True)
+            Reporting.report(
+                "mlflow_error", api_key=self.api_key, err_msg=traceback.format_exc()
+            )
+
+            with self._summary_lock:
+                self.failed_uploads.append((run_id, segment_path, str(e)))
+
+            return False
 
-                    pbar.update(1)
+        return True
+
+    def upload_archive(self, archive_path):
+        uploaded = upload_single_offline_experiment(
+            archive_path,
+            self.api_key,
+            force_upload=self.force_upload,
+            display_level="debug",
+        )
+
+        # The Comet SDK logs and swallows the errors that retrying wouldn't fix,
+        # like an experiment already uploaded
+        if not uploaded:
+            raise UploadFailed("Upload of %s failed, see the logs above" % archive_path)
+
+    def log_failed_uploads(self):
+        if not self.failed_uploads:
+            return
 
+        LOGGER.info("")
+        LOGGER.error("%d run(s) couldn't be uploaded:", len(self.failed_uploads))
+        LOGGER.error(
+            tabulate(
+                self.failed_uploads,
+                headers=["MLFlow run id:", "Archive:", "Error:"],
+                tablefmt="presto",
+            )
+        )
+        LOGGER.error("You can retry uploading them later with: comet upload <archive>")
+
+    def log_project_links(self, all_project_names):
         LOGGER.info("")
         LOGGER.info(
             "Explore your experiment data on Comet ML with the following links:",
@@ -557,29 +1559,35 @@ class Translator(object):
             runs = experiment_data["runs"]
 
             for mlflow_run, archive_path in runs:
-                write_comet_experiment_metadata_file(
-                    mlflow_run, project_name, archive_path, self.workspace
-                )
+                self.write_experiment_metadata(mlflow_run, project_name, archive_path)
 
+        self.log_upload_instructions()
+
+    def write_experiment_metadata(self, mlflow_run, project_name, archive_path):
+        run_id = mlflow_run.info.run_id
+        segments, _ = self.state.get_segments(run_id)
+
+        for index in range(segments):
+            if index == 0:
+                resume_strategy = self.get_resume_strategy(self.state.is_delta(run_id))
+            else:
+                resume_strategy = "get"
+
+            write_comet_experiment_metadata_file(
+                mlflow_run,
+                project_name,
+                get_segment_path(archive_path, index),
+                self.workspace,
+                resume_strategy,
+            )
+
+    def log_upload_instructions(self):
         LOGGER.info("Data not uploaded. To upload later run:")
         LOGGER.info("   comet upload %s/*.zip", abspath(self.output_dir))
         LOGGER.info("")
         LOGGER.info("To get a preview of what was prepared, run:")
         LOGGER.info("   comet offline %s/*.zip", abspath(self.output_dir))
 
-    def compress_archive(self, run_id):
-        filepath = os.path.join(self.output_dir, "%s.zip" % run_id)
-        zipfile = ZipFile(filepath, "w")
-
-        for file in os.listdir(self.tmpdir):
-            zipfile.write(os.path.join(self.tmpdir, file), file)
-
-        zipfile.close()
-
-        shutil.rmtree(self.tmpdir)
-
-        return filepath
-
     def create_and_save_comet_project(self, exp, tag_name):
         # Create a Comet project with the name and description
         project_name = get_comet_project_name(self.store, exp.name)
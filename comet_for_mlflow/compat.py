@@ -23,6 +23,10 @@
 """
 Contains code to support multiple versions of MLFlow
 """
+import base64
+import binascii
+import posixpath
+
 from mlflow.entities.view_type import ViewType
 
 try:
@@ -36,30 +40,327 @@ except ImportError:
         get_artifact_repository,
     )
 
+try:
+    from mlflow.store.artifact.local_artifact_repo import LocalArtifactRepository
+except ImportError:
+    # MLFLOW version < 1.4.0
+    from mlflow.store.local_artifact_repo import LocalArtifactRepository
 
-def search_mlflow_store_experiments(mlflow_store):
-    if hasattr(mlflow_store, "search_experiments"):
-        # MLflow supports search for up to 50000 experiments, defined in
-        # mlflow/store/tracking/__init__.py
-        mlflow_experiments = mlflow_store.search_experiments(max_results=50000)
-        # TODO: Check if there are more than 50000 experiments
-        return list(mlflow_experiments)
+# The cloud storage SDKs are only imported when the repositories are used
+try:
+    from mlflow.store.artifact.s3_artifact_repo import S3ArtifactRepository
+except ImportError:
+    S3ArtifactRepository = None
+
+try:
+    from mlflow.store.artifact.gcs_artifact_repo import GCSArtifactRepository
+except ImportError:
+    GCSArtifactRepository = None
+
+try:
+    from mlflow.store.artifact.azure_blob_artifact_repo import (
+        AzureBlobArtifactRepository,
+    )
+except ImportError:
+    AzureBlobArtifactRepository = None
+
+try:
+    from mlflow.store.artifact.http_artifact_repo import HttpArtifactRepository
+    from mlflow.utils.rest_utils import augmented_raise_for_status, http_request
+except ImportError:
+    HttpArtifactRepository = None
+
+try:
+    from mlflow.store.tracking.file_store import (  # noqa
+        FileStore,
+        _read_persisted_run_info_dict,
+    )
+except ImportError:
+    # MLFLOW version < 1.4.0
+    from mlflow.store.file_store import FileStore, _read_persisted_run_info_dict  # noqa
+
+try:
+    from mlflow.store.tracking.rest_store import RestStore
+except ImportError:
+    # MLFLOW version < 1.4.0
+    from mlflow.store.rest_store import RestStore
+
+try:
+    # SQLAlchemy is only needed by database-backed MLFlow stores
+    from mlflow.store.tracking.dbmodels.models import SqlMetric
+    from mlflow.store.tracking.sqlalchemy_store import SqlAlchemyStore
+except ImportError:
+    SqlMetric = None
+    SqlAlchemyStore = None
+
+
+# Number of experiments or runs fetched per search request, MLFlow supports up
+# to 50000, defined in mlflow/store/tracking/__init__.py
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 50000
+
+# Size of the chunks of the artifacts streamed from the tracking server
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def is_sqlalchemy_store(mlflow_store):
+    if SqlAlchemyStore is None:
+        return False
+
+    return isinstance(mlflow_store, SqlAlchemyStore)
+
+
+def is_file_store(mlflow_store):
+    return isinstance(mlflow_store, FileStore)
+
+
+def is_rest_store(mlflow_store):
+    return isinstance(mlflow_store, RestStore)
+
+
+def is_http_artifact_repository(artifact_repository):
+    """Return True for the artifact repositories served by the MLFlow tracking
+    server, mlflow-artifacts:/ URIs included"""
+    return is_instance_of(artifact_repository, HttpArtifactRepository)
+
+
+def is_local_artifact_repository(artifact_repository):
+    return isinstance(artifact_repository, LocalArtifactRepository)
+
+
+def is_instance_of(value, cls):
+    return cls is not None and isinstance(value, cls)
+
+
+def get_s3_location(artifact_repository):
+    """Return the (bucket, root path) of a S3 artifact repository"""
+    if hasattr(artifact_repository, "parse_s3_compliant_uri"):
+        return artifact_repository.parse_s3_compliant_uri(
+            artifact_repository.artifact_uri
+        )
+
+    # Older MLFlow versions
+    return artifact_repository.parse_s3_uri(artifact_repository.artifact_uri)
+
+
+def get_artifact_fingerprint(artifact_repository, artifact_path):
+    """Return a fingerprint of the content of an artifact as reported by its
+    storage, the S3 ETag or the GCS and Azure MD5, without downloading it. None
+    when the storage doesn't report one."""
+    if is_instance_of(artifact_repository, S3ArtifactRepository):
+        bucket, root_path = get_s3_location(artifact_repository)
+
+        response = artifact_repository._get_s3_client().head_object(
+            Bucket=bucket, Key=posixpath.join(root_path, artifact_path)
+        )
+        # The ETag of multipart uploads also depends on the part size, identical
+        # contents may have different ETags but never the opposite
+        return "s3:%s" % response["ETag"].strip('"')
+
+    if is_instance_of(artifact_repository, GCSArtifactRepository):
+        bucket, root_path = artifact_repository.parse_gcs_uri(
+            artifact_repository.artifact_uri
+        )
+        blob = artifact_repository._get_bucket(bucket).get_blob(
+            posixpath.join(root_path, artifact_path)
+        )
+        # Composite objects don't have a MD5
+        if blob is None or not blob.md5_hash:
+            return None
+
+        return "md5:%s" % binascii.hexlify(base64.b64decode(blob.md5_hash)).decode()
+
+    if is_instance_of(artifact_repository, AzureBlobArtifactRepository):
+        container, _, root_path, _ = artifact_repository.parse_wasbs_uri(
+            artifact_repository.artifact_uri
+        )
+        properties = (
+            artifact_repository.client.get_container_client(container)
+            .get_blob_client(posixpath.join(root_path, artifact_path))
+            .get_blob_properties()
+        )
+        # Blobs uploaded in blocks don't have a MD5
+        content_md5 = properties.content_settings.content_md5
+        if not content_md5:
+            return None
+
+        return "md5:%s" % binascii.hexlify(bytes(content_md5)).decode()
+
+    return None
+
+
+def can_stream_artifacts(artifact_repository):
+    """Return True if stream_artifact supports the artifact repository"""
+    return any(
+        is_instance_of(artifact_repository, cls)
+        for cls in (
+            S3ArtifactRepository,
+            GCSArtifactRepository,
+            AzureBlobArtifactRepository,
+            HttpArtifactRepository,
+        )
+    )
+
+
+def stream_artifact(artifact_repository, artifact_path, fileobj):
+    """Write the content of an artifact into a writable file object as it is
+    read from its storage, without a local copy"""
+    if is_instance_of(artifact_repository, S3ArtifactRepository):
+        bucket, root_path = get_s3_location(artifact_repository)
+        artifact_repository._get_s3_client().download_fileobj(
+            bucket, posixpath.join(root_path, artifact_path), fileobj
+        )
+    elif is_instance_of(artifact_repository, GCSArtifactRepository):
+        bucket, root_path = artifact_repository.parse_gcs_uri(
+            artifact_repository.artifact_uri
+        )
+        artifact_repository._get_bucket(bucket).blob(
+            posixpath.join(root_path, artifact_path)
+        ).download_to_file(fileobj)
+    elif is_instance_of(artifact_repository, AzureBlobArtifactRepository):
+        container, _, root_path, _ = artifact_repository.parse_wasbs_uri(
+            artifact_repository.artifact_uri
+        )
+        artifact_repository.client.get_container_client(container).download_blob(
+            posixpath.join(root_path, artifact_path)
+        ).readinto(fileobj)
+    elif is_instance_of(artifact_repository, HttpArtifactRepository):
+        response = http_request(
+            artifact_repository._host_creds,
+            posixpath.join("/", artifact_path),
+            "GET",
+            stream=True,
+        )
+        augmented_raise_for_status(response)
+
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            fileobj.write(chunk)
     else:
-        return list(mlflow_store.list_experiments())
-
-
-def search_mlflow_store_runs(mlflow_store, experiment_id):
-    if hasattr(mlflow_store, "search_runs"):
-        # MLflow supports search for up to 50000 experiments, defined in
-        # mlflow/store/tracking/__init__.py
-        return mlflow_store.search_runs(
-            [experiment_id],
-            filter_string="",
-            run_view_type=ViewType.ALL,
-            max_results=50000,
+        raise ValueError(
+            "Artifacts of %s can't be streamed" % type(artifact_repository).__name__
         )
+
+
+# Lifecycle stages accepted on the command-line
+LIFECYCLE_VIEW_TYPES = {
+    "active": ViewType.ACTIVE_ONLY,
+    "deleted": ViewType.DELETED_ONLY,
+    "all": ViewType.ALL,
+}
+
+
+def get_view_type(lifecycle, default):
+    if lifecycle is None:
+        return default
+
+    return LIFECYCLE_VIEW_TYPES[lifecycle]
+
+
+def quote_mlflow_filter_value(value):
+    """Quote a string value for a MLFlow search filter, None when it contains
+    both quote characters as MLFlow filters don't support escaping them"""
+    if "'" not in value:
+        return "'%s'" % value
+
+    if '"' not in value:
+        return '"%s"' % value
+
+    return None
+
+
+def join_mlflow_filters(filters):
+    """Combine MLFlow search filters, which only support AND"""
+    return " AND ".join(filter_string for filter_string in filters if filter_string)
+
+
+def search_mlflow_store_experiments(
+    mlflow_store, page_size=None, filter_string=None, lifecycle=None
+):
+    """Yield all the experiments of a MLFlow store, one page at a time"""
+    view_type = get_view_type(lifecycle, ViewType.ACTIVE_ONLY)
+    if page_size is None:
+        page_size = DEFAULT_PAGE_SIZE
+
+    if hasattr(mlflow_store, "search_experiments"):
+        page_token = None
+        while True:
+            page = mlflow_store.search_experiments(
+                view_type=view_type,
+                max_results=page_size,
+                filter_string=filter_string,
+                page_token=page_token,
+            )
+
+            for experiment in page:
+                yield experiment
+
+            page_token = page.token
+            if not page_token:
+                break
     else:
-        return mlflow_store.list_run_infos(experiment_id, ViewType.ALL)
+        # Old MLFlow versions can't filter experiments, the caller filters them
+        for experiment in mlflow_store.list_experiments(view_type):
+            yield experiment
+
+
+def get_runs_page_size(mlflow_store, page_size=None):
+    """Return the number of runs fetched per search request, page_size if set.
+
+    FileStore.search_runs reads every run of the experiment for each page, so
+    file stores are searched with the largest pages MLFlow supports."""
+    if page_size is not None:
+        return page_size
+
+    if is_file_store(mlflow_store):
+        return MAX_PAGE_SIZE
+
+    return DEFAULT_PAGE_SIZE
+
+
+def can_search_mlflow_runs(mlflow_store):
+    """Return False for the old MLFlow stores that can't filter runs"""
+    return hasattr(mlflow_store, "search_runs")
+
+
+def search_mlflow_store_runs(
+    mlflow_store,
+    experiment_id,
+    filter_string="",
+    page_size=None,
+    lifecycle=None,
+):
+    """Yield all the runs of a MLFlow experiment, one page at a time"""
+    view_type = get_view_type(lifecycle, ViewType.ALL)
+    page_size = get_runs_page_size(mlflow_store, page_size)
+
+    if can_search_mlflow_runs(mlflow_store):
+        page_token = None
+        while True:
+            page = mlflow_store.search_runs(
+                [experiment_id],
+                filter_string=filter_string,
+                run_view_type=view_type,
+                max_results=page_size,
+                page_token=page_token,
+            )
+
+            for run in page:
+                yield run
+
+            page_token = page.token
+            if not page_token:
+                break
+    else:
+        # Old MLFlow versions can't filter runs, all of them are returned and
+        # the caller filters them
+        for run_info in mlflow_store.list_run_infos(experiment_id, view_type):
+            yield run_info
+
+
+def is_full_mlflow_run(mlflow_run):
+    """Return True for a Run with its data, search results are only bare
+    RunInfo with old MLFlow versions"""
+    return hasattr(mlflow_run, "info") and getattr(mlflow_run, "data", None) is not None
 
 
 def get_mlflow_run_id(mlflow_run):
@@ -67,3 +368,14 @@ def get_mlflow_run_id(mlflow_run):
         return mlflow_run.info.run_id
     else:
         return mlflow_run.run_id
+
+
+def get_mlflow_run_update_time(mlflow_run):
+    if hasattr(mlflow_run, "info"):
+        run_info = mlflow_run.info
+    else:
+        run_info = mlflow_run
+
+    # MLFlow doesn't record when a run was last updated, the end time is the
+    # closest as it changes when a run is restarted and terminated again
+    return getattr(run_info, "last_update_time", None) or run_info.end_time
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2020 Comet.ml Team.
+#
+# This file is part of Comet-For-MLFlow
+# (see https://github.com/comet-ml/comet-for-mlflow).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Reduce the number of values of the exported metrics."""
+
+from __future__ import print_function
+
+import fnmatch
+
+from .metric_history import MetricColumns, has_unique_steps, numpy
+
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+
+# Minimum number of values kept per metric
+MIN_POINTS = 4
+
+
+def get_finite_values(values):
+    """Return the values with the infinite values replaced by the finite
+    extremes of the series and NaN by its finite minimum, so the bucket
+    computations never overflow"""
+    finite = numpy.isfinite(values)
+    if finite.all():
+        return values
+
+    if not finite.any():
+        return numpy.zeros_like(values)
+
+    low = values[finite].min()
+    high = values[finite].max()
+
+    return numpy.nan_to_num(values, nan=low, posinf=high, neginf=low)
+
+
+def lttb_indices(x, y, max_points):
+    """Return the indices of the points kept by the Largest-Triangle-Three-Buckets
+    algorithm, which preserves the visual shape of the series"""
+    count = len(x)
+
+    # The first and last points are always kept, the others are split in
+    # buckets of the same size and the point forming the largest triangle with
+    # the previous kept point and the average of the next bucket is kept
+    edges = numpy.linspace(1, count - 1, max_points - 1).astype(numpy.int64)
+
+    indices = numpy.empty(max_points, dtype=numpy.int64)
+    indices[0] = 0
+    indices[-1] = count - 1
+
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = count - 1, count
+
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        areas = numpy.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+
+        previous = start + int(areas.argmax())
+        indices[bucket + 1] = previous
+
+    return indices
+
+
+def minmax_indices(y, max_points):
+    """Return the indices of the minimum and maximum of buckets of the series,
+    which preserves its peaks"""
+    count = len(y)
+
+    bucket_count = max(1, (max_points - 2) // 2)
+    edges = numpy.linspace(1, count - 1, bucket_count + 1).astype(numpy.int64)
+
+    indices = [0, count - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if start == end:
+            continue
+
+        bucket = y[start:end]
+        indices.append(start + int(bucket.argmin()))
+        indices.append(start + int(bucket.argmax()))
+
+    return numpy.unique(indices)
+
+
+class MetricDownsampling(object):
+    """Limit the number of values exported per metric.
+
+    max_points applies to all the metrics, overrides is a list of (glob
+    pattern, max points) for the metric keys that need a different limit, the
+    first matching pattern wins. A limit of None or 0 keeps all the values,
+    limits are at least MIN_POINTS.
+    """
+
+    def __init__(self, max_points=None, method="lttb", overrides=None):
+        if numpy is None:
+            raise ImportError("Metric downsampling requires NumPy")
+
+        if method not in DOWNSAMPLING_METHODS:
+            raise ValueError("Unknown downsampling method %r" % method)
+
+        self.max_points = max_points
+        self.method = method
+        self.overrides = overrides or []
+
+    def get_max_points(self, metric_key):
+        for pattern, max_points in self.overrides:
+            if fnmatch.fnmatchcase(metric_key, pattern):
+                return max_points
+
+        return self.max_points
+
+    def downsample(self, metric_key, columns):
+        """Return the columns with at most the max points of the metric"""
+        max_points = self.get_max_points(metric_key)
+        if not max_points:
+            return columns
+
+        # The extremities and at least one bucket are always kept
+        max_points = max(max_points, MIN_POINTS)
+
+        if len(columns.values) <= max_points:
+            return columns
+
+        y = get_finite_values(columns.values)
+
+        if self.method == "minmax":
+            indices = minmax_indices(y, max_points)
+        else:
+            if has_unique_steps(columns):
+                x = columns.steps.astype(numpy.float64)
+            else:
+                x = columns.timestamps.astype(numpy.float64)
+
+            indices = lttb_indices(x, y, max_points)
+
+        return MetricColumns(
+            columns.steps[indices],
+            columns.timestamps[indices],
+            columns.values[indices],
+        )
@@ -24,42 +24,411 @@
 
 from __future__ import print_function
 
+import collections
+import io
+import itertools
 import json
 import logging
+import math
 import os.path
 import shutil
-import tempfile
+import time
 import uuid
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipInfo
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
 
 LOGGER = logging.getLogger()
 
+# Number of JSON lines buffered before being written to the file at once
+WRITE_BATCH_SIZE = 1000
+
+# Number of metric values of a metric history serialized at once
+METRIC_CHUNK_SIZE = 10000
+
+# Metric messages have a fixed shape, their line is formatted directly with the
+# same output as json.dumps
+METRIC_MSG_TEMPLATE = (
+    '{"payload": {"local_timestamp": %s, "metric": {"epoch": 0, "metricName": %s,'
+    ' "metricValue": %s, "step": %s}}, "type": "ws_msg"}\n'
+)
+
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Extensions of file formats that are already compressed, deflating them again
+# only costs CPU time
+COMPRESSED_EXTENSIONS = frozenset(
+    [
+        ".7z",
+        ".avif",
+        ".bz2",
+        ".gif",
+        ".gz",
+        ".jpeg",
+        ".jpg",
+        ".lz4",
+        ".mp3",
+        ".mp4",
+        ".npz",
+        ".ogg",
+        ".parquet",
+        ".png",
+        ".pt",
+        ".pth",
+        ".tgz",
+        ".webm",
+        ".webp",
+        ".xz",
+        ".zip",
+        ".zst",
+    ]
+)
+
+# Files smaller than that are stored as is, there is almost nothing to gain
+MIN_COMPRESSED_SIZE = 1024
+
+# Size of the sample read to estimate the entropy of a file
+ENTROPY_SAMPLE_SIZE = 64 * 1024
+
+# Files whose sample is above this entropy, in bits per byte, look random or
+# already compressed
+MAX_COMPRESSED_ENTROPY = 7.5
+
 
 def generate_guid():
     """Generate a GUID"""
     return uuid.uuid4().hex
 
 
-class JsonLinesFile(object):
-    """A context manager to write a JSON Lines file, also called newline-delimited JSON."""
+def get_sample_entropy(filepath, sample_size=ENTROPY_SAMPLE_SIZE):
+    """Return the Shannon entropy, in bits per byte, of the beginning of a file"""
+    with open(filepath, "rb") as sample_file:
+        return get_entropy(sample_file.read(sample_size))
+
+
+def get_entropy(sample):
+    """Return the Shannon entropy, in bits per byte, of a sample"""
+    if not sample:
+        return 0.0
+
+    entropy = 0.0
+    for count in collections.Counter(sample).values():
+        probability = count / float(len(sample))
+        entropy -= probability * math.log(probability, 2)
+
+    return entropy
+
+
+class CompressionPolicy(object):
+    """Decide how each entry of an offline archive is compressed, based on its
+    extension, its size and the entropy of a sample of its content."""
+
+    def __init__(self, level=DEFAULT_COMPRESSION_LEVEL):
+        self.level = level
+
+    def get_compression(self, filepath, compressible=None):
+        """Return the (compress_type, compresslevel) to use for filepath. The
+        content checks are skipped when compressible is known already."""
+        if self.level <= 0:
+            return (ZIP_STORED, None)
+
+        if compressible is None:
+            compressible = self.is_compressible(filepath)
+
+        if compressible:
+            return (ZIP_DEFLATED, self.level)
+
+        return (ZIP_STORED, None)
+
+    def is_compressible(self, filepath):
+        _, extension = os.path.splitext(filepath)
+        if extension.lower() in COMPRESSED_EXTENSIONS:
+            return False
+
+        if os.path.getsize(filepath) < MIN_COMPRESSED_SIZE:
+            return False
+
+        return get_sample_entropy(filepath) < MAX_COMPRESSED_ENTROPY
+
+    def get_sample_compression(self, filename, sample):
+        """Return the (compress_type, compresslevel) to use for a file that is
+        not on disk, given its name and the beginning of its content"""
+        if self.level <= 0:
+            return (ZIP_STORED, None)
+
+        _, extension = os.path.splitext(filename)
+        if extension.lower() in COMPRESSED_EXTENSIONS:
+            return (ZIP_STORED, None)
+
+        if len(sample) < MIN_COMPRESSED_SIZE:
+            return (ZIP_STORED, None)
+
+        if get_entropy(sample) < MAX_COMPRESSED_ENTROPY:
+            return (ZIP_DEFLATED, self.level)
+
+        return (ZIP_STORED, None)
+
+
+def get_json_encoder(name=None):
+    """Return a function serializing a message to a JSON string, using orjson or
+    ujson when installed and the standard json module otherwise. The name
+    forces a specific backend."""
+    if name is None:
+        if orjson is not None:
+            name = "orjson"
+        elif ujson is not None:
+            name = "ujson"
+        else:
+            name = "json"
+
+    if name == "orjson":
+        return lambda data: orjson.dumps(data).decode("utf-8")
+    elif name == "ujson":
+        # Keep the same escaping than the standard json module
+        return lambda data: ujson.dumps(data, escape_forward_slashes=False)
+    elif name == "json":
+        return json.dumps
+
+    raise ValueError("Unknown JSON encoder %r" % name)
+
+
+def encode_json_number(value):
+    """Encode a metric value or step like json.dumps, without its overhead.
+
+    NaN and infinite values are not valid JSON numbers, they are encoded as
+    strings like the Comet SDK does."""
+    if value is None:
+        return "null"
+
+    value_type = type(value)
+
+    if value_type is int:
+        return int.__repr__(value)
+
+    if value_type is float:
+        if value != value:
+            return '"NaN"'
+        elif value == float("inf"):
+            return '"Infinity"'
+        elif value == float("-inf"):
+            return '"-Infinity"'
+
+        return float.__repr__(value)
+
+    return json.dumps(value)
+
+
+def encode_float_column(values):
+    """Encode a NumPy array of metric values with encode_json_number"""
+    encoded = list(map(float.__repr__, values.tolist()))
+
+    for index in numpy.flatnonzero(~numpy.isfinite(values)).tolist():
+        encoded[index] = encode_json_number(float(values[index]))
+
+    return encoded
+
+
+def link_or_copy(source, destination):
+    """Hardlink source to destination when both are on the same filesystem, copy
+    it otherwise"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class ZipEntryWriter(object):
+    """A writable file object adding its content to an entry of an archive.
+
+    The compression of the entry is picked by the compression policy once the
+    first ENTROPY_SAMPLE_SIZE bytes were written, which are the only ones
+    buffered. The size, when known, is only used to know if the entry needs the
+    ZIP64 extensions.
+    """
+
+    def __init__(self, archive, name, filename, size, compression):
+        self.archive = archive
+        self.name = name
+        self.filename = filename
+        self.size = size
+        self.compression = compression
+
+        self._sample = []
+        self._sample_size = 0
+        self._entry = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def write(self, data):
+        if self._entry is not None:
+            return self._entry.write(data)
+
+        self._sample.append(bytes(data))
+        self._sample_size += len(data)
+
+        if self._sample_size >= ENTROPY_SAMPLE_SIZE:
+            self.open_entry()
+
+        return len(data)
+
+    def open_entry(self):
+        sample = b"".join(self._sample)
+        self._sample = None
+
+        compress_type, compresslevel = self.compression.get_sample_compression(
+            self.filename, sample[:ENTROPY_SAMPLE_SIZE]
+        )
+
+        zinfo = ZipInfo(self.name, time.localtime(time.time())[:6])
+        zinfo.compress_type = compress_type
+        # Same as ZipFile.write
+        zinfo._compresslevel = compresslevel
+        zinfo.file_size = self.size or 0
+
+        self._entry = self.archive.open(zinfo, "w", force_zip64=self.size is None)
+        self._entry.write(sample)
+
+    def close(self):
+        if self._entry is None:
+            self.open_entry()
+
+        self._entry.close()
 
-    def __init__(self, filepath, tmpdir):
+
+class JsonLinesFile(object):
+    """A context manager to write a JSON Lines file, also called newline-delimited JSON.
+
+    When an open ZipFile is given as archive, the uploaded files are written into
+    it as soon as they are logged and the JSON Lines file is added to it on
+    exit. Without archive, only messages can be written.
+
+    With max_segment_bytes, once the messages and uploaded files written in the
+    archive reach this size, the JSON Lines file is added to it and the next
+    messages go to the archive returned by open_next_segment(archive).
+    """
+
+    def __init__(
+        self,
+        filepath,
+        archive=None,
+        compression=None,
+        encoder=None,
+        max_segment_bytes=None,
+        open_next_segment=None,
+    ):
         self.filepath = filepath
-        self.tmpdir = tmpdir
+        self.archive = archive
+
+        if archive is None or open_next_segment is None:
+            max_segment_bytes = None
+        self.max_segment_bytes = max_segment_bytes
+        self.open_next_segment = open_next_segment
+
+        if compression is None:
+            compression = CompressionPolicy()
+        self.compression = compression
+
+        self.encode = get_json_encoder(encoder)
+
         self._file = None
+        # Lines are written to the file in batches
+        self._buffer = []
+        # Metric names are encoded once per file
+        self._metric_names = {}
+        # Size of the current segment, before compression
+        self._segment_bytes = 0
+        self._pending_upload_msg = False
+        self.segments = 1
 
     def __enter__(self):
-        self._file = open(self.filepath, "w")
+        # The Comet offline uploader reads the messages as UTF-8
+        self._file = io.open(self.filepath, "w", encoding="utf-8")
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._file.flush()
+        self.flush()
         self._file.close()
         self._file = None
+
+        if self.archive is not None and exc_type is None:
+            # JSON Lines are text and very repetitive, always worth compressing
+            self.write_to_archive(self.filepath, compressible=True)
+            os.remove(self.filepath)
+
         return False
 
     def write_line_data(self, data):
-        json.dump(data, self._file)
-        self._file.write("\n")
+        self.write_line(self.encode(data) + "\n")
+
+    def write_line(self, line):
+        if self.max_segment_bytes is not None:
+            self.add_segment_bytes(len(line))
+
+        self._buffer.append(line)
+
+        if len(self._buffer) >= WRITE_BATCH_SIZE:
+            self.flush()
+
+    def write_lines(self, lines):
+        """Write many lines at once, bypassing the buffer"""
+        content = "".join(lines)
+
+        if self.max_segment_bytes is not None:
+            self.add_segment_bytes(len(content))
+
+        self.flush()
+        self._file.write(content)
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._buffer = []
+
+    def add_segment_bytes(self, size):
+        """Account for size more bytes in the current segment, starting a new
+        one first when they don't fit. Items bigger than a segment get their own
+        segment, they are never split."""
+        if self._segment_bytes + size > self.max_segment_bytes:
+            # The message of an uploaded file must be in the same archive
+            if not self._pending_upload_msg:
+                self.rollover()
+
+        self._segment_bytes += size
+        self._pending_upload_msg = False
+
+    def rollover(self):
+        """Add the messages written so far to the current archive and continue
+        in the next segment"""
+        if not self._segment_bytes:
+            return
+
+        self.flush()
+        self._file.close()
+        self.write_to_archive(self.filepath, compressible=True)
+
+        self.archive = self.open_next_segment(self.archive)
+        self.segments += 1
+
+        self._file = io.open(self.filepath, "w", encoding="utf-8")
+        self._segment_bytes = 0
 
     def write_filename_msg(self, source, timestamp):
         data = {
@@ -143,28 +512,62 @@ class JsonLinesFile(object):
 
         self.write_line_data(data)
 
-    def write_metric_msg(self, metric_name, step, timestamp, metric_value):
-        data = {
-            "payload": {
-                "local_timestamp": timestamp,
-                "metric": {
-                    "epoch": 0,
-                    "metricName": metric_name,
-                    "metricValue": metric_value,
-                    "step": step,
-                },
-            },
-            "type": "ws_msg",
-        }
+    def encode_metric_name(self, metric_name):
+        encoded_name = self._metric_names.get(metric_name)
+        if encoded_name is None:
+            encoded_name = json.dumps(metric_name)
+            self._metric_names[metric_name] = encoded_name
 
-        self.write_line_data(data)
+        return encoded_name
+
+    def write_metric_msg(self, metric_name, step, timestamp, metric_value):
+        self.write_line(
+            METRIC_MSG_TEMPLATE
+            % (
+                encode_json_number(timestamp),
+                self.encode_metric_name(metric_name),
+                encode_json_number(metric_value),
+                encode_json_number(step),
+            )
+        )
+
+    def write_metric_msgs(self, metric_name, steps, timestamps, values):
+        """Write the messages of a whole metric history given as NumPy arrays,
+        chunk by chunk. Without steps, the values are sent without step."""
+        encoded_name = self.encode_metric_name(metric_name)
+
+        for start in range(0, len(values), METRIC_CHUNK_SIZE):
+            end = start + METRIC_CHUNK_SIZE
+
+            if steps is None:
+                encoded_steps = itertools.repeat("null")
+            else:
+                encoded_steps = map(int.__repr__, steps[start:end].tolist())
+
+            self.write_lines(
+                [
+                    METRIC_MSG_TEMPLATE % (timestamp, encoded_name, value, step)
+                    for timestamp, value, step in zip(
+                        map(int.__repr__, timestamps[start:end].tolist()),
+                        encode_float_column(values[start:end]),
+                        encoded_steps,
+                    )
+                ]
+            )
 
     def log_artifact_as_visualization(
-        self, artifact_path, artifact_name, timestamp, figure_counter
+        self,
+        artifact_path,
+        artifact_name,
+        timestamp,
+        figure_counter,
+        move=False,
+        upload_file=None,
     ):
         image_id = generate_guid()
 
-        upload_file = self.get_temp_filename(artifact_path)
+        if upload_file is None:
+            upload_file = self.add_upload_file(artifact_path, move)
 
         data = {
             "payload": {
@@ -178,7 +581,7 @@ class JsonLinesFile(object):
                     "step": None,
                 },
                 "clean": True,
-                "file_path": os.path.basename(upload_file),
+                "file_path": upload_file,
                 "local_timestamp": timestamp,
                 "upload_type": "visualization",
             },
@@ -188,7 +591,13 @@ class JsonLinesFile(object):
         self.write_line_data(data)
 
     def log_artifact_as_model(
-        self, artifact_path, artifact_name, timestamp, model_name
+        self,
+        artifact_path,
+        artifact_name,
+        timestamp,
+        model_name,
+        move=False,
+        upload_file=None,
     ):
         _, extension = os.path.splitext(
             artifact_path
@@ -196,7 +605,8 @@ class JsonLinesFile(object):
 
         asset_id = generate_guid()
 
-        upload_file = self.get_temp_filename(artifact_path)
+        if upload_file is None:
+            upload_file = self.add_upload_file(artifact_path, move)
 
         data = {
             "payload": {
@@ -212,7 +622,7 @@ class JsonLinesFile(object):
                     "type": "model-element",
                 },
                 "clean": True,
-                "file_path": os.path.basename(upload_file),
+                "file_path": upload_file,
                 "local_timestamp": timestamp,
                 "metadata": {},
                 "upload_type": "model-element",
@@ -222,14 +632,17 @@ class JsonLinesFile(object):
 
         self.write_line_data(data)
 
-    def log_artifact_as_asset(self, artifact_path, artifact_name, timestamp):
+    def log_artifact_as_asset(
+        self, artifact_path, artifact_name, timestamp, move=False, upload_file=None
+    ):
         _, extension = os.path.splitext(
             artifact_path
         )  # TODO: Support extension less file names?
 
         asset_id = generate_guid()
 
-        upload_file = self.get_temp_filename(artifact_path)
+        if upload_file is None:
+            upload_file = self.add_upload_file(artifact_path, move)
 
         data = {
             "payload": {
@@ -243,7 +656,7 @@ class JsonLinesFile(object):
                     "step": None,
                 },
                 "clean": True,
-                "file_path": os.path.basename(upload_file),
+                "file_path": upload_file,
                 "local_timestamp": timestamp,
                 "upload_type": "asset",
             },
@@ -252,16 +665,84 @@ class JsonLinesFile(object):
 
         self.write_line_data(data)
 
-    def get_temp_filename(self, artifact_path):
-        tmpfile = tempfile.NamedTemporaryFile(delete=False, dir=self.tmpdir)
-        shutil.copyfile(artifact_path, tmpfile.name)
-        upload_file = tmpfile.name
+    def add_upload_file(self, artifact_path, move=False):
+        """Add the content of artifact_path to the archive and return its file
+        name. With move, artifact_path is a private copy removed once added."""
+        if self.archive is None:
+            raise ValueError("Uploaded files can only be added to an archive")
+
+        if self.max_segment_bytes is not None:
+            self.add_segment_bytes(os.path.getsize(artifact_path))
+            self._pending_upload_msg = True
+
+        upload_file = "tmp%s" % generate_guid()
+        self.write_to_archive(artifact_path, upload_file)
+
+        if move:
+            os.remove(artifact_path)
+
+        return upload_file
+
+    def add_upload_stream(self, filename, size, stream):
+        """Add a file to the archive whose content is written by
+        stream(fileobj), without a local copy, and return its file name. The
+        filename is only used to pick its compression, its size can be None."""
+        if self.archive is None:
+            raise ValueError("Streamed files can only be added to an archive")
+
+        if self.max_segment_bytes is not None:
+            self.add_segment_bytes(size or 0)
+            self._pending_upload_msg = True
+
+        upload_file = "tmp%s" % generate_guid()
+
+        with ZipEntryWriter(
+            self.archive, upload_file, filename, size, self.compression
+        ) as entry:
+            stream(entry)
+
         return upload_file
 
-    def log_artifact_as_audio(self, artifact_path, artifact_name, timestamp):
+    def write_to_archive(self, filepath, name=None, compressible=None):
+        if name is None:
+            name = os.path.basename(filepath)
+
+        compress_type, compresslevel = self.compression.get_compression(
+            filepath, compressible
+        )
+
+        self.archive.write(
+            filepath, name, compress_type=compress_type, compresslevel=compresslevel
+        )
+
+    def log_remote_asset(self, remote_uri, artifact_name, timestamp, metadata=None):
+        """Log an asset pointing at remote_uri, whose content is not uploaded"""
+        data = {
+            "payload": {
+                "additional_params": {
+                    "assetId": generate_guid(),
+                    "fileName": artifact_name,
+                    "isRemote": True,
+                    "overwrite": False,
+                    "step": None,
+                },
+                "local_timestamp": timestamp,
+                "metadata": metadata or {},
+                "remote_uri": remote_uri,
+                "upload_type": "asset",
+            },
+            "type": "remote_file",
+        }
+
+        self.write_line_data(data)
+
+    def log_artifact_as_audio(
+        self, artifact_path, artifact_name, timestamp, move=False, upload_file=None
+    ):
         asset_id = generate_guid()
 
-        upload_file = self.get_temp_filename(artifact_path)
+        if upload_file is None:
+            upload_file = self.add_upload_file(artifact_path, move)
 
         data = {
             "payload": {
@@ -275,7 +756,7 @@ class JsonLinesFile(object):
                     "type": "audio",
                 },
                 "clean": True,
-                "file_path": os.path.basename(upload_file),
+                "file_path": upload_file,
                 "local_timestamp": timestamp,
                 "upload_type": "audio",
             },
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2020 Comet.ml Team.
+#
+# This file is part of Comet-For-MLFlow
+# (see https://github.com/comet-ml/comet-for-mlflow).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Retrieve the metric histories of MLFlow runs."""
+
+from __future__ import print_function
+
+import collections
+import itertools
+import logging
+import threading
+from operator import attrgetter
+
+from .compat import SqlMetric, is_sqlalchemy_store
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LOGGER = logging.getLogger()
+
+# Number of metric rows fetched at once from the database
+SQL_FETCH_SIZE = 10000
+
+# Number of metric histories of a REST store fetched concurrently
+ASYNC_BATCH_SIZE = 100
+
+# A metric value read directly from the database, with the same attributes as
+# a MLFlow Metric but without the cost of building an entity for each row
+MetricPoint = collections.namedtuple(
+    "MetricPoint", ["key", "value", "timestamp", "step"]
+)
+
+# A metric history as NumPy arrays
+MetricColumns = collections.namedtuple(
+    "MetricColumns", ["steps", "timestamps", "values"]
+)
+
+
+def get_metric_columns(metric_history):
+    """Return a metric history as MetricColumns, None when NumPy is not
+    installed or when the history has missing steps or timestamps"""
+    if numpy is None:
+        return None
+
+    count = len(metric_history)
+
+    try:
+        return MetricColumns(
+            numpy.fromiter(map(attrgetter("step"), metric_history), numpy.int64, count),
+            numpy.fromiter(
+                map(attrgetter("timestamp"), metric_history), numpy.int64, count
+            ),
+            numpy.fromiter(
+                map(attrgetter("value"), metric_history), numpy.float64, count
+            ),
+        )
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def has_unique_steps(columns):
+    return len(numpy.unique(columns.steps)) == len(columns.steps)
+
+
+def get_metric_columns_since(columns, timestamp):
+    """Only keep the values of a metric logged after timestamp"""
+    selected = columns.timestamps > timestamp
+
+    return MetricColumns(
+        columns.steps[selected], columns.timestamps[selected], columns.values[selected]
+    )
+
+
+class MetricHistoryFetcher(object):
+    """Fetch the metric histories of a run with as few store round trips as
+    possible.
+
+    Database-backed stores are read with a single query per run, streamed with
+    a server-side cursor and returning plain rows instead of ORM objects, every
+    other store falls back to one get_metric_history call per metric key.
+
+    When a scanner is given, local mlruns directories are read with it instead
+    of the store. When an AsyncHttpClient is given, the metric histories of
+    REST stores are fetched concurrently with it, ASYNC_BATCH_SIZE at a time.
+    """
+
+    def __init__(self, store, bulk=True, scanner=None, client=None):
+        self.store = store
+        self.bulk = bulk and is_sqlalchemy_store(store)
+        self.scanner = scanner
+
+        if client is not None and client.can_use_store(store):
+            self.client = client
+        else:
+            self.client = None
+
+        self._lock = threading.Lock()
+        self.round_trips = 0
+
+    def count_round_trip(self, count=1):
+        with self._lock:
+            self.round_trips += count
+
+    def iter_metric_histories(self, run):
+        """Yield a (metric_key, metric_history) pair for each metric of the run,
+        only one metric history is kept in memory at a time"""
+        if self.scanner is not None:
+            for item in self.scanner.iter_metric_histories(run):
+                yield item
+            return
+
+        if self.bulk:
+            started = False
+            try:
+                for item in self._iter_sql_metric_histories(run):
+                    started = True
+                    yield item
+                return
+            except Exception:
+                # We can't fallback without duplicating the metrics already written
+                if started:
+                    raise
+
+                # Unknown database schema? Don't try again for the next runs
+                LOGGER.debug(
+                    "Bulk metric retrieval failed, falling back to per-metric calls",
+                    exc_info=True,
+                )
+                self.bulk = False
+
+        if self.client is not None:
+            metric_keys = [metric.key for metric in run.data._metric_objs]
+
+            for start in range(0, len(metric_keys), ASYNC_BATCH_SIZE):
+                batch = metric_keys[start : start + ASYNC_BATCH_SIZE]
+
+                for item in self.client.get_metric_histories(
+                    self.store, run.info.run_id, batch
+                ):
+                    yield item
+
+                self.count_round_trip(len(batch))
+            return
+
+        for metric in run.data._metric_objs:
+            metric_history = self.store.get_metric_history(run.info.run_id, metric.key)
+            self.count_round_trip()
+
+            yield (metric.key, metric_history)
+
+    def _iter_sql_metric_histories(self, run):
+        columns = [SqlMetric.key, SqlMetric.value, SqlMetric.timestamp, SqlMetric.step]
+        # NaN values are stored as 0 with a flag by recent MLFlow versions
+        has_nan_flag = hasattr(SqlMetric, "is_nan")
+        if has_nan_flag:
+            columns.append(SqlMetric.is_nan)
+
+        with self.store.ManagedSessionMaker() as session:
+            query = (
+                session.query(*columns)
+                .filter(SqlMetric.run_uuid == run.info.run_id)
+                # Same ordering than SqlAlchemyStore.get_metric_history per key
+                .order_by(
+                    SqlMetric.key,
+                    SqlMetric.timestamp,
+                    SqlMetric.step,
+                    SqlMetric.value,
+                )
+                # Use a server-side cursor on PostgreSQL and MySQL so large
+                # histories are never fully loaded in memory
+                .execution_options(stream_results=True)
+                .yield_per(SQL_FETCH_SIZE)
+            )
+            self.count_round_trip()
+
+            for metric_key, metric_rows in itertools.groupby(
+                query, key=lambda row: row[0]
+            ):
+                yield (
+                    metric_key,
+                    [get_metric_point(row, has_nan_flag) for row in metric_rows],
+                )
+
+
+def get_metric_point(row, has_nan_flag):
+    if has_nan_flag and row[4]:
+        return MetricPoint(row[0], float("nan"), row[2], row[3])
+
+    return MetricPoint(row[0], row[1], row[2], row[3])
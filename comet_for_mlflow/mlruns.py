@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2020 Comet.ml Team.
+#
+# This file is part of Comet-For-MLFlow
+# (see https://github.com/comet-ml/comet-for-mlflow).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Read the runs of a local mlruns directory without going through FileStore."""
+
+from __future__ import print_function
+
+import itertools
+import logging
+import os.path
+import re
+
+import yaml
+from mlflow.entities import Param, Run, RunData, RunTag, ViewType
+from mlflow.entities.lifecycle_stage import LifecycleStage
+from mlflow.utils.mlflow_tags import MLFLOW_RUN_NAME
+
+from .compat import _read_persisted_run_info_dict, get_view_type
+from .metric_history import MetricPoint
+
+LOGGER = logging.getLogger()
+
+META_DATA_FILE_NAME = "meta.yaml"
+TRASH_FOLDER_NAME = ".trash"
+
+# Folders of an experiment directory that are not runs
+RESERVED_EXPERIMENT_FOLDERS = frozenset(["tags", "datasets", "traces", "models"])
+
+# Plain YAML scalars are resolved with the same rules as the YAML parser,
+# anything else (quoted or multi-line values, flow collections...) goes
+# through the YAML parser
+YAML_RESOLVER = yaml.resolver.Resolver()
+YAML_INDICATORS = frozenset("-?:,[]{}#&*!|>'\"%@`")
+INTEGER_RE = re.compile(r"^-?(0|[1-9][0-9]*)$")
+SIMPLE_QUOTED_RE = re.compile(r"^'[^']*'$")
+# Metric files where every line is "timestamp value step", as MLFlow writes
+# them
+METRIC_FILE_3_FIELDS_RE = re.compile(r"(?:\S+ \S+ \S+\n)*(?:\S+ \S+ \S+)?")
+
+
+def parse_meta_value(value):
+    """Return (True, value) for the plain scalars that can be read without
+    the YAML parser, (False, None) otherwise"""
+    if value == "[]":
+        return (True, [])
+
+    if SIMPLE_QUOTED_RE.match(value):
+        return (True, value[1:-1])
+
+    if not value or value[0] in YAML_INDICATORS or value != value.strip():
+        return (False, None)
+
+    if ": " in value or " #" in value:
+        return (False, None)
+
+    tag = YAML_RESOLVER.resolve(yaml.ScalarNode, value, (True, False))
+
+    if tag == "tag:yaml.org,2002:str":
+        return (True, value)
+    elif tag == "tag:yaml.org,2002:int" and INTEGER_RE.match(value):
+        return (True, int(value))
+    elif tag == "tag:yaml.org,2002:null" and value == "null":
+        return (True, None)
+
+    return (False, None)
+
+
+def parse_meta_yaml(content):
+    """Parse the flat meta.yaml files written by MLFlow, only falling back to
+    the YAML parser for the values that can't be read as is"""
+    data = {}
+
+    for line in content.splitlines():
+        if not line:
+            continue
+
+        key, separator, value = line.partition(": ")
+        if not separator or key != key.strip():
+            return yaml.safe_load(content)
+
+        is_plain, value = parse_meta_value(value)
+        if not is_plain:
+            return yaml.safe_load(content)
+
+        data[key] = value
+
+    return data
+
+
+def parse_metric_file(metric_key, content):
+    """Parse the lines of a metric file, "timestamp value [step [dataset
+    digest]]", into MetricPoint"""
+    # Fast path for the usual "timestamp value step" lines, all the columns
+    # are converted at once
+    if METRIC_FILE_3_FIELDS_RE.fullmatch(content):
+        tokens = content.split()
+        return list(
+            map(
+                MetricPoint,
+                itertools.repeat(metric_key),
+                map(float, tokens[1::3]),
+                map(int, tokens[0::3]),
+                map(int, tokens[2::3]),
+            )
+        )
+
+    metric_history = []
+    for line in content.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+
+        if len(parts) not in (2, 3, 5):
+            raise ValueError(
+                "Metric %r is malformed, %d fields found" % (metric_key, len(parts))
+            )
+
+        if len(parts) == 2:
+            step = 0
+        else:
+            step = int(parts[2])
+
+        metric_history.append(
+            MetricPoint(metric_key, float(parts[1]), int(parts[0]), step)
+        )
+
+    return metric_history
+
+
+def read_text_file(filepath):
+    with open(filepath, encoding="utf-8") as text_file:
+        return text_file.read()
+
+
+def walk_files(directory, prefix=""):
+    """Yield the (key, path) of the files below directory, the keys of nested
+    files contain a / like MLFlow keys"""
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+
+    for entry in entries:
+        if entry.is_dir():
+            for item in walk_files(entry.path, prefix + entry.name + "/"):
+                yield item
+        else:
+            yield (prefix + entry.name, entry.path)
+
+
+class MlrunsScanner(object):
+    """Read the runs of a local mlruns directory, as written by the MLFlow
+    FileStore, with os.scandir and minimal parsing.
+
+    FileStore.search_runs reads every metric file of every run of the
+    experiment for each page of results, only to report the latest metric
+    values. The runs returned here only contain their tags and params, the
+    metric histories are read once with iter_metric_histories.
+    """
+
+    def __init__(self, root_directory):
+        self.root_directory = root_directory
+
+    def get_experiment_dir(self, experiment_id):
+        experiment_dir = os.path.join(self.root_directory, experiment_id)
+        if os.path.isdir(experiment_dir):
+            return experiment_dir
+
+        # Deleted experiments are moved to the trash folder
+        return os.path.join(self.root_directory, TRASH_FOLDER_NAME, experiment_id)
+
+    def get_run_dir(self, experiment_id, run_id):
+        return os.path.join(self.get_experiment_dir(experiment_id), run_id)
+
+    def iter_runs(self, experiment_id, lifecycle=None):
+        """Yield the runs of an experiment in the same order as search_runs,
+        latest started first"""
+        view_type = get_view_type(lifecycle, ViewType.ALL)
+        experiment_dir = self.get_experiment_dir(experiment_id)
+
+        run_infos = []
+        for entry in os.scandir(experiment_dir):
+            if entry.name in RESERVED_EXPERIMENT_FOLDERS or not entry.is_dir():
+                continue
+
+            run_info = self.read_run_info(entry.path)
+            if run_info is None:
+                continue
+
+            # Only direct children of the experiment are scanned, but a run
+            # must also live in its own folder
+            if run_info.run_id != entry.name:
+                LOGGER.debug("Ignoring %r, not the folder of its run", entry.path)
+                continue
+
+            if run_info.experiment_id != experiment_id:
+                LOGGER.warning(
+                    "Wrong experiment ID (%s) recorded for run %r, ignoring it",
+                    run_info.experiment_id,
+                    run_info.run_id,
+                )
+                continue
+
+            if LifecycleStage.matches_view_type(view_type, run_info.lifecycle_stage):
+                run_infos.append(run_info)
+
+        run_infos.sort(key=lambda run_info: (-run_info.start_time, run_info.run_id))
+
+        for run_info in run_infos:
+            yield self.read_run(run_info)
+
+    def read_run_info(self, run_dir):
+        try:
+            content = read_text_file(os.path.join(run_dir, META_DATA_FILE_NAME))
+        except FileNotFoundError:
+            # Folders that are not runs, like artifacts stored alongside
+            LOGGER.debug("Ignoring %r, no %s found", run_dir, META_DATA_FILE_NAME)
+            return None
+
+        return _read_persisted_run_info_dict(parse_meta_yaml(content))
+
+    def read_run(self, run_info):
+        run_dir = self.get_run_dir(run_info.experiment_id, run_info.run_id)
+
+        params = [
+            Param(key, read_text_file(path))
+            for key, path in walk_files(os.path.join(run_dir, "params"))
+        ]
+        tags = [
+            RunTag(key, read_text_file(path))
+            for key, path in walk_files(os.path.join(run_dir, "tags"))
+        ]
+
+        # Same as FileStore, runs created before run names were persisted get
+        # their name from the tags
+        if hasattr(run_info, "_set_run_name") and not run_info.run_name:
+            for tag in tags:
+                if tag.key == MLFLOW_RUN_NAME:
+                    run_info._set_run_name(tag.value)
+
+        return Run(run_info, RunData(params=params, tags=tags))
+
+    def iter_metric_histories(self, run):
+        """Yield a (metric_key, metric_history) pair for each metric of the run,
+        in the metric key order"""
+        run_dir = self.get_run_dir(run.info.experiment_id, run.info.run_id)
+
+        metric_files = sorted(walk_files(os.path.join(run_dir, "metrics")))
+        for metric_key, path in metric_files:
+            yield (metric_key, parse_metric_file(metric_key, read_text_file(path)))
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2020 Comet.ml Team.
+#
+# This file is part of Comet-For-MLFlow
+# (see https://github.com/comet-ml/comet-for-mlflow).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Persistent state of a migration, used to resume it."""
+
+from __future__ import print_function
+
+import logging
+import os.path
+import sqlite3
+import threading
+import time
+
+LOGGER = logging.getLogger()
+
+STATE_FILENAME = "comet_for_mlflow.db"
+
+RUN_PREPARED = "prepared"
+RUN_UPLOADED = "uploaded"
+RUN_FAILED = "failed"
+
+
+class MigrationState(object):
+    """Record which runs were prepared, into which archive, and which were
+    uploaded, in a SQLite database stored in the output directory.
+
+    A run is identified by its run_id and its last update time so a run that
+    changed since it was migrated is migrated again. The latest metric
+    timestamp uploaded for each run is also kept so incremental syncs only send
+    the new metric values.
+
+    Runs that failed to be prepared are recorded too, and so are the
+    experiments whose runs couldn't all be listed, so incremental syncs don't
+    skip them.
+    """
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, STATE_FILENAME)
+
+        # Runs are prepared and uploaded from several threads
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    experiment_id TEXT,
+                    last_update_time INTEGER,
+                    archive_path TEXT,
+                    status TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    metrics_until INTEGER,
+                    uploaded_metrics_until INTEGER,
+                    is_delta INTEGER NOT NULL DEFAULT 0,
+                    segments INTEGER NOT NULL DEFAULT 1,
+                    uploaded_segments INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+
+            # Databases created before incremental syncs or segments existed
+            columns = [
+                row[1] for row in self._connection.execute("PRAGMA table_info(runs)")
+            ]
+            for column, definition in (
+                ("metrics_until", "INTEGER"),
+                ("uploaded_metrics_until", "INTEGER"),
+                ("is_delta", "INTEGER NOT NULL DEFAULT 0"),
+                ("segments", "INTEGER NOT NULL DEFAULT 1"),
+                ("uploaded_segments", "INTEGER NOT NULL DEFAULT 0"),
+            ):
+                if column not in columns:
+                    self._connection.execute(
+                        "ALTER TABLE runs ADD COLUMN %s %s" % (column, definition)
+                    )
+
+            # The sync mark of the experiments whose run listing failed, NULL
+            # when all their runs must be synced again
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS held_sync_marks (
+                    experiment_id TEXT PRIMARY KEY,
+                    sync_mark INTEGER
+                )"""
+            )
+
+    def get_run_status(self, run_id, last_update_time):
+        """Return the (status, archive_path) of a run if it was migrated and
+        didn't change since, None otherwise"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT status, archive_path, last_update_time FROM runs"
+                " WHERE run_id = ?",
+                (run_id,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        status, archive_path, recorded_update_time = row
+
+        if recorded_update_time != last_update_time:
+            return None
+
+        return (status, archive_path)
+
+    def get_uploaded_metrics_until(self, run_id):
+        """Return the latest metric timestamp uploaded for a run, None if the
+        run was never uploaded"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT uploaded_metrics_until FROM runs WHERE run_id = ?"
+                " AND uploaded_metrics_until IS NOT NULL",
+                (run_id,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0]
+
+    def is_delta(self, run_id):
+        """Return True if the archive prepared for a run only contains what
+        changed since its last upload"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT is_delta FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+
+        return bool(row and row[0])
+
+    def get_segments(self, run_id):
+        """Return the (number of segments, number of segments uploaded) of the
+        archive prepared for a run"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT segments, uploaded_segments FROM runs WHERE run_id = ?",
+                (run_id,),
+            ).fetchone()
+
+        if row is None:
+            return (1, 0)
+
+        return row
+
+    def get_sync_mark(self, experiment_id):
+        """Return the high-water mark of an experiment: every run that ended
+        before or at this time has been uploaded. None if no run was uploaded."""
+        with self._lock:
+            held = self._connection.execute(
+                "SELECT sync_mark FROM held_sync_marks WHERE experiment_id = ?",
+                (experiment_id,),
+            ).fetchone()
+            (pending,) = self._connection.execute(
+                "SELECT MIN(last_update_time) FROM runs"
+                " WHERE experiment_id = ? AND status != ?",
+                (experiment_id, RUN_UPLOADED),
+            ).fetchone()
+            (uploaded,) = self._connection.execute(
+                "SELECT MAX(last_update_time) FROM runs"
+                " WHERE experiment_id = ? AND status = ?",
+                (experiment_id, RUN_UPLOADED),
+            ).fetchone()
+
+        # A run not uploaded yet holds the mark back so it is retried
+        if pending is not None:
+            if uploaded is None or pending <= uploaded:
+                uploaded = pending - 1
+
+        # So does an incomplete run listing, for the runs not listed
+        if held is not None and uploaded is not None:
+            if held[0] is None:
+                return None
+
+            return min(uploaded, held[0])
+
+        return uploaded
+
+    def hold_sync_mark(self, experiment_id, sync_mark):
+        """Keep the sync mark of an experiment at most at sync_mark, None for
+        no mark, until release_sync_mark is called"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO held_sync_marks (experiment_id, sync_mark)"
+                " VALUES (?, ?)",
+                (experiment_id, sync_mark),
+            )
+
+    def release_sync_mark(self, experiment_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM held_sync_marks WHERE experiment_id = ?",
+                (experiment_id,),
+            )
+
+    def mark_prepared(
+        self,
+        run_id,
+        experiment_id,
+        last_update_time,
+        archive_path,
+        metrics_until=None,
+        is_delta=False,
+        segments=1,
+    ):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO runs (run_id, experiment_id, last_update_time,"
+                " archive_path, status, updated_at, metrics_until, is_delta,"
+                " segments, uploaded_segments)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)"
+                " ON CONFLICT(run_id) DO UPDATE SET"
+                " experiment_id = excluded.experiment_id,"
+                " last_update_time = excluded.last_update_time,"
+                " archive_path = excluded.archive_path,"
+                " status = excluded.status,"
+                " updated_at = excluded.updated_at,"
+                " metrics_until = excluded.metrics_until,"
+                " is_delta = excluded.is_delta,"
+                " segments = excluded.segments,"
+                " uploaded_segments = 0",
+                (
+                    run_id,
+                    experiment_id,
+                    last_update_time,
+                    archive_path,
+                    RUN_PREPARED,
+                    time.time(),
+                    metrics_until,
+                    int(is_delta),
+                    segments,
+                ),
+            )
+
+    def mark_failed(self, run_id, experiment_id, last_update_time):
+        """Record that a run couldn't be prepared, what was uploaded before is
+        kept"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO runs (run_id, experiment_id, last_update_time,"
+                " status, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(run_id) DO UPDATE SET"
+                " experiment_id = excluded.experiment_id,"
+                " last_update_time = excluded.last_update_time,"
+                " status = excluded.status,"
+                " updated_at = excluded.updated_at",
+                (run_id, experiment_id, last_update_time, RUN_FAILED, time.time()),
+            )
+
+    def mark_segment_uploaded(self, run_id, uploaded_segments):
+        """Record that the first uploaded_segments segments of a run were
+        uploaded, so a failed upload is resumed from the next one"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE runs SET uploaded_segments = ?, updated_at = ?"
+                " WHERE run_id = ?",
+                (uploaded_segments, time.time(), run_id),
+            )
+
+    def mark_uploaded(self, run_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE runs SET status = ?, updated_at = ?,"
+                " uploaded_metrics_until = metrics_until WHERE run_id = ?",
+                (RUN_UPLOADED, time.time(), run_id),
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
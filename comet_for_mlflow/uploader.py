@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2020 Comet.ml Team.
+#
+# This file is part of Comet-For-MLFlow
+# (see https://github.com/comet-ml/comet-for-mlflow).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Retry and rate-limiting support for the upload workers."""
+
+from __future__ import print_function
+
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger()
+
+TOO_MANY_REQUESTS = 429
+
+
+class UploadFailed(Exception):
+    """Raised when an offline archive couldn't be uploaded"""
+
+
+def get_http_status_code(exception):
+    """Return the HTTP status code attached to an exception if any"""
+    response = getattr(exception, "response", None)
+    status_code = getattr(response, "status_code", None)
+
+    if status_code is None:
+        status_code = getattr(exception, "status_code", None)
+
+    return status_code
+
+
+class Backoff(object):
+    """Retry calls with an exponential backoff.
+
+    The same instance is shared by all the upload workers: when one of them is
+    rate-limited (HTTP 429), every worker pauses before sending its next request.
+    UploadFailed errors are never retried.
+    """
+
+    def __init__(self, max_retries=3, backoff_factor=1.0, max_backoff=60.0):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._paused_until = 0
+
+    def get_delay(self, attempt):
+        return min(self.max_backoff, self.backoff_factor * (2**attempt))
+
+    def pause(self, delay):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + delay)
+
+    def wait(self):
+        with self._lock:
+            delay = self._paused_until - time.time()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+
+        while True:
+            self.wait()
+
+            try:
+                return func(*args, **kwargs)
+            except UploadFailed:
+                # Retrying wouldn't fix it
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+
+                delay = self.get_delay(attempt)
+                attempt += 1
+
+                if get_http_status_code(e) == TOO_MANY_REQUESTS:
+                    LOGGER.debug("Rate-limited, pausing all uploads for %.1fs", delay)
+                    self.pause(delay)
+                else:
+                    LOGGER.debug(
+                        "Upload failed with %r, retrying in %.1fs (%d/%d)",
+                        e,
+                        delay,
+                        attempt,
+                        self.max_retries,
+                    )
+                    time.sleep(delay)
@@ -20,12 +20,18 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
+import collections
 import configparser
+import datetime
 import hashlib
 import json
 import os.path
 import re
-from zipfile import ZipFile
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZIP64_LIMIT, ZipFile, ZipInfo
+
+METADATA_FILENAME = "experiment.json"
 
 
 def get_store_id(store):
@@ -56,12 +62,28 @@ def get_comet_project_name(store, exp_name):
     return clean_project_name("mlflow-{}-{}".format(exp_name, store_hash))
 
 
-def walk_run_artifacts(artifact_store):
-    # None is for the root
-    nodes = [None]
+def get_segment_path(archive_path, index):
+    """Return the path of a segment of an archive, the first segment is the
+    archive itself and the next ones sort after it"""
+    if index == 0:
+        return archive_path
+
+    base, extension = os.path.splitext(archive_path)
+    return "%s_%04d%s" % (base, index, extension)
+
+
+def walk_run_artifacts(artifact_store, workers=1):
+    if workers > 1:
+        for artifact in walk_run_artifacts_parallel(artifact_store, workers):
+            yield artifact
+        return
+
+    # Breadth-first like the parallel walk so the artifacts come in the same
+    # order whatever the number of workers; None is for the root
+    nodes = collections.deque([None])
 
     while nodes:
-        current_node = nodes.pop()
+        current_node = nodes.popleft()
 
         artifact_entities = artifact_store.list_artifacts(current_node)
 
@@ -72,14 +94,118 @@ def walk_run_artifacts(artifact_store):
                 yield artifact
 
 
-def write_comet_experiment_metadata_file(
-    mlflow_run, project_name, archive_path, workspace=None
+def get_artifact_size(artifact):
+    # Some artifact repositories don't report the file sizes
+    return artifact.file_size or 0
+
+
+def walk_run_artifacts_parallel(artifact_store, workers):
+    """Walk the artifact tree level by level, listing the sibling directories of
+    each level concurrently"""
+    # None is for the root
+    nodes = [None]
+
+    while nodes:
+        next_nodes = []
+
+        for artifact_entities in imap_ordered(
+            artifact_store.list_artifacts, nodes, workers, max_pending=len(nodes)
+        ):
+            for artifact in artifact_entities:
+                if artifact.is_dir:
+                    next_nodes.append(artifact.path)
+                else:
+                    yield artifact
+
+        nodes = next_nodes
+
+
+def parse_timestamp(value):
+    """Parse a timestamp in milliseconds or an ISO 8601 date, local time unless
+    a timezone is given, into a timestamp in milliseconds"""
+    try:
+        return int(value)
+    except ValueError:
+        pass
+
+    date = datetime.datetime.fromisoformat(value)
+
+    return int(date.timestamp() * 1000)
+
+
+def parse_positive_int(value):
+    """Parse a strictly positive integer command-line value"""
+    number = int(value)
+    if number <= 0:
+        raise ValueError("Expected a positive integer, got %r" % value)
+
+    return number
+
+
+def parse_metric_max_points(value):
+    """Parse a PATTERN=MAX_POINTS metric downsampling override"""
+    pattern, separator, max_points = value.rpartition("=")
+    if not separator or not pattern:
+        raise ValueError("Expected PATTERN=MAX_POINTS, got %r" % value)
+
+    return (pattern, int(max_points))
+
+
+def imap_ordered(
+    func, iterable, workers, max_pending=None, weight=None, max_weight=None
+):
+    """Apply func to each item of iterable with a pool of threads, yielding the
+    results in the same order as the input.
+
+    At most max_pending items are scheduled ahead of the consumer so a large or
+    lazy iterable is never fully materialized. When weight is given, the total
+    weight of the items scheduled and not yet consumed is also kept under
+    max_weight, a single item heavier than max_weight is still processed alone.
+    With a single worker, items are processed in the calling thread.
+    """
+    if workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    if max_pending is None:
+        max_pending = workers * 2
+
+    # Pairs of (future, item weight)
+    pending = collections.deque()
+    pending_weight = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for item in iterable:
+            item_weight = weight(item) if weight is not None else 0
+
+            # Wait for the oldest items to be consumed before scheduling more
+            while pending and (
+                len(pending) >= max_pending
+                or (
+                    max_weight is not None and pending_weight + item_weight > max_weight
+                )
+            ):
+                future, future_weight = pending.popleft()
+                yield future.result()
+                pending_weight -= future_weight
+
+            pending.append((executor.submit(func, item), item_weight))
+            pending_weight += item_weight
+
+        while pending:
+            future, _ = pending.popleft()
+            yield future.result()
+
+
+def get_comet_experiment_metadata(
+    mlflow_run, project_name, workspace=None, resume_strategy=None
 ):
     run_start_time = mlflow_run.info.start_time
     run_end_time = mlflow_run.info.end_time
 
     # MLFlow run_id are also GUID so simply reuse them
-    data = {
+    metadata = {
         "auto_metric_logging": True,
         "auto_output_logging": None,  # MLFlow doesn't log output
         "auto_param_logging": True,
@@ -98,9 +224,67 @@ def write_comet_experiment_metadata_file(
         "offline_id": mlflow_run.info.run_id,
     }
 
-    zipfile = ZipFile(archive_path, "a")
-    zipfile.writestr("experiment.json", json.dumps(data))
-    zipfile.close()
+    # Incremental archives are appended to the existing Comet experiment
+    if resume_strategy is not None:
+        metadata["resume_strategy"] = resume_strategy
+
+    return metadata
+
+
+def write_comet_experiment_metadata_file(
+    mlflow_run, project_name, archive_path, workspace=None, resume_strategy=None
+):
+    data = json.dumps(
+        get_comet_experiment_metadata(
+            mlflow_run, project_name, workspace, resume_strategy
+        )
+    )
+
+    with ZipFile(archive_path) as zipfile:
+        names = zipfile.namelist()
+
+        # Resumed migrations can reuse archives that already have the metadata
+        if METADATA_FILENAME in names:
+            if zipfile.read(METADATA_FILENAME).decode("utf-8") == data:
+                return
+
+            # Appending would add a second entry with the same name
+            replace_zip_entry(archive_path, METADATA_FILENAME, data)
+            return
+
+    with ZipFile(archive_path, "a") as zipfile:
+        zipfile.writestr(METADATA_FILENAME, data)
+
+
+def replace_zip_entry(archive_path, filename, data):
+    """Rebuild an archive with new content for one of its entries, the other
+    entries are copied as they are"""
+    tmp_path = archive_path + ".tmp"
+
+    try:
+        with ZipFile(archive_path) as source, ZipFile(tmp_path, "w") as target:
+            for info in source.infolist():
+                if info.filename == filename:
+                    continue
+
+                # Fresh entries, the extra fields of the source are not valid
+                # for the target
+                target_info = ZipInfo(info.filename, info.date_time)
+                target_info.compress_type = info.compress_type
+                target_info.external_attr = info.external_attr
+
+                with source.open(info) as source_file, target.open(
+                    target_info, "w", force_zip64=info.file_size > ZIP64_LIMIT
+                ) as target_file:
+                    shutil.copyfileobj(source_file, target_file)
+
+            target.writestr(filename, data)
+
+        os.replace(tmp_path, archive_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 
 def save_api_key(api_key):
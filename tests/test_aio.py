@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.aio` module."""
+
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from mlflow.entities import Metric
+from mlflow.exceptions import RestException
+from mlflow.store.tracking.rest_store import RestStore
+from mlflow.utils.rest_utils import MlflowHostCreds
+
+from comet_for_mlflow.aio import (
+    AsyncArtifactRepository,
+    AsyncHttpClient,
+    aiohttp,
+    get_request_options,
+)
+from comet_for_mlflow.compat import get_artifact_repository
+from comet_for_mlflow.metric_history import MetricHistoryFetcher
+
+pytestmark = pytest.mark.skipif(aiohttp is None, reason="aiohttp is not installed")
+
+ARTIFACTS_ROOT = "/api/2.0/mlflow-artifacts/artifacts/1/2"
+
+METRIC_PAGES = {
+    ("loss", None): {
+        "metrics": [
+            {"key": "loss", "value": 1.5, "timestamp": "1000", "step": "0"},
+            {"key": "loss", "value": "NaN", "timestamp": "1001", "step": "1"},
+        ],
+        "next_page_token": "2",
+    },
+    ("loss", "2"): {
+        "metrics": [{"key": "loss", "timestamp": "1002", "step": "2"}],
+    },
+    ("lr", None): {"metrics": [{"key": "lr", "value": 0.1, "timestamp": "1000"}]},
+}
+
+ARTIFACT_LISTINGS = {
+    "1/2": [
+        {"path": "a.txt", "is_dir": False, "file_size": 5},
+        {"path": "model", "is_dir": True},
+    ],
+    "1/2/model": [{"path": "MLmodel", "is_dir": False, "file_size": 7}],
+}
+
+ARTIFACT_CONTENTS = {"a.txt": b"hello", "model/MLmodel": b"flavors"}
+
+
+class MlflowServerHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, content):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        with server.lock:
+            server.requests.append(url.path)
+            server.authorizations.add(self.headers.get("Authorization"))
+            # The first request fails to check the retries
+            fail = len(server.requests) == 1
+
+        if fail:
+            self.send_json(503, {})
+        elif url.path == "/api/2.0/mlflow/metrics/get-history":
+            page = METRIC_PAGES.get((params["metric_key"], params.get("page_token")))
+            if page is None:
+                self.send_json(
+                    404, {"error_code": "RESOURCE_DOES_NOT_EXIST", "message": "No"}
+                )
+            else:
+                self.send_json(200, page)
+        elif url.path == "/api/2.0/mlflow-artifacts/artifacts":
+            self.send_json(200, {"files": ARTIFACT_LISTINGS[params["path"]]})
+        elif url.path.startswith(ARTIFACTS_ROOT + "/"):
+            body = ARTIFACT_CONTENTS[url.path[len(ARTIFACTS_ROOT) + 1 :]]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(404, {})
+
+
+@pytest.fixture
+def mlflow_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MlflowServerHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.authorizations = set()
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client():
+    client = AsyncHttpClient(max_connections_per_host=2)
+    client.backoff.backoff_factor = 0
+
+    yield client
+
+    client.close()
+
+
+def get_server_url(server):
+    return "http://127.0.0.1:%d" % server.server_address[1]
+
+
+def test_get_request_options():
+    assert get_request_options(MlflowHostCreds("http://host")) == {"headers": {}}
+    assert get_request_options(MlflowHostCreds("http://host", token="abc")) == {
+        "headers": {"Authorization": "Bearer abc"}
+    }
+    assert get_request_options(
+        MlflowHostCreds("http://host", username="user", password="pass")
+    ) == {"headers": {"Authorization": "Basic dXNlcjpwYXNz"}}
+    assert get_request_options(
+        MlflowHostCreds("http://host", ignore_tls_verification=True)
+    ) == {"headers": {}, "ssl": False}
+
+    # Only supported by the MLFlow HTTP client
+    assert get_request_options(MlflowHostCreds("http://host", aws_sigv4=True)) is None
+    assert (
+        get_request_options(MlflowHostCreds("http://host", client_cert_path="cert"))
+        is None
+    )
+
+
+def test_metric_histories(mlflow_server, client):
+    store = RestStore(
+        lambda: MlflowHostCreds(
+            get_server_url(mlflow_server), username="user", password="pass"
+        )
+    )
+    run = SimpleNamespace(
+        info=SimpleNamespace(run_id="run"),
+        data=SimpleNamespace(
+            _metric_objs=[Metric("loss", 0, 0, 0), Metric("lr", 0, 0, 0)]
+        ),
+    )
+
+    fetcher = MetricHistoryFetcher(store, client=client)
+    histories = dict(fetcher.iter_metric_histories(run))
+
+    assert [tuple(point) for point in histories["lr"]] == [("lr", 0.1, 1000, 0)]
+
+    loss = histories["loss"]
+    assert [(point.timestamp, point.step) for point in loss] == [
+        (1000, 0),
+        (1001, 1),
+        (1002, 2),
+    ]
+    assert loss[0].value == 1.5
+    assert math.isnan(loss[1].value)
+    assert loss[2].value == 0
+
+    assert fetcher.round_trips == 2
+    # The failed request was retried
+    assert len(mlflow_server.requests) == 4
+    assert mlflow_server.authorizations == {"Basic dXNlcjpwYXNz"}
+
+
+def test_metric_histories_error(mlflow_server, client):
+    store = RestStore(lambda: MlflowHostCreds(get_server_url(mlflow_server)))
+
+    with pytest.raises(RestException) as error:
+        client.get_metric_histories(store, "run", ["missing"])
+
+    assert error.value.error_code == "RESOURCE_DOES_NOT_EXIST"
+
+
+def test_fetcher_ignores_unsupported_stores(client):
+    store = RestStore(lambda: MlflowHostCreds("http://host", aws_sigv4=True))
+
+    assert MetricHistoryFetcher(store, client=client).client is None
+
+
+def test_artifact_repository(mlflow_server, client, tmp_path):
+    artifact_repository = get_artifact_repository(
+        get_server_url(mlflow_server) + ARTIFACTS_ROOT
+    )
+    assert client.can_use_artifact_repository(artifact_repository)
+
+    repository = AsyncArtifactRepository(artifact_repository, client)
+    assert repository.artifact_uri == artifact_repository.artifact_uri
+
+    artifacts = repository.walk_artifacts()
+    assert [(a.path, a.is_dir, a.file_size) for a in artifacts] == [
+        ("a.txt", False, 5),
+        ("model/MLmodel", False, 7),
+    ]
+
+    for artifact in artifacts:
+        local_path = repository.download_artifacts(artifact.path, str(tmp_path))
+
+        with open(local_path, "rb") as local_file:
+            assert local_file.read() == ARTIFACT_CONTENTS[artifact.path]
+
+    assert (tmp_path / "model" / "MLmodel").exists()
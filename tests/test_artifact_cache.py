@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.artifact_cache` module."""
+
+import glob
+import hashlib
+import os.path
+import threading
+
+import pytest
+from mlflow.entities import FileInfo
+
+from comet_for_mlflow import artifact_cache
+from comet_for_mlflow.artifact_cache import ArtifactCache
+
+
+class FakeArtifactStore(object):
+    def __init__(self, artifact_uri, contents):
+        self.artifact_uri = artifact_uri
+        self.contents = contents
+        self.downloaded = []
+        self._lock = threading.Lock()
+
+    def download_artifacts(self, path, dst_path):
+        with self._lock:
+            self.downloaded.append(path)
+
+        local_path = os.path.join(dst_path, path)
+        with open(local_path, "wb") as local_file:
+            local_file.write(self.contents[path])
+
+        return local_path
+
+    def get_artifact(self, path):
+        return FileInfo(path, False, len(self.contents[path]))
+
+
+def get_fingerprint(artifact_store, artifact_path):
+    # Fake MD5 reported by the storage
+    return hashlib.md5(artifact_store.contents[artifact_path]).hexdigest()
+
+
+@pytest.fixture
+def fingerprints(monkeypatch):
+    monkeypatch.setattr(artifact_cache, "get_artifact_fingerprint", get_fingerprint)
+
+
+def download(cache, store, path, download_dir):
+    """Download like a run would, the downloaded file is removed once archived"""
+    download_dir.mkdir(exist_ok=True)
+
+    local_path, cached_bytes = cache.download_artifact(
+        store, store.get_artifact(path), str(download_dir)
+    )
+    with open(local_path, "rb") as local_file:
+        assert local_file.read() == store.contents[path]
+    os.remove(local_path)
+
+    return cached_bytes
+
+
+def test_artifact_cache_same_content(tmp_path, fingerprints):
+    cache = ArtifactCache(max_bytes=1000, min_size=10)
+
+    stores = [
+        FakeArtifactStore(
+            "s3://bucket/1/%d/artifacts" % run,
+            {"model.bin": b"x" * 100, "small.txt": str(run).encode()},
+        )
+        for run in range(3)
+    ]
+
+    for run, store in enumerate(stores):
+        cached_bytes = download(cache, store, "model.bin", tmp_path / str(run))
+        assert cached_bytes == (0 if run == 0 else 100)
+
+        # Too small to ask the storage, it's only found by location
+        download(cache, store, "small.txt", tmp_path / str(run))
+
+    assert [store.downloaded for store in stores] == [
+        ["model.bin", "small.txt"],
+        ["small.txt"],
+        ["small.txt"],
+    ]
+
+    cache_dir = cache._directory
+    cache.close()
+    assert not os.path.exists(cache_dir)
+
+
+def test_artifact_cache_evicted_while_linked(tmp_path, fingerprints, monkeypatch):
+    cache = ArtifactCache(max_bytes=1000, min_size=10)
+    stores = [
+        FakeArtifactStore("s3://bucket/1/%d/artifacts" % run, {"model.bin": b"x" * 100})
+        for run in range(2)
+    ]
+    download(cache, stores[0], "model.bin", tmp_path / "0")
+
+    link_cached_file = cache.link_cached_file
+
+    def evicting_link_cached_file(key, artifact, download_dir):
+        row = cache.get_digest(key)
+        linked = link_cached_file(key, artifact, download_dir)
+        if linked is not None:
+            # Evicted by another thread right after being linked
+            cache.remove_files([row[0]])
+        return linked
+
+    monkeypatch.setattr(cache, "link_cached_file", evicting_link_cached_file)
+
+    assert download(cache, stores[1], "model.bin", tmp_path / "1") == 100
+    assert stores[1].downloaded == []
+    cache.close()
+
+
+def test_artifact_cache_persistent(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+
+    for migration in range(2):
+        store = FakeArtifactStore("s3://bucket/1/2/artifacts", {"a.txt": b"a"})
+        cache = ArtifactCache(cache_dir, max_bytes=1000)
+
+        cached_bytes = download(cache, store, "a.txt", tmp_path / str(migration))
+        cache.close()
+
+        assert store.downloaded == (["a.txt"] if migration == 0 else [])
+        assert cached_bytes == migration
+
+    assert os.path.isdir(cache_dir)
+
+
+def test_artifact_cache_lru(tmp_path):
+    store = FakeArtifactStore(
+        "s3://bucket/1/2/artifacts",
+        {"a.bin": b"a" * 100, "b.bin": b"b" * 100, "c.bin": b"c" * 100},
+    )
+    cache = ArtifactCache(str(tmp_path / "cache"), max_bytes=250)
+
+    for index, path in enumerate(["a.bin", "b.bin", "a.bin", "c.bin"]):
+        download(cache, store, path, tmp_path / str(index))
+
+    # b.bin was the least recently used when c.bin was added
+    store.downloaded = []
+    for index, path in enumerate(["a.bin", "c.bin", "b.bin"]):
+        download(cache, store, path, tmp_path / str(index))
+
+    assert store.downloaded == ["b.bin"]
+    assert len(glob.glob(str(tmp_path / "cache" / "files" / "*" / "*"))) == 2
+    cache.close()
+
+
+def test_artifact_cache_corrupted_file(tmp_path):
+    store = FakeArtifactStore("s3://bucket/1/2/artifacts", {"a.bin": b"a" * 100})
+
+    cache = ArtifactCache(str(tmp_path / "cache"), max_bytes=1000)
+    download(cache, store, "a.bin", tmp_path / "0")
+    cache.close()
+
+    (cached_path,) = glob.glob(str(tmp_path / "cache" / "files" / "*" / "*"))
+    with open(cached_path, "wb") as cached_file:
+        cached_file.write(b"b" * 100)
+
+    cache = ArtifactCache(str(tmp_path / "cache"), max_bytes=1000)
+    assert download(cache, store, "a.bin", tmp_path / "1") == 0
+    assert download(cache, store, "a.bin", tmp_path / "2") == 100
+    cache.close()
+
+    assert store.downloaded == ["a.bin", "a.bin"]
+
+
+def test_artifact_cache_disabled(tmp_path, fingerprints):
+    store = FakeArtifactStore("s3://bucket/1/2/artifacts", {"a.bin": b"a" * 100})
+    cache = ArtifactCache(max_bytes=0)
+
+    for index in range(2):
+        download(cache, store, "a.bin", tmp_path / str(index))
+
+    assert store.downloaded == ["a.bin", "a.bin"]
+    assert cache._directory is None
+
+
+def test_artifact_cache_key_locks(tmp_path, fingerprints):
+    cache = ArtifactCache(max_bytes=1000, min_size=10)
+    store = FakeArtifactStore("s3://bucket/1/2/artifacts", {"a.bin": b"a" * 100})
+
+    with cache.lock_key("key"):
+        assert list(cache._key_locks) == ["key"]
+
+    # The locks of the keys are dropped once they are resolved
+    download(cache, store, "a.bin", tmp_path)
+    assert cache._key_locks == {}
+    cache.close()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.artifact_filter` module."""
+
+from mlflow.entities import FileInfo
+
+from comet_for_mlflow.artifact_filter import (
+    ARTIFACT_COPIED,
+    ARTIFACT_REMOTE,
+    ARTIFACT_SKIPPED,
+    ArtifactFilter,
+)
+
+
+def get_actions(artifact_filter, artifacts):
+    return {
+        path: artifact_filter.get_action(FileInfo(path, False, size))
+        for path, size in artifacts
+    }
+
+
+ARTIFACTS = [
+    ("config.json", 100),
+    ("model/MLmodel", 100),
+    ("model/model.pkl", 5000),
+    ("checkpoints/epoch-1.ckpt", 5000),
+    ("checkpoints/notes.txt", 100),
+    ("unknown-size.bin", None),
+]
+
+
+def test_artifact_filter():
+    artifact_filter = ArtifactFilter(
+        exclude=["*.ckpt", "checkpoints/*"], max_bytes=1000
+    )
+
+    assert get_actions(artifact_filter, ARTIFACTS) == {
+        "config.json": ARTIFACT_COPIED,
+        "model/MLmodel": ARTIFACT_COPIED,
+        "model/model.pkl": ARTIFACT_REMOTE,
+        "checkpoints/epoch-1.ckpt": ARTIFACT_SKIPPED,
+        "checkpoints/notes.txt": ARTIFACT_SKIPPED,
+        "unknown-size.bin": ARTIFACT_COPIED,
+    }
+
+
+def test_artifact_filter_include():
+    # Patterns are matched against the file names too
+    artifact_filter = ArtifactFilter(include=["MLmodel", "*.pkl"])
+
+    assert get_actions(artifact_filter, ARTIFACTS) == {
+        "config.json": ARTIFACT_SKIPPED,
+        "model/MLmodel": ARTIFACT_COPIED,
+        "model/model.pkl": ARTIFACT_COPIED,
+        "checkpoints/epoch-1.ckpt": ARTIFACT_SKIPPED,
+        "checkpoints/notes.txt": ARTIFACT_SKIPPED,
+        "unknown-size.bin": ARTIFACT_SKIPPED,
+    }
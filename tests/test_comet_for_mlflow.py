@@ -3,13 +3,29 @@
 
 """Tests for `comet_for_mlflow` package."""
 
+import json
 import os
 import os.path
+import time
 from random import randint, random
+from zipfile import ZipFile
 
+import pytest
 import responses
 from comet_ml.utils import url_join
-from mlflow import active_run, end_run, log_artifacts, log_metric, log_param, tracking
+from mlflow import (
+    active_run,
+    end_run,
+    last_active_run,
+    log_artifact,
+    log_artifacts,
+    log_metric,
+    log_param,
+    set_experiment,
+    start_run,
+    tracking,
+)
+from mlflow.entities import FileInfo
 
 from comet_for_mlflow import comet_for_mlflow
 
@@ -37,17 +53,7 @@ def mlflow_example():
     end_run()
 
 
-@responses.activate
-def test_conversion(tmp_path, monkeypatch):
-    path = tmp_path.resolve().as_posix()
-    os.chdir(path)
-
-    # Run the MLFlow example
-    mlflow_example()
-
-    # Check that MLFlow have created its on-disk content
-    assert os.path.isdir(os.path.join(path, "mlruns"))
-
+def mock_comet_backend():
     # Monkey-patch HTTP interactions
     backend_version_body = {
         "msg": "1.2.131",
@@ -66,6 +72,20 @@ def test_conversion(tmp_path, monkeypatch):
         status=200,
     )
 
+
+@responses.activate
+def test_conversion(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    # Run the MLFlow example
+    mlflow_example()
+
+    # Check that MLFlow have created its on-disk content
+    assert os.path.isdir(os.path.join(path, "mlruns"))
+
+    mock_comet_backend()
+
     # Check that comet_for_mlflow have created an offline experiment
     api_key = "XXX"
     monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
@@ -74,4 +94,764 @@ def test_conversion(tmp_path, monkeypatch):
     )
     conv.prepare()
 
-    assert len(list(tmp_path.glob("*.zip"))) == 1
+    archives = list(tmp_path.glob("*.zip"))
+    assert len(archives) == 1
+
+    with ZipFile(str(archives[0])) as zipfile:
+        names = zipfile.namelist()
+        assert sorted(names)[:2] == ["experiment.json", "messages.json"]
+        # The logged artifact
+        assert len(names) == 3
+
+
+@responses.activate
+def test_conversion_prepare_workers(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    # Run the MLFlow example several times
+    for _ in range(5):
+        mlflow_example()
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com", prepare_workers=3
+    )
+    conv.prepare()
+
+    assert len(list(tmp_path.glob("*.zip"))) == 5
+    assert conv.summary["runs"] == 5
+    assert conv.summary["metrics"] == 15
+    assert conv.summary["artifacts"] == 5
+    # The runs returned by the search are used as is
+    assert conv.summary["saved_round_trips"] == 5
+
+
+@responses.activate
+def test_conversion_stream(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    for _ in range(3):
+        mlflow_example()
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com", stream=True
+    )
+    conv.prepare()
+
+    archives = list(tmp_path.glob("*.zip"))
+    assert len(archives) == 3
+    assert conv.summary["runs"] == 3
+
+    for archive in archives:
+        with ZipFile(str(archive)) as zipfile:
+            assert "experiment.json" in zipfile.namelist()
+
+
+@responses.activate
+def test_conversion_resume(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    for _ in range(2):
+        mlflow_example()
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com"
+    )
+    conv.prepare()
+
+    archives = sorted(tmp_path.glob("*.zip"))
+    assert len(archives) == 2
+
+    # Pretend one of the runs was uploaded
+    conv.state.mark_uploaded(archives[0].stem)
+
+    resumed = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com", resume=True
+    )
+    resumed.prepare()
+
+    assert resumed.summary["skipped_runs"] == 1
+    assert resumed.summary["reused_runs"] == 1
+    assert resumed.summary["metrics"] == 0
+    assert sorted(tmp_path.glob("*.zip")) == archives
+
+
+@responses.activate
+def test_conversion_incremental(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    for _ in range(2):
+        mlflow_example()
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com", incremental=True
+    )
+    conv.prepare()
+
+    archives = sorted(tmp_path.glob("*.zip"))
+    assert len(archives) == 2
+
+    # Pretend both runs were uploaded
+    for archive in archives:
+        conv.state.mark_uploaded(archive.stem)
+
+    # Log a new metric value to one of the runs and create a new run
+    time.sleep(0.01)
+    start_run(run_id=archives[0].stem)
+    log_metric("foo", random() + 3)
+    end_run()
+
+    mlflow_example()
+
+    synced = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com", incremental=True
+    )
+    synced.prepare()
+
+    # The unchanged run isn't fetched, only the new metric value of the updated
+    # run is sent
+    assert synced.summary["runs"] == 2
+    assert synced.summary["metrics"] == 1 + 3
+    assert synced.summary["artifacts"] == 1
+
+    with ZipFile(str(archives[0])) as zipfile:
+        metadata = json.loads(zipfile.read("experiment.json"))
+    assert metadata["resume_strategy"] == "get"
+
+
+@responses.activate
+def test_conversion_incremental_failures(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    # The run that ended first fails to be prepared
+    mlflow_example()
+    failing_run_id = last_active_run().info.run_id
+    mlflow_example()
+    uploaded_run_id = last_active_run().info.run_id
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com", incremental=True
+    )
+    prepare_single_mlflow_run = conv.prepare_single_mlflow_run
+
+    def failing_prepare(run, *args, **kwargs):
+        if run.info.run_id == failing_run_id:
+            raise ValueError("Failed")
+        return prepare_single_mlflow_run(run, *args, **kwargs)
+
+    monkeypatch.setattr(conv, "prepare_single_mlflow_run", failing_prepare)
+    conv.prepare()
+
+    assert [archive.stem for archive in tmp_path.glob("*.zip")] == [uploaded_run_id]
+    conv.state.mark_uploaded(uploaded_run_id)
+
+    # The failed run is still synced by the next migration
+    synced = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com", incremental=True
+    )
+    synced.prepare()
+
+    assert synced.summary["runs"] == 1
+    assert (tmp_path / ("%s.zip" % failing_run_id)).exists()
+
+
+@responses.activate
+def test_conversion_incremental_listing_failure(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    for _ in range(2):
+        mlflow_example()
+    experiment_id = last_active_run().info.experiment_id
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    search_runs = comet_for_mlflow.search_mlflow_store_runs
+
+    def failing_search_runs(*args, **kwargs):
+        runs = search_runs(*args, **kwargs)
+        # Only the latest run is listed before the listing fails
+        yield next(runs)
+        raise ValueError("Failed")
+
+    monkeypatch.setattr(
+        comet_for_mlflow, "search_mlflow_store_runs", failing_search_runs
+    )
+    conv = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com", incremental=True
+    )
+    conv.prepare()
+
+    archives = list(tmp_path.glob("*.zip"))
+    assert len(archives) == 1
+    conv.state.mark_uploaded(archives[0].stem)
+
+    # The run not listed isn't skipped by the next sync
+    assert conv.state.get_sync_mark(experiment_id) is None
+
+    monkeypatch.setattr(comet_for_mlflow, "search_mlflow_store_runs", search_runs)
+    synced = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com", incremental=True
+    )
+    synced.prepare()
+
+    assert synced.summary["runs"] == 1
+    assert synced.summary["skipped_runs"] == 1
+    assert len(list(tmp_path.glob("*.zip"))) == 2
+
+
+@responses.activate
+def test_upload_failures(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    mlflow_example()
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        None,
+        None,
+        "no",
+        "test@example.com",
+        upload_retries=2,
+    )
+    conv.prepare()
+    conv.upload_backoff.backoff_factor = 0
+
+    (archive,) = tmp_path.glob("*.zip")
+    run = conv.store.get_run(archive.stem)
+
+    uploads = []
+    outcomes = []
+
+    def upload_single_offline_experiment(archive_path, *args, **kwargs):
+        uploads.append(archive_path)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(
+        comet_for_mlflow,
+        "upload_single_offline_experiment",
+        upload_single_offline_experiment,
+    )
+
+    # Errors swallowed by the Comet SDK are not retried
+    outcomes[:] = [False]
+    assert not conv.upload_single_run(run, "project", str(archive), False)
+    assert uploads == [str(archive)]
+    assert conv.failed_uploads[-1][:2] == (run.info.run_id, str(archive))
+
+    # Transient errors are, up to the number of retries
+    del uploads[:]
+    outcomes[:] = [ConnectionError("Connection reset")] * 3
+    assert not conv.upload_single_run(run, "project", str(archive), False)
+    assert len(uploads) == 3
+    assert conv.failed_uploads[-1] == (
+        run.info.run_id,
+        str(archive),
+        "Connection reset",
+    )
+
+    del uploads[:]
+    outcomes[:] = [ConnectionError("Connection reset"), True]
+    assert conv.upload_single_run(run, "project", str(archive), False)
+    assert len(uploads) == 2
+    assert len(conv.failed_uploads) == 2
+    assert conv.state.get_run_status(run.info.run_id, run.info.end_time) == (
+        "uploaded",
+        str(archive),
+    )
+
+
+class OldStore(object):
+    """A MLFlow store that can't search runs"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getattr__(self, name):
+        if name == "search_runs":
+            raise AttributeError(name)
+
+        return getattr(self.store, name)
+
+    def list_run_infos(self, experiment_id, view_type):
+        return [
+            run.info for run in self.store.search_runs([experiment_id], None, view_type)
+        ]
+
+
+@responses.activate
+def test_conversion_filters_old_store(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    mlflow_example()
+    time.sleep(0.01)
+    mlflow_example()
+    since = last_active_run().info.start_time
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        None,
+        None,
+        "no",
+        "test@example.com",
+        since=since,
+        incremental=True,
+    )
+    conv.store = OldStore(conv.store)
+    conv.prepare()
+
+    # Only the run started since is migrated
+    archives = list(tmp_path.glob("*.zip"))
+    assert [archive.stem for archive in archives] == [last_active_run().info.run_id]
+
+    conv.state.mark_uploaded(archives[0].stem)
+    mlflow_example()
+
+    # Only the new run ended after the sync mark
+    synced = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        None,
+        None,
+        "no",
+        "test@example.com",
+        incremental=True,
+    )
+    synced.store = OldStore(synced.store)
+    synced.prepare()
+
+    assert synced.summary["runs"] == 1
+    assert (tmp_path / ("%s.zip" % last_active_run().info.run_id)).exists()
+
+
+@responses.activate
+def test_conversion_filters(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    for _ in range(2):
+        mlflow_example()
+
+    set_experiment("other")
+    mlflow_example()
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        None,
+        None,
+        "no",
+        "test@example.com",
+        experiment_names=["other"],
+    )
+    conv.prepare()
+
+    assert conv.summary["experiments"] == 1
+    assert conv.summary["runs"] == 1
+
+    conv = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        None,
+        None,
+        "no",
+        "test@example.com",
+        experiment_regex="^Def",
+        run_filter="metrics.foo > 100",
+    )
+    conv.prepare()
+
+    assert conv.summary["experiments"] == 1
+    assert conv.summary["runs"] == 0
+
+    # Names with both quote characters can't be sent in a filter
+    set_experiment('it\'s "other"')
+    mlflow_example()
+
+    conv = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        None,
+        None,
+        "no",
+        "test@example.com",
+        experiment_names=["other", 'it\'s "other"'],
+    )
+    conv.prepare()
+
+    assert conv.summary["experiments"] == 2
+    assert conv.summary["runs"] == 2
+
+
+@responses.activate
+def test_conversion_file_store(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    store_uri = (tmp_path / "mlruns").as_uri()
+    monkeypatch.setenv("MLFLOW_TRACKING_URI", store_uri)
+    # The active experiment of previous tests doesn't exist in this store
+    set_experiment("Default")
+
+    for _ in range(2):
+        mlflow_example()
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False, api_key, path, None, store_uri, "no", "test@example.com"
+    )
+    assert conv.mlruns_scanner is not None
+    conv.prepare()
+
+    assert len(list(tmp_path.glob("*.zip"))) == 2
+    assert conv.summary["runs"] == 2
+    assert conv.summary["metrics"] == 6
+    assert conv.summary["artifacts"] == 2
+
+
+@responses.activate
+def test_conversion_file_store_cache_dir(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    store_uri = (tmp_path / "mlruns").as_uri()
+    monkeypatch.setenv("MLFLOW_TRACKING_URI", store_uri)
+    set_experiment("Default")
+
+    mlflow_example()
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    cache_dir = str(tmp_path / "cache")
+
+    # Local artifacts are used in place, never through the artifact cache
+    for migration in range(2):
+        output_dir = str(tmp_path / ("output%d" % migration))
+        conv = comet_for_mlflow.Translator(
+            False,
+            api_key,
+            output_dir,
+            None,
+            store_uri,
+            "no",
+            "test@example.com",
+            cache_dir=cache_dir,
+        )
+        conv.prepare()
+
+        archives = list((tmp_path / ("output%d" % migration)).glob("*.zip"))
+        assert len(archives) == 1
+        assert conv.summary["artifacts"] == 1
+        assert conv.summary["deduplicated_bytes"] == 0
+
+        with ZipFile(str(archives[0])) as zipfile:
+            assert len(zipfile.namelist()) == 3
+
+    # The MLFlow artifacts are left untouched
+    assert len(list((tmp_path / "mlruns").glob("*/*/artifacts/test.txt"))) == 1
+
+
+@responses.activate
+def test_conversion_metric_downsampling(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    with start_run():
+        for step in range(100):
+            log_metric("loss", random(), step=step)
+            log_metric("val_loss", random(), step=step)
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        None,
+        None,
+        "no",
+        "test@example.com",
+        metric_max_points=10,
+        metric_max_points_overrides=[("val_*", 0)],
+    )
+    conv.prepare()
+
+    assert conv.summary["metrics"] == 10 + 100
+    assert conv.summary["dropped_metric_values"] == 90
+
+    archives = list(tmp_path.glob("*.zip"))
+    with ZipFile(str(archives[0])) as zipfile:
+        messages = [
+            json.loads(line) for line in zipfile.read("messages.json").splitlines()
+        ]
+
+    others = {
+        message["payload"]["log_other"]["key"]: message["payload"]["log_other"]["val"]
+        for message in messages
+        if "log_other" in message["payload"]
+    }
+    assert json.loads(others["mlflow.downsampledMetrics"]) == {"loss": 100}
+
+
+# Reused archives must not get a second experiment.json
+@pytest.mark.filterwarnings("error:Duplicate name")
+@responses.activate
+def test_conversion_segments(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    with start_run() as run:
+        for step in range(200):
+            log_metric("loss", random(), step=step)
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        None,
+        None,
+        "no",
+        "test@example.com",
+        upload_retries=0,
+        max_segment_bytes=10000,
+    )
+    conv.prepare()
+
+    archive_path = os.path.join(path, "%s.zip" % run.info.run_id)
+    segments, _ = conv.state.get_segments(run.info.run_id)
+    assert segments > 1
+    assert len(list(tmp_path.glob("*.zip"))) == segments
+
+    conv.write_experiment_metadata(run, "project", archive_path)
+
+    steps = []
+    for index in range(segments):
+        segment_path = comet_for_mlflow.get_segment_path(archive_path, index)
+        with ZipFile(segment_path) as zipfile:
+            metadata = json.loads(zipfile.read("experiment.json"))
+            lines = zipfile.read("messages.json").splitlines()
+
+        # The next segments are appended to the experiment of the first one
+        assert metadata["offline_id"] == run.info.run_id
+        assert metadata.get("resume_strategy") == (None if index == 0 else "get")
+
+        for line in lines:
+            payload = json.loads(line)["payload"]
+            if "metric" in payload:
+                steps.append(payload["metric"]["step"])
+
+    assert steps == list(range(200))
+
+    # The upload stops at the first failed segment and resumes from it
+    uploaded = []
+    failures = [comet_for_mlflow.get_segment_path(archive_path, 1)]
+
+    def upload_archive(segment_path):
+        if segment_path in failures:
+            failures.remove(segment_path)
+            raise Exception("Upload failed")
+
+        uploaded.append(segment_path)
+
+    monkeypatch.setattr(conv, "upload_archive", upload_archive)
+
+    run = conv.store.get_run(run.info.run_id)
+    assert not conv.upload_single_run(run, "project", archive_path, False)
+    assert conv.state.get_segments(run.info.run_id) == (segments, 1)
+
+    assert conv.upload_single_run(run, "project", archive_path, False)
+    assert uploaded == [
+        comet_for_mlflow.get_segment_path(archive_path, index)
+        for index in range(segments)
+    ]
+
+
+@responses.activate
+def test_conversion_segments_force_upload(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    with start_run() as run:
+        for step in range(200):
+            log_metric("loss", random(), step=step)
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        True,
+        None,
+        "no",
+        "test@example.com",
+        upload_retries=0,
+        max_segment_bytes=10000,
+    )
+    conv.prepare()
+
+    # The run isn't split, a forced upload couldn't append to its experiment
+    assert conv.state.get_segments(run.info.run_id) == (1, 0)
+    assert [p.name for p in tmp_path.glob("*.zip")] == ["%s.zip" % run.info.run_id]
+
+
+@responses.activate
+def test_write_streamed_artifacts(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    with start_run() as run:
+        pass
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False, api_key, path, None, None, "no", "test@example.com"
+    )
+
+    def stream_artifact(artifact_store, artifact_path, fileobj):
+        assert artifact_store == "store"
+        fileobj.write(artifact_path.encode("utf-8"))
+
+    monkeypatch.setattr(comet_for_mlflow, "stream_artifact", stream_artifact)
+
+    # Artifacts without local path are streamed from the artifact store
+    artifacts = [(FileInfo("checkpoints/model.ckpt", False, 22), None)]
+    counts = {"artifacts": 0}
+
+    with ZipFile(str(tmp_path / "run.zip"), "w") as archive:
+        with comet_for_mlflow.JsonLinesFile(
+            str(tmp_path / "messages.json"), archive
+        ) as json_writer:
+            conv.write_run_artifacts(
+                run, json_writer, artifacts, {}, True, counts, "store"
+            )
+
+    with ZipFile(str(tmp_path / "run.zip")) as archive:
+        (message,) = archive.read("messages.json").splitlines()
+        payload = json.loads(message)["payload"]
+
+        assert payload["additional_params"]["fileName"] == "checkpoints/model.ckpt"
+        assert payload["additional_params"]["extension"] == "ckpt"
+        assert archive.read(payload["file_path"]) == b"checkpoints/model.ckpt"
+
+    assert counts["artifacts"] == 1
+
+
+@responses.activate
+def test_conversion_artifact_filters(tmp_path, monkeypatch):
+    path = tmp_path.resolve().as_posix()
+    os.chdir(path)
+
+    for name, size in [("config.json", 10), ("model.bin", 2000), ("last.ckpt", 10)]:
+        with open(name, "wb") as artifact_file:
+            artifact_file.write(b"x" * size)
+
+    with start_run() as run:
+        for name in ["config.json", "model.bin", "last.ckpt"]:
+            log_artifact(name)
+
+    mock_comet_backend()
+
+    api_key = "XXX"
+    monkeypatch.setenv("COMET_WORKSPACE", "WORKSPACE")
+    conv = comet_for_mlflow.Translator(
+        False,
+        api_key,
+        path,
+        None,
+        None,
+        "no",
+        "test@example.com",
+        exclude_artifacts=["*.ckpt"],
+        max_artifact_bytes=1000,
+    )
+    conv.prepare()
+
+    assert conv.summary["artifacts"] == 1
+    assert conv.summary["remote_artifacts"] == 1
+    assert conv.summary["skipped_artifacts"] == 1
+
+    with ZipFile(os.path.join(path, "%s.zip" % run.info.run_id)) as zipfile:
+        messages = [
+            json.loads(line) for line in zipfile.read("messages.json").splitlines()
+        ]
+
+    assets = {
+        message["payload"]["additional_params"]["fileName"]: message
+        for message in messages
+        if message["type"] in ("file_upload", "remote_file")
+    }
+    assert sorted(assets) == ["config.json", "model.bin"]
+
+    remote_asset = assets["model.bin"]["payload"]
+    assert assets["model.bin"]["type"] == "remote_file"
+    assert remote_asset["remote_uri"] == run.info.artifact_uri + "/model.bin"
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.compat` module."""
+
+import io
+
+import responses
+from mlflow.entities import Run, RunData, RunInfo
+from mlflow.store.entities.paged_list import PagedList
+from mlflow.store.tracking.file_store import FileStore
+
+from comet_for_mlflow.compat import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    get_artifact_fingerprint,
+    get_artifact_repository,
+    get_runs_page_size,
+    is_full_mlflow_run,
+    quote_mlflow_filter_value,
+    search_mlflow_store_experiments,
+    search_mlflow_store_runs,
+    stream_artifact,
+)
+
+
+class FakeStore(object):
+    def __init__(self, experiments, runs):
+        self.experiments = experiments
+        self.runs = runs
+        self.requests = 0
+
+    def get_page(self, items, max_results, page_token):
+        self.requests += 1
+
+        offset = int(page_token or 0)
+        next_offset = offset + max_results
+
+        if next_offset < len(items):
+            token = str(next_offset)
+        else:
+            token = None
+
+        return PagedList(items[offset:next_offset], token)
+
+    def search_experiments(self, view_type, max_results, filter_string, page_token):
+        return self.get_page(self.experiments, max_results, page_token)
+
+    def search_runs(
+        self, experiment_ids, filter_string, run_view_type, max_results, page_token
+    ):
+        return self.get_page(self.runs, max_results, page_token)
+
+
+def test_search_experiments_pages():
+    store = FakeStore(list(range(5)), [])
+
+    assert list(search_mlflow_store_experiments(store, page_size=2)) == [0, 1, 2, 3, 4]
+    assert store.requests == 3
+
+
+def test_search_runs_lazily():
+    store = FakeStore([], list(range(7)))
+
+    runs = search_mlflow_store_runs(store, "0", page_size=3)
+
+    assert next(runs) == 0
+    # Only the first page was fetched
+    assert store.requests == 1
+
+    assert list(runs) == [1, 2, 3, 4, 5, 6]
+    assert store.requests == 3
+
+
+def test_get_runs_page_size(tmp_path, monkeypatch):
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    file_store = FileStore(str(tmp_path / "mlruns"))
+    fake_store = FakeStore([], [])
+
+    assert get_runs_page_size(fake_store) == DEFAULT_PAGE_SIZE
+    # The file store reads all the runs for each page
+    assert get_runs_page_size(file_store) == MAX_PAGE_SIZE
+    assert get_runs_page_size(file_store, 10) == 10
+
+
+def test_quote_mlflow_filter_value():
+    assert quote_mlflow_filter_value("a") == "'a'"
+    assert quote_mlflow_filter_value("it's") == '"it\'s"'
+    assert quote_mlflow_filter_value('it\'s "a"') is None
+
+
+def test_is_full_mlflow_run():
+    run_info = RunInfo(
+        run_id="abc",
+        experiment_id="0",
+        user_id="user",
+        status="FINISHED",
+        start_time=0,
+        end_time=1,
+        lifecycle_stage="active",
+    )
+
+    assert is_full_mlflow_run(Run(run_info, RunData()))
+    assert not is_full_mlflow_run(run_info)
+
+
+class FakeS3Client(object):
+    def head_object(self, Bucket, Key):
+        assert (Bucket, Key) == ("bucket", "root/1/artifacts/model.bin")
+        return {"ETag": '"9b2cf535f27731c974343645a3985328"'}
+
+
+def test_get_artifact_fingerprint(tmp_path, monkeypatch):
+    repository = get_artifact_repository("s3://bucket/root/1/artifacts")
+    monkeypatch.setattr(repository, "_get_s3_client", FakeS3Client)
+
+    assert get_artifact_fingerprint(repository, "model.bin") == (
+        "s3:9b2cf535f27731c974343645a3985328"
+    )
+
+    local_repository = get_artifact_repository(tmp_path.as_uri())
+    assert get_artifact_fingerprint(local_repository, "model.bin") is None
+
+
+@responses.activate
+def test_stream_artifact():
+    artifact_uri = "http://localhost:5000/api/2.0/mlflow-artifacts/artifacts/1/2"
+    responses.add(
+        responses.GET,
+        artifact_uri + "/model/model.pkl",
+        body=b"x" * 3000000,
+        status=200,
+    )
+
+    fileobj = io.BytesIO()
+    stream_artifact(get_artifact_repository(artifact_uri), "model/model.pkl", fileobj)
+
+    assert fileobj.getvalue() == b"x" * 3000000
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.downsampling` module."""
+
+import pytest
+
+from comet_for_mlflow.downsampling import MetricDownsampling
+from comet_for_mlflow.metric_history import MetricColumns
+
+numpy = pytest.importorskip("numpy")
+
+
+def make_columns(values):
+    steps = numpy.arange(len(values), dtype=numpy.int64)
+    return MetricColumns(steps, steps + 1000, numpy.asarray(values, dtype=float))
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample_keeps_extremities_and_peaks(method):
+    values = numpy.zeros(10000)
+    values[1234] = 100.0
+    values[5678] = -100.0
+    values[-1] = 1.0
+    columns = make_columns(values)
+
+    downsampled = MetricDownsampling(100, method).downsample("loss", columns)
+
+    assert len(downsampled.values) <= 100
+    steps = downsampled.steps.tolist()
+    assert steps == sorted(steps)
+    assert steps[0] == 0 and steps[-1] == 9999
+    assert 1234 in steps and 5678 in steps
+    assert downsampled.timestamps.tolist() == [step + 1000 for step in steps]
+
+
+def test_downsample_overrides():
+    downsampling = MetricDownsampling(
+        10, overrides=[("val/*", 0), ("train/*", 50), ("train/loss", 20)]
+    )
+    columns = make_columns(numpy.random.rand(1000))
+
+    assert len(downsampling.downsample("loss", columns).values) == 10
+    assert len(downsampling.downsample("val/acc", columns).values) == 1000
+    # The first matching pattern wins
+    assert len(downsampling.downsample("train/loss", columns).values) == 50
+
+    short = make_columns([1.0, 2.0, 3.0])
+    assert downsampling.downsample("loss", short) is short
+
+
+@pytest.mark.filterwarnings("error")
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample_non_finite_values(method):
+    values = numpy.random.rand(1000)
+    values[500] = float("nan")
+    values[600] = float("inf")
+    values[700] = float("-inf")
+
+    downsampled = MetricDownsampling(10, method).downsample(
+        "loss", make_columns(values)
+    )
+
+    assert 4 <= len(downsampled.values) <= 10
+    # The original values are kept
+    numpy.testing.assert_array_equal(downsampled.values, values[downsampled.steps])
+
+
+@pytest.mark.filterwarnings("error")
+def test_downsample_only_non_finite_values():
+    values = numpy.full(1000, float("nan"))
+
+    downsampled = MetricDownsampling(10).downsample("loss", make_columns(values))
+
+    assert len(downsampled.values) == 10
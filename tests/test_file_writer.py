@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.file_writer` module."""
+
+import json
+import os
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+import pytest
+from comet_ml.schemas import get_remote_file_msg_validator
+
+from comet_for_mlflow import file_writer
+from comet_for_mlflow.file_writer import CompressionPolicy, JsonLinesFile
+
+
+def test_compression_policy(tmp_path):
+    text = tmp_path / "config.yaml"
+    text.write_bytes(b"learning_rate: 0.001\n" * 1000)
+    random_data = tmp_path / "weights.bin"
+    random_data.write_bytes(os.urandom(100000))
+    image = tmp_path / "plot.png"
+    image.write_bytes(b"not really a png" * 1000)
+    small = tmp_path / "small.txt"
+    small.write_bytes(b"hello")
+
+    policy = CompressionPolicy(level=6)
+    assert policy.get_compression(str(text)) == (ZIP_DEFLATED, 6)
+    assert policy.get_compression(str(random_data)) == (ZIP_STORED, None)
+    assert policy.get_compression(str(image)) == (ZIP_STORED, None)
+    assert policy.get_compression(str(small)) == (ZIP_STORED, None)
+
+    no_compression = CompressionPolicy(level=0)
+    assert no_compression.get_compression(str(text)) == (ZIP_STORED, None)
+
+
+def test_write_metric_msg_matches_json(tmp_path):
+    messages = tmp_path / "messages.json"
+
+    metrics = [
+        ("loss", 0, 1000, 0.5),
+        ("accuracy/top-5 é", None, 1001, 1),
+        ("loss", 2, 1002, float("nan")),
+        ("loss", 3, 1003, float("-inf")),
+        ("loss", 4, 1004, 1e-20),
+    ]
+
+    with JsonLinesFile(str(messages), encoder="json") as json_writer:
+        for metric_name, step, timestamp, metric_value in metrics:
+            json_writer.write_metric_msg(metric_name, step, timestamp, metric_value)
+
+    expected = []
+    for metric_name, step, timestamp, metric_value in metrics:
+        # Like the Comet SDK, NaN and infinite values are sent as strings
+        if metric_value != metric_value:
+            metric_value = "NaN"
+        elif metric_value == float("-inf"):
+            metric_value = "-Infinity"
+
+        data = {
+            "payload": {
+                "local_timestamp": timestamp,
+                "metric": {
+                    "epoch": 0,
+                    "metricName": metric_name,
+                    "metricValue": metric_value,
+                    "step": step,
+                },
+            },
+            "type": "ws_msg",
+        }
+        expected.append(json.dumps(data) + "\n")
+
+    assert messages.read_text(encoding="utf-8") == "".join(expected)
+
+
+@pytest.mark.parametrize("use_steps", [True, False])
+def test_write_metric_msgs_matches_write_metric_msg(tmp_path, monkeypatch, use_steps):
+    numpy = pytest.importorskip("numpy")
+    monkeypatch.setattr(file_writer, "METRIC_CHUNK_SIZE", 2)
+
+    steps = numpy.array([0, 1, 2, 3, 4], dtype=numpy.int64)
+    timestamps = numpy.array([1000, 1001, 1002, 1003, 1004], dtype=numpy.int64)
+    values = numpy.array([0.5, float("nan"), float("inf"), 1e-20, 3.0])
+
+    with JsonLinesFile(str(tmp_path / "columns.json")) as json_writer:
+        json_writer.write_metric_msgs(
+            "loss", steps if use_steps else None, timestamps, values
+        )
+
+    with JsonLinesFile(str(tmp_path / "points.json")) as json_writer:
+        for step, timestamp, value in zip(steps, timestamps, values):
+            json_writer.write_metric_msg(
+                "loss", int(step) if use_steps else None, int(timestamp), float(value)
+            )
+
+    lines = (tmp_path / "columns.json").read_text(encoding="utf-8")
+    assert lines == (tmp_path / "points.json").read_text(encoding="utf-8")
+    assert (
+        json.loads(lines.splitlines()[1])["payload"]["metric"]["metricValue"] == "NaN"
+    )
+
+
+@pytest.mark.parametrize("encoder", ["json", "orjson", "ujson"])
+def test_json_encoders(tmp_path, encoder):
+    pytest.importorskip(encoder)
+    messages = tmp_path / "messages.json"
+
+    with JsonLinesFile(str(messages), encoder=encoder) as json_writer:
+        json_writer.write_param_msg("path", "/data/été", 1000)
+        json_writer.write_log_other_msg("Name", "run", 1000)
+
+    lines = messages.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[0])["payload"]["param"]["paramValue"] == "/data/été"
+    assert json.loads(lines[1])["payload"]["log_other"] == {"key": "Name", "val": "run"}
+
+
+def test_segments(tmp_path):
+    artifact = tmp_path / "model.bin"
+    artifact.write_bytes(b"x" * 3000)
+
+    segments = [ZipFile(str(tmp_path / "0.zip"), "w")]
+
+    def open_next_segment(archive):
+        archive.close()
+        segments.append(ZipFile(str(tmp_path / ("%d.zip" % len(segments))), "w"))
+        return segments[-1]
+
+    with JsonLinesFile(
+        str(tmp_path / "messages.json"),
+        segments[0],
+        max_segment_bytes=2000,
+        open_next_segment=open_next_segment,
+    ) as json_writer:
+        for step in range(20):
+            json_writer.write_metric_msg("loss", step, 1000 + step, 0.5)
+
+        # Files are never split, the file gets its own segment
+        json_writer.log_artifact_as_asset(str(artifact), "model.bin", 1000)
+
+    segments[-1].close()
+    assert json_writer.segments == len(segments) == 3
+
+    steps = []
+    for index in range(len(segments)):
+        with ZipFile(str(tmp_path / ("%d.zip" % index))) as zipfile:
+            lines = zipfile.read("messages.json").decode("utf-8").splitlines()
+            messages = [json.loads(line) for line in lines]
+
+        steps.extend(
+            message["payload"]["metric"]["step"]
+            for message in messages
+            if "metric" in message["payload"]
+        )
+
+        if index == len(segments) - 1:
+            assert len(messages) == 1
+            assert messages[0]["payload"]["file_path"] in zipfile.namelist()
+
+    assert steps == list(range(20))
+
+
+def test_add_upload_file(tmp_path):
+    source = tmp_path / "model.bin"
+    source.write_bytes(b"weights")
+    downloaded = tmp_path / "downloaded.txt"
+    downloaded.write_bytes(b"hello")
+
+    with ZipFile(str(tmp_path / "archive.zip"), "w") as archive:
+        with JsonLinesFile(str(tmp_path / "messages.json"), archive) as json_writer:
+            files = [
+                json_writer.add_upload_file(str(source)),
+                json_writer.add_upload_file(str(downloaded), move=True),
+            ]
+
+    with ZipFile(str(tmp_path / "archive.zip")) as archive:
+        assert [archive.read(name) for name in files] == [b"weights", b"hello"]
+
+    # Only private copies are removed
+    assert source.exists()
+    assert not downloaded.exists()
+
+    # Files can't be uploaded without an archive
+    with JsonLinesFile(str(tmp_path / "messages.json")) as json_writer:
+        with pytest.raises(ValueError):
+            json_writer.add_upload_file(str(source))
+
+
+def test_add_upload_stream(tmp_path):
+    text = b"step,loss\n" * 10000
+    weights = os.urandom(100000)
+
+    def stream(content):
+        def write(fileobj):
+            for start in range(0, len(content), 4096):
+                fileobj.write(content[start : start + 4096])
+
+        return write
+
+    with ZipFile(str(tmp_path / "archive.zip"), "w") as archive:
+        with JsonLinesFile(str(tmp_path / "messages.json"), archive) as json_writer:
+            files = [
+                json_writer.add_upload_stream("metrics.csv", len(text), stream(text)),
+                json_writer.add_upload_stream("model.bin", None, stream(weights)),
+                json_writer.add_upload_stream("empty.txt", 0, stream(b"")),
+            ]
+
+    with ZipFile(str(tmp_path / "archive.zip")) as archive:
+        assert [archive.read(name) for name in files] == [text, weights, b""]
+        assert [archive.getinfo(name).compress_type for name in files] == [
+            ZIP_DEFLATED,
+            ZIP_STORED,
+            ZIP_STORED,
+        ]
+
+
+def test_log_remote_asset(tmp_path):
+    messages = tmp_path / "messages.json"
+
+    with JsonLinesFile(str(messages)) as json_writer:
+        json_writer.log_remote_asset(
+            "s3://bucket/1/2/artifacts/model.ckpt", "model.ckpt", 1000, {"size": 5}
+        )
+
+    message = json.loads(messages.read_text(encoding="utf-8"))
+    assert message["type"] == "remote_file"
+
+    # Same validation as the Comet offline uploader
+    get_remote_file_msg_validator().validate(message["payload"])
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.metric_history` module."""
+
+import math
+
+from mlflow.entities import Metric
+from mlflow.tracking import MlflowClient, _get_store
+
+from comet_for_mlflow.metric_history import (
+    MetricHistoryFetcher,
+    get_metric_columns,
+    get_metric_columns_since,
+    has_unique_steps,
+)
+
+
+def test_bulk_metric_histories_match_per_key(tmp_path):
+    store_uri = "sqlite:///%s" % (tmp_path / "mlflow.db").as_posix()
+    client = MlflowClient(tracking_uri=store_uri)
+    experiment_id = client.create_experiment("test")
+    run_id = client.create_run(experiment_id).info.run_id
+
+    for key in ("loss", "accuracy", "lr"):
+        client.log_batch(
+            run_id,
+            metrics=[Metric(key, step / 10.0, 1000 + step, step) for step in range(5)],
+        )
+
+    store = _get_store(store_uri)
+    run = store.get_run(run_id)
+
+    bulk_fetcher = MetricHistoryFetcher(store)
+    assert bulk_fetcher.bulk
+    bulk_histories = dict(bulk_fetcher.iter_metric_histories(run))
+
+    fetcher = MetricHistoryFetcher(store, bulk=False)
+    histories = dict(fetcher.iter_metric_histories(run))
+
+    assert sorted(bulk_histories) == sorted(histories)
+    for key, metric_history in histories.items():
+        assert [
+            (mh.key, mh.value, mh.timestamp, mh.step) for mh in bulk_histories[key]
+        ] == [(mh.key, mh.value, mh.timestamp, mh.step) for mh in metric_history]
+    assert bulk_fetcher.round_trips == 1
+    assert fetcher.round_trips == 3
+
+
+def test_bulk_metric_histories_nan(tmp_path):
+    store_uri = "sqlite:///%s" % (tmp_path / "mlflow.db").as_posix()
+    client = MlflowClient(tracking_uri=store_uri)
+    experiment_id = client.create_experiment("test")
+    run_id = client.create_run(experiment_id).info.run_id
+
+    client.log_batch(
+        run_id,
+        metrics=[Metric("loss", 1.0, 1000, 0), Metric("loss", float("nan"), 1001, 1)],
+    )
+
+    store = _get_store(store_uri)
+    fetcher = MetricHistoryFetcher(store)
+    histories = dict(fetcher.iter_metric_histories(store.get_run(run_id)))
+
+    values = [mh.value for mh in histories["loss"]]
+    assert values[0] == 1.0
+    assert math.isnan(values[1])
+
+
+def test_get_metric_columns():
+    metric_history = [
+        Metric("loss", step / 10.0, 1000 + step, step) for step in range(5)
+    ]
+
+    columns = get_metric_columns(metric_history)
+    assert columns.steps.tolist() == [0, 1, 2, 3, 4]
+    assert columns.timestamps.tolist() == [1000, 1001, 1002, 1003, 1004]
+    assert columns.values.tolist() == [0.0, 0.1, 0.2, 0.3, 0.4]
+    assert has_unique_steps(columns)
+
+    columns = get_metric_columns_since(columns, 1002)
+    assert columns.steps.tolist() == [3, 4]
+    assert columns.timestamps.tolist() == [1003, 1004]
+
+    duplicated_steps = get_metric_columns(metric_history + metric_history[:1])
+    assert not has_unique_steps(duplicated_steps)
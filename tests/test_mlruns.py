@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.mlruns` module."""
+
+import yaml
+from mlflow.entities import Metric, Param, RunTag
+from mlflow.tracking import MlflowClient, _get_store
+
+from comet_for_mlflow.compat import search_mlflow_store_runs
+from comet_for_mlflow.mlruns import MlrunsScanner, parse_meta_yaml, parse_metric_file
+
+
+def test_scanner_matches_file_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    store_uri = (tmp_path / "mlruns").as_uri()
+    client = MlflowClient(tracking_uri=store_uri)
+    experiment_id = client.create_experiment("test")
+
+    for run_number in range(3):
+        run_id = client.create_run(experiment_id, start_time=1000 + run_number)
+        run_id = run_id.info.run_id
+        client.log_batch(
+            run_id,
+            metrics=[
+                Metric("loss", step / 10.0, 1000 + step, step) for step in range(5)
+            ]
+            + [Metric("eval/acc", float("nan"), 1000, 0)],
+            params=[Param("lr", "0.001"), Param("layers/count", "3")],
+            tags=[RunTag("note", "multi\nline")],
+        )
+        client.set_terminated(run_id)
+
+    deleted_run_id = client.create_run(experiment_id).info.run_id
+    client.delete_run(deleted_run_id)
+
+    store = _get_store(store_uri)
+    scanner = MlrunsScanner(store.root_directory)
+
+    for lifecycle in (None, "active", "deleted"):
+        runs = list(scanner.iter_runs(experiment_id, lifecycle))
+        searched_runs = list(
+            search_mlflow_store_runs(store, experiment_id, lifecycle=lifecycle)
+        )
+
+        assert [run.info for run in runs] == [run.info for run in searched_runs]
+        for run, searched_run in zip(runs, searched_runs):
+            assert run.data.params == searched_run.data.params
+            assert run.data.tags == searched_run.data.tags
+
+    run = next(scanner.iter_runs(experiment_id, "active"))
+    histories = dict(scanner.iter_metric_histories(run))
+
+    assert sorted(histories) == ["eval/acc", "loss"]
+    assert [(mh.key, mh.value, mh.timestamp, mh.step) for mh in histories["loss"]] == [
+        (mh.key, mh.value, mh.timestamp, mh.step)
+        for mh in store.get_metric_history(run.info.run_id, "loss")
+    ]
+
+
+def test_parse_meta_yaml():
+    meta = {
+        "artifact_uri": "file:///tmp/mlruns/0/2e02df92/artifacts",
+        "end_time": None,
+        "experiment_id": "0",
+        "run_id": "2e02df92",
+        "run_name": "yes",
+        "source_name": "",
+        "status": 1,
+        "tags": [],
+        "user_id": "a long name: with a colon",
+    }
+
+    assert parse_meta_yaml(yaml.safe_dump(meta, default_flow_style=False)) == meta
+
+
+def test_parse_metric_file():
+    assert parse_metric_file("loss", "1000 0.5 0\n1001 1.5 1\n") == [
+        ("loss", 0.5, 1000, 0),
+        ("loss", 1.5, 1001, 1),
+    ]
+    # Legacy lines without step and lines with a dataset
+    assert parse_metric_file("loss", "1000 0.5\n1001 1.5 1 train abc\n") == [
+        ("loss", 0.5, 1000, 0),
+        ("loss", 1.5, 1001, 1),
+    ]
+    # Lines of different shapes adding up to 3 fields per line
+    assert parse_metric_file("loss", "1000 0.5\n1001 0.6 1 ds abc\n1002 0.7\n") == [
+        ("loss", 0.5, 1000, 0),
+        ("loss", 0.6, 1001, 1),
+        ("loss", 0.7, 1002, 0),
+    ]
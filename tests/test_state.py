@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.state` module."""
+
+from comet_for_mlflow.state import RUN_FAILED, MigrationState
+
+
+def test_sync_mark(tmp_path):
+    state = MigrationState(str(tmp_path))
+    assert state.get_sync_mark("1") is None
+
+    state.mark_prepared("a", "1", 100, "a.zip")
+    state.mark_uploaded("a")
+    assert state.get_sync_mark("1") == 100
+
+    # A run that couldn't be prepared holds the mark back
+    state.mark_failed("b", "1", 50)
+    assert state.get_run_status("b", 50) == (RUN_FAILED, None)
+    assert state.get_sync_mark("1") == 49
+
+    state.mark_prepared("b", "1", 50, "b.zip")
+    state.mark_uploaded("b")
+    assert state.get_sync_mark("1") == 100
+
+    # Other experiments are not affected
+    assert state.get_sync_mark("2") is None
+
+
+def test_sync_mark_failed_after_upload(tmp_path):
+    state = MigrationState(str(tmp_path))
+
+    state.mark_prepared("a", "1", 100, "a.zip", metrics_until=10)
+    state.mark_uploaded("a")
+
+    # The run changed since and failed, the metrics already sent are kept
+    state.mark_failed("a", "1", 200)
+    assert state.get_sync_mark("1") == 199
+    assert state.get_uploaded_metrics_until("a") == 10
+
+
+def test_held_sync_mark(tmp_path):
+    state = MigrationState(str(tmp_path))
+
+    state.mark_prepared("a", "1", 100, "a.zip")
+    state.mark_uploaded("a")
+
+    # The run listing failed during a sync which started from mark 40
+    state.hold_sync_mark("1", 40)
+    state.mark_prepared("b", "1", 150, "b.zip")
+    state.mark_uploaded("b")
+    assert state.get_sync_mark("1") == 40
+
+    state.release_sync_mark("1")
+    assert state.get_sync_mark("1") == 150
+
+    # The listing of the first sync failed
+    state.hold_sync_mark("1", None)
+    assert state.get_sync_mark("1") is None
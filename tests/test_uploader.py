@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.uploader` module."""
+
+import pytest
+
+from comet_for_mlflow.uploader import Backoff, UploadFailed
+
+
+class FakeResponse(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code):
+        super(FakeHTTPError, self).__init__(status_code)
+        self.response = FakeResponse(status_code)
+
+
+def test_backoff_retries_until_success():
+    calls = []
+
+    def flaky_upload():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FakeHTTPError(500)
+        return "uploaded"
+
+    backoff = Backoff(max_retries=3, backoff_factor=0)
+
+    assert backoff.call(flaky_upload) == "uploaded"
+    assert len(calls) == 3
+
+
+def test_backoff_gives_up_after_max_retries():
+    calls = []
+
+    def failing_upload():
+        calls.append(1)
+        raise FakeHTTPError(500)
+
+    backoff = Backoff(max_retries=2, backoff_factor=0)
+
+    with pytest.raises(FakeHTTPError):
+        backoff.call(failing_upload)
+
+    assert len(calls) == 3
+
+
+def test_backoff_doesnt_retry_upload_failures():
+    calls = []
+
+    def failing_upload():
+        calls.append(1)
+        raise UploadFailed("Already uploaded")
+
+    backoff = Backoff(max_retries=3, backoff_factor=0)
+
+    with pytest.raises(UploadFailed):
+        backoff.call(failing_upload)
+
+    assert len(calls) == 1
+
+
+def test_backoff_rate_limiting_pauses_all_callers(monkeypatch):
+    backoff = Backoff(max_retries=1, backoff_factor=10)
+    pauses = []
+    monkeypatch.setattr(backoff, "pause", pauses.append)
+
+    calls = []
+
+    def rate_limited_upload():
+        calls.append(1)
+        if len(calls) == 1:
+            raise FakeHTTPError(429)
+
+    backoff.call(rate_limited_upload)
+
+    assert pauses == [10]
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `comet_for_mlflow.utils` module."""
+
+import json
+import threading
+import time
+import warnings
+from types import SimpleNamespace
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+from mlflow.entities import FileInfo
+
+from comet_for_mlflow.utils import (
+    imap_ordered,
+    parse_metric_max_points,
+    parse_positive_int,
+    parse_timestamp,
+    walk_run_artifacts,
+    write_comet_experiment_metadata_file,
+)
+
+
+class FakeArtifactStore(object):
+    def __init__(self, tree):
+        self.tree = tree
+        self.listed = []
+
+    def list_artifacts(self, path=None):
+        self.listed.append(path)
+        return self.tree[path]
+
+
+ARTIFACT_TREE = {
+    None: [
+        FileInfo("a.txt", False, 1),
+        FileInfo("dir1", True, None),
+        FileInfo("dir2", True, None),
+    ],
+    "dir1": [FileInfo("dir1/b.txt", False, 1), FileInfo("dir1/sub", True, None)],
+    "dir1/sub": [FileInfo("dir1/sub/MLmodel", False, 1)],
+    "dir2": [FileInfo("dir2/c.txt", False, 1)],
+}
+
+
+def test_walk_run_artifacts_parallel_matches_serial():
+    serial_store = FakeArtifactStore(ARTIFACT_TREE)
+    serial = [artifact.path for artifact in walk_run_artifacts(serial_store)]
+
+    parallel_store = FakeArtifactStore(ARTIFACT_TREE)
+    parallel = [artifact.path for artifact in walk_run_artifacts(parallel_store, 4)]
+
+    # Both walks are breadth-first
+    assert (
+        serial
+        == parallel
+        == [
+            "a.txt",
+            "dir1/b.txt",
+            "dir2/c.txt",
+            "dir1/sub/MLmodel",
+        ]
+    )
+    # Each directory is listed exactly once
+    assert sorted(parallel_store.listed, key=str) == sorted(ARTIFACT_TREE, key=str)
+
+
+def test_imap_ordered_bounds_pending_weight():
+    lock = threading.Lock()
+    state = {"weight": 0, "max_weight": 0}
+
+    def download(size):
+        with lock:
+            state["weight"] += size
+            state["max_weight"] = max(state["max_weight"], state["weight"])
+        time.sleep(0.01)
+        return size
+
+    sizes = [3, 1, 4, 1, 5, 9, 2, 6]
+    results = []
+    for size in imap_ordered(
+        download, sizes, 4, weight=lambda size: size, max_weight=10
+    ):
+        results.append(size)
+        with lock:
+            state["weight"] -= size
+
+    assert results == sizes
+    assert state["max_weight"] <= 10
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("1600000000000") == 1600000000000
+    assert parse_timestamp("2020-09-13T12:26:40+00:00") == 1600000000000
+
+
+def test_parse_metric_max_points():
+    assert parse_metric_max_points("train/*=1000") == ("train/*", 1000)
+    assert parse_metric_max_points("a=b=0") == ("a=b", 0)
+
+    with pytest.raises(ValueError):
+        parse_metric_max_points("1000")
+
+
+def test_parse_positive_int():
+    assert parse_positive_int("1000") == 1000
+
+    for value in ["0", "-1", "a"]:
+        with pytest.raises(ValueError):
+            parse_positive_int(value)
+
+
+def test_write_comet_experiment_metadata_file(tmp_path):
+    archive_path = str(tmp_path / "run.zip")
+    with ZipFile(archive_path, "w", ZIP_DEFLATED) as archive:
+        archive.writestr("messages.json", "{}\n" * 1000)
+        archive.writestr("assets/model.bin", b"model")
+
+    run = SimpleNamespace(info=SimpleNamespace(start_time=1, end_time=2, run_id="run"))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+
+        write_comet_experiment_metadata_file(run, "project", archive_path, "ws")
+        write_comet_experiment_metadata_file(run, "project", archive_path, "ws")
+        # Archives reused for another project get their metadata replaced
+        write_comet_experiment_metadata_file(run, "other", archive_path, "ws")
+
+        with ZipFile(archive_path) as archive:
+            assert sorted(archive.namelist()) == [
+                "assets/model.bin",
+                "experiment.json",
+                "messages.json",
+            ]
+            assert json.loads(archive.read("experiment.json"))["project_name"] == (
+                "other"
+            )
+            assert archive.read("messages.json") == b"{}\n" * 1000
+            assert archive.getinfo("messages.json").compress_type == ZIP_DEFLATED
+            assert archive.read("assets/model.bin") == b"model"
+            assert archive.testzip() is None
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["run.zip"]